@@ -0,0 +1,56 @@
+"""
+add_admeid: linear scan of mastercodes_cache (legacy) vs the hashed AdmeidIndex, with a parity check
+
+    python benchmarks/bench_admeid.py [--cars 2000]
+"""
+import argparse
+import copy
+import random
+import time
+
+import fixtures
+import legacy
+from conf import COMPOSITE_KEY
+from helpers import add_admeid
+
+
+def make_cars(mapping_tables, count, seed=3):
+    rng = random.Random(seed)
+    rows = mapping_tables['mastercodes_cache']
+    cars = []
+    for _ in range(count):
+        row = rng.choice(rows)
+        car = {key: row[key] for key in COMPOSITE_KEY}
+        # drop some keys so different subsets of the composite key are populated, miss some on purpose
+        for key in rng.sample(COMPOSITE_KEY[3:], rng.randint(0, 4)):
+            car[key] = ''
+        if rng.random() < 0.2:
+            car['doors_id'] = 'no-such-id'
+        cars.append(car)
+    return cars
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cars', type=int, default=2000)
+    args = parser.parse_args()
+
+    _, mapping_tables = fixtures.mapping_tables()
+    cars = make_cars(mapping_tables, args.cars)
+
+    timings = {}
+    results = {}
+    for name, function in (('legacy', legacy.add_admeid), ('index', add_admeid)):
+        batch = copy.deepcopy(cars)
+        start = time.perf_counter()
+        results[name] = [function(car, mapping_tables)['admeid'] for car in batch]
+        timings[name] = time.perf_counter() - start
+    mismatches = sum(old != new for old, new in zip(results['legacy'], results['index']))
+    print(f"add_admeid: legacy {args.cars / timings['legacy']:,.0f} cars/s, index {args.cars / timings['index']:,.0f} "
+          f"cars/s, speedup x{timings['legacy'] / timings['index']:.1f}, mismatches {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Backbone table loading: all queries in one multi-statement round trip vs batches of them run concurrently
+over pooled connections, balanced on the row counts of the fingerprints, with a parity check
+
+The tables live in SQLite behind a simulated tunnel: every round trip sleeps --rtt-ms and every row
+returned --row-us, serially per connection as MySQL runs the statements of one request in sequence.
+The figures show the shape of the gain, not the production latency.
+
+    python benchmarks/bench_backbone_load.py [--rtt-ms 30] [--row-us 20] [--parallelism 1 2 4 8]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import fixtures  # noqa: F401  (puts src on the path)
+from backbone import BackboneSession
+from bench_mapping_loader import build_database
+from helpers import get_table_fingerprints, load_mapping_tables
+
+
+class TunnelCursor:
+    def __init__(self, connection, rtt, row_cost):
+        self.connection = connection
+        self.rtt = rtt
+        self.row_cost = row_cost
+        self._results = []
+        self._index = 0
+
+    def execute(self, sql):
+        time.sleep(self.rtt)
+        self._results = []
+        for statement in filter(str.strip, sql.split(';')):
+            cursor = self.connection.execute(statement)
+            rows = cursor.fetchall()
+            time.sleep(self.row_cost * len(rows))
+            self._results.append((cursor.description, rows))
+        self._index = 0
+
+    @property
+    def description(self):
+        return self._results[self._index][0]
+
+    def fetchall(self):
+        return self._results[self._index][1]
+
+    def nextset(self):
+        self._index += 1
+        return self._index < len(self._results)
+
+    def close(self):
+        pass
+
+
+class TunnelConnection:
+    def __init__(self, path, rtt, row_cost):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.rtt = rtt
+        self.row_cost = row_cost
+
+    def cursor(self):
+        return TunnelCursor(self.connection, self.rtt, self.row_cost)
+
+    def close(self):
+        self.connection.close()
+
+
+class TunnelSession(BackboneSession):
+    # the MySQL code path: one request carrying every statement
+    multi_statements = True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rtt-ms', type=float, default=30)
+    parser.add_argument('--row-us', type=float, default=20)
+    parser.add_argument('--parallelism', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'backbone.db')
+        tables = build_database(path)
+        session = TunnelSession(*[None] * 6, connect=lambda: TunnelConnection(
+            path, args.rtt_ms / 1000, args.row_us / 1e6))
+        expected = load_mapping_tables(session, tables, parallelism=1)
+        row_counts = {table: fingerprint[0] for table, fingerprint in get_table_fingerprints(session, tables).items()}
+        timings = {}
+        for parallelism in args.parallelism:
+            timings[parallelism] = float('inf')
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                loaded = load_mapping_tables(session, tables, parallelism=parallelism, row_counts=row_counts)
+                timings[parallelism] = min(timings[parallelism], time.perf_counter() - start)
+                if loaded != expected:
+                    raise SystemExit(f"parallelism {parallelism}: tables differ from the single round trip")
+        session.close()
+
+    baseline = timings.get(1)
+    for parallelism, seconds in timings.items():
+        speedup = f", x{baseline / seconds:.1f}" if baseline else ''
+        print(f"load {len(tables)} tables, parallelism {parallelism}: {seconds * 1000:.0f} ms{speedup}")
+
+
+if __name__ == '__main__':
+    main()
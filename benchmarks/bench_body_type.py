@@ -0,0 +1,65 @@
+"""
+clean_body_type: per call enumerate / re.findall over bb_body (legacy) vs the BodyTypeMatcher, with a parity check
+
+    python benchmarks/bench_body_type.py [--records 20000]
+"""
+import argparse
+import json
+import random
+import time
+
+import fixtures
+import legacy
+from clean import clean_body_type
+from conf import excluded_words
+
+EDGE_CASES = [
+    ('SUV', None, None), ('suv', None, None), ('SUV 4X4', None, None), ('4WDSUV', None, None), ('SALOON', None, None),
+    ('SALOON AWD', None, None), ('4X4X2', None, None), ('2X2 Pick Up', None, None), ('PICK-UP', None, None),
+    ('Sedan/Saloon', None, None), ('Coupé', None, None), ('CROSSOVER COUPE', None, None), (' van ', None, None),
+    ('', 'GLS SUV 2WD', None), ('', 'BASE SALOON', None), ('', 'LIMITED', 'LAND CRUISER WAGON'), ('', None, 'RAV4'),
+    ('', None, None), (None, '', ''), ('', 'HATCHBACKS', None), ('', 'FWD-HATCHBACK', None), ('', 'TOURING 4X4', None),
+    ('', None, 'Z4 CONVERTIBLE FWD'), ('', 'SUVÉ', None),
+]
+
+
+def body_type_cases(mapping_tables_desc, records, seed=5):
+    rng = random.Random(seed)
+    cases = list(EDGE_CASES)
+    for line in fixtures.feed_lines(mapping_tables_desc, records, distinct=records // 4, dirtiness=0.5):
+        car = json.loads(line)
+        body_type = car['bodystyle'].strip().upper() if rng.random() < 0.6 else ''
+        spec = (car['Spec'].strip().upper() + rng.choice(['', ' ' + rng.choice(fixtures.BODY_TYPES).upper()])) \
+            if rng.random() < 0.8 else None
+        cases.append((body_type, spec, car['model'].strip().upper()))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    args = parser.parse_args()
+
+    mapping_tables_desc, _ = fixtures.mapping_tables()
+    cases = body_type_cases(mapping_tables_desc, args.records)
+
+    timings = {}
+    results = {}
+    for name, function in (('legacy', legacy.clean_body_type), ('matcher', clean_body_type)):
+        start = time.perf_counter()
+        results[name] = [function(body_type, spec, model, mapping_tables_desc, excluded_words)
+                         for body_type, spec, model in cases]
+        timings[name] = time.perf_counter() - start
+    mismatches = [(case, old, new) for case, old, new in zip(cases, results['legacy'], results['matcher'])
+                  if old != new]
+    print(f"clean_body_type: legacy {len(cases) / timings['legacy']:,.0f} calls/s, matcher "
+          f"{len(cases) / timings['matcher']:,.0f} calls/s, speedup x{timings['legacy'] / timings['matcher']:.1f}, "
+          f"mismatches {len(mismatches)}")
+    for case, old, new in mismatches[:10]:
+        print(f"  {case}: legacy {old!r}, matcher {new!r}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
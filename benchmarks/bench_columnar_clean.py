@@ -0,0 +1,102 @@
+"""
+Columnar cleaning of the simple string columns vs the scalar cleaners, with a differential check
+
+The fixture feed is salted with edge values (empty, blank, non-ASCII, control characters,
+numbers, lists, floats in strings...) in every column that has a columnar cleaner; the
+columnar output must equal the scalar one record for record, with and without the memo.
+
+    python benchmarks/bench_columnar_clean.py [--records 20000] [--chunk-size 1000]
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+import fixtures
+from clean import clean_chunk, iter_chunks
+from cleaner_memo import CleanerMemo
+from columnar_clean import clean_columns
+from conf import fields_data
+
+COLUMNS = ['Year', 'transmission', 'engine_size', 'cylinders', 'fuel_type', 'Doors', 'seats', 'gearbox',
+           'Seller_Type', 'horse_power', 'colour_exterior']
+EDGE_VALUES = ['', ' ', '   ', None, 0, 1, 5, 2.5, True, ['4'], 'Ä', 'straße', 'ÖL', ' \t4\t ', '\x1f4\x1c', 'a ',
+               'A/T', 'a/t transmission', 'Transmission A/T', 'A/T TRANSMISSION', ' automatic ', '4+', '2+2', '1',
+               ' 1 ', '01', 'one', '4 Cyl', 'Cyl', 'CYL 6', 'petrol/lpg', ' GASOLINE ', 'Petrol/LPG ',
+               'Official Dealer', ' OWNER ', 'dealer', 'Large independent dealers', 'private', '250 HP/184 kW',
+               '184 kW/250 hp', '184/200', '1e3', 'nan', ' inf ', '1_000', '2500cc', '1.2.3', '0', '-5', '.5', '1998',
+               '0.0', '10000000000000000000']
+
+
+def salted_lines(lines, rate, seed=13):
+    rng = random.Random(seed)
+    salted = []
+    for line in lines:
+        record = json.loads(line)
+        for column in COLUMNS:
+            if rng.random() < rate:
+                record[column] = rng.choice(EDGE_VALUES)
+        salted.append(json.dumps(record).encode('utf-8'))
+    return salted
+
+
+def scalar_columns(raw_cars, cleaning_functions, logger):
+    for raw_car in raw_cars:
+        for raw_key, value in raw_car.items():
+            key = fields_data.get(raw_key, raw_key)
+            if raw_key in COLUMNS:
+                if key in ('doors', 'seats', 'gears'):
+                    cleaning_functions[key](value, key[:-1].upper(), logger)
+                else:
+                    cleaning_functions[key](value, logger)
+
+
+def timed(first, second, repeat=3):
+    """
+    Best time and result of two functions, run alternately so warm up and drift hit both alike
+    """
+    best, results = [float('inf'), float('inf')], [None, None]
+    for _ in range(repeat):
+        for position, function in enumerate((first, second)):
+            start = time.perf_counter()
+            results[position] = function()
+            best[position] = min(best[position], time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    plain = fixtures.cleaning_functions()
+    mapping_tables_desc, mapping_tables = fixtures.mapping_tables()
+    lines = salted_lines(fixtures.feed_lines(mapping_tables_desc, args.records), rate=0.1)
+    chunks = list(iter_chunks(lines, args.chunk_size))
+    raw_cars = [[json.loads(line) for line in chunk] for chunk in chunks]
+
+    failed = False
+    for name, cleaning_functions in (('plain', plain), ('memoized', CleanerMemo(50000).wrap(plain, 1))):
+        def run(columnar):
+            return [record for chunk in chunks for record in clean_chunk(
+                chunk, cleaning_functions, mapping_tables_desc, mapping_tables, logger, columnar=columnar)]
+        (scalar_time, columnar_time), (expected, result) = timed(lambda: run(False), lambda: run(True))
+        mismatches = sum(old != new for old, new in zip(expected, result)) + abs(len(expected) - len(result))
+        (column_scalar, column_columnar), _ = timed(
+            lambda: [scalar_columns(cars, cleaning_functions, logger) for cars in raw_cars],
+            lambda: [clean_columns(cars, cleaning_functions, logger) for cars in raw_cars])
+        print(f"{name}: simple columns scalar {args.records / column_scalar:,.0f} rec/s, columnar "
+              f"{args.records / column_columnar:,.0f} rec/s (x{column_scalar / column_columnar:.1f}); whole chunk "
+              f"scalar {args.records / scalar_time:,.0f} rec/s, columnar {args.records / columnar_time:,.0f} rec/s; "
+              f"{len(expected)} records, mismatches {mismatches}")
+        failed = failed or bool(mismatches)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+clean_for_duration: strptime over every format per call (legacy) vs the DurationParser, with a parity check
+on a corpus of warranty / service contract values
+
+    python benchmarks/bench_duration.py [--values 50000]
+"""
+import argparse
+import logging
+import random
+import time
+
+import fixtures  # noqa: F401  (puts src on the path)
+import legacy
+from clean import clean_for_duration
+from duration import duration_parser
+
+GOLDEN = [
+    '2 years', '2 Years ', '1 year', '2.5 years', '-1 year', '+3 years', 'years', '24 months', '6 Months', '1 month',
+    '2.5 months', 'months', '3 years 6 months', 'valid till 2026-05', 'Valid till 2027-12-31', 'valid till 05-2027',
+    'valid till', 'valid till 2027', 'till jan-2027', 'till Sep-2026', 'till may-2027', 'till aay-2027', 'till 2027',
+    'till december-2027', 'until 2026', 'Until 2030', 'until', 'until 12/2027', '2026-05-01', '01-05-2027',
+    '2027-mar-15', '15-mar-2027', 'mar-2027', '2027-mar', '15/03/2027', '2027/03/15', '2027-13-01', '31-02-2027',
+    '12-2027', '2027-12', '2027-5-1', '2027- 5-01', '5-5-2027', '2027-03-15 expiry', '15/03/2027 or 100000 km',
+    'mar-2027 extendable', '2027-mar-15T00', '100000 km', 'yes', 'no', 'n/a', '-', '/', '--', 'extended', 'ongoing',
+    'jan', '٢٠٢٧-٠٣-١٥', 'sep-2026/oct-2026', '2027-03-15/2027-04-01', '', '   ', None, 24, 2.5, ['2 years'],
+]
+
+
+def corpus(values, seed=9):
+    rng = random.Random(seed)
+    months = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+    shapes = [
+        lambda: f'{rng.randint(1, 7)} years', lambda: f'{rng.choice([6, 12, 18, 24, 36])} months',
+        lambda: f'valid till {rng.randint(2024, 2030)}-{rng.randint(1, 12):02d}',
+        lambda: f'till {rng.choice(months)}-{rng.randint(2024, 2030)}', lambda: f'until {rng.randint(2024, 2030)}',
+        lambda: f'{rng.randint(2024, 2030)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        lambda: f'{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2024, 2030)}',
+        lambda: f'{rng.randint(1, 12):02d}-{rng.randint(2024, 2030)}',
+        lambda: f'{rng.choice(months)}-{rng.randint(2024, 2030)} or {rng.randint(5, 20)}0000 km',
+        lambda: rng.choice(['', 'yes', 'n/a', 'extended warranty', '100000 km']),
+    ]
+    distinct = [rng.choice(shapes)() for _ in range(max(values // 20, 1))]
+    return GOLDEN + [rng.choice(distinct) for _ in range(values)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--values', type=int, default=50000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    values = corpus(args.values)
+
+    start = time.perf_counter()
+    expected = [legacy.clean_for_duration(value, logger) for value in values]
+    legacy_time = time.perf_counter() - start
+    duration_parser.start_run()
+    start = time.perf_counter()
+    results = [clean_for_duration(value, logger) for value in values]
+    parser_time = time.perf_counter() - start
+    # every value a new one: the classification and parse_date fast path without the per value cache
+    start = time.perf_counter()
+    uncached = [duration_parser._parse(value, duration_parser.today(), logger) if isinstance(value, str) and value
+                else value for value in values]
+    uncached_time = time.perf_counter() - start
+
+    mismatches = [(value, old, new) for value, old, new, raw in zip(values, expected, results, uncached)
+                  if old != new or raw != old]
+    print(f"clean_for_duration: legacy {len(values) / legacy_time:,.0f} values/s, parser {len(values) / parser_time:,.0f} "
+          f"values/s (x{legacy_time / parser_time:.1f}), uncached {len(values) / uncached_time:,.0f} values/s "
+          f"(x{legacy_time / uncached_time:.1f}), mismatches {len(mismatches)}")
+    for value, old, new in mismatches[:10]:
+        print(f"  {value!r}: legacy {old!r}, parser {new!r}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
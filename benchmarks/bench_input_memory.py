@@ -0,0 +1,81 @@
+"""
+Peak memory of reading a large compressed input through read_object_lines: whole-chunk decompression (legacy)
+vs decompression bounded to decompressed_chunk_size, with a line count check
+
+Each variant runs in its own process. The object holds --gib GiB of feed lines, built by streaming compression
+so that only the compressed bytes are ever in memory; the peak RSS is reset once it is stored.
+
+    python benchmarks/bench_input_memory.py [--gib 2] [--compression gzip zstd]
+"""
+import argparse
+import gc
+import subprocess
+import sys
+import time
+import zlib
+
+import fixtures
+import legacy
+import s3_stream
+from bench_pipeline import _reset_peak_rss, _peak_rss_bytes
+from startup import lazy_import
+
+
+def compressed_feed(compression: str, gib: float):
+    """
+    Compressed object of repeated feed lines and its line count
+    """
+    mapping_tables_desc, _ = fixtures.mapping_tables()
+    block = b'\n'.join(fixtures.feed_lines(mapping_tables_desc, 2000, 500)) + b'\n'
+    repeats = int(gib * 2 ** 30 / len(block))
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        finish = compressor.flush
+    else:
+        compressor = lazy_import('zstandard').ZstdCompressor(level=3).compressobj()
+        finish = compressor.flush
+    parts = [compressor.compress(block) for _ in range(repeats)]
+    parts.append(finish())
+    return b''.join(parts), repeats * block.count(b'\n')
+
+
+def run(variant: str, compression: str, gib: float):
+    if variant == 'legacy':
+        s3_stream.decompress_chunks = lambda chunks, compression: legacy.decompress_chunks(chunks, compression)
+    data, expected = compressed_feed(compression, gib)
+    s3 = fixtures.MemoryS3()
+    key = 'feed.json.gz' if compression == 'gzip' else 'feed.jsonl.zst'
+    s3.put_object(Bucket='feeds', Key=key, Body=data)
+    del data
+    gc.collect()
+    if not _reset_peak_rss():
+        raise SystemExit('needs /proc/self/clear_refs to reset the peak RSS')
+    baseline = _peak_rss_bytes()
+    start = time.perf_counter()
+    lines = sum(1 for _ in s3_stream.read_object_lines(s3, 'feeds', key))
+    seconds = time.perf_counter() - start
+    if lines != expected:
+        raise SystemExit(f"{variant} {compression}: {lines} lines, expected {expected}")
+    size = len(s3.objects[('feeds', key)])
+    print(f"{variant:<8} {compression:<5} {size / 2 ** 20:7,.1f} MiB -> {gib:g} GiB, {lines:,} lines in {seconds:.1f} s: "
+          f"peak RSS +{(_peak_rss_bytes() - baseline) / 2 ** 20:,.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gib', type=float, default=2)
+    parser.add_argument('--compression', nargs='+', default=['gzip', 'zstd'], choices=['gzip', 'zstd'])
+    parser.add_argument('--variant', nargs='+', default=['legacy', 'bounded'], choices=['legacy', 'bounded'])
+    parser.add_argument('--run', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run(args.run[0], args.run[1], args.gib)
+        return
+    for compression in args.compression:
+        for variant in args.variant:
+            subprocess.run([sys.executable, __file__, '--run', variant, compression, '--gib', str(args.gib)],
+                           check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Backbone id mapping: map_data / map_data_model_spec per car (legacy) vs map_chunk, with a parity check
+
+    python benchmarks/bench_map_chunk.py [--records 20000] [--chunk-size 1000]
+"""
+import argparse
+import copy
+import logging
+import time
+
+import fixtures
+from clean import clean_chunk, iter_chunks
+from helpers import map_chunk, map_data, map_data_model_spec
+
+
+def legacy_map(records, mapping_tables):
+    mapped = []
+    for car in records:
+        try:
+            car = map_data(car, mapping_tables)
+            car = map_data_model_spec(car, mapping_tables, 'model', 'make_id')
+            car = map_data_model_spec(car, mapping_tables, 'spec', 'model_id')
+        except Exception as e:
+            car = e
+        mapped.append(car)
+    return mapped
+
+
+def cleaned_cars(lines, chunk_size, mapping_tables_desc, mapping_tables, logger):
+    """
+    Cars as they reach the mapping step, with the ids of a previous mapping dropped and some edge cases added
+    """
+    cars = [car for chunk in iter_chunks(lines, chunk_size) for car, _ in clean_chunk(
+        chunk, fixtures.cleaning_functions(), mapping_tables_desc, mapping_tables, logger)]
+    for car in cars:
+        for key in [key for key in car if key.endswith('_id') and key != 'job_id']:
+            del car[key]
+    cars[0]['model'] = None
+    cars[1]['colour_in'] = 'RED'
+    del cars[2]['make']
+    cars[3]['year'] = 2020
+    cars[4]['make'] = '1'
+    return cars
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    mapping_tables_desc, mapping_tables = fixtures.mapping_tables()
+    lines = fixtures.feed_lines(mapping_tables_desc, args.records)
+    # model keys whose description starts with digits, so the numeric prefixes of the concatenated keys get
+    # exercised; added before anything indexes the tables, which are never changed in place once loaded
+    mapping_tables['bb_model'].update({'1' + '2SERIES': 900001, '3' + '500': 900003})
+    cars = cleaned_cars(lines, args.chunk_size, mapping_tables_desc, mapping_tables, logger)
+    cars[5].update({'make': 'TOYOTA', 'model': '2SERIES'})
+    cars[6].update({'make': 'NISSAN', 'model': '1SERIES'})
+
+    timings = {}
+    results = {}
+    for name, function in (('legacy', legacy_map), ('map_chunk', map_chunk)):
+        batch = copy.deepcopy(cars)
+        start = time.perf_counter()
+        results[name] = [result for position in range(0, len(batch), args.chunk_size)
+                         for result in function(batch[position:position + args.chunk_size], mapping_tables)]
+        timings[name] = time.perf_counter() - start
+
+    def comparable(result):
+        return (type(result).__name__, str(result)) if isinstance(result, Exception) else result
+    mismatches = sum(comparable(old) != comparable(new) for old, new in zip(results['legacy'], results['map_chunk']))
+    failures = sum(isinstance(result, Exception) for result in results['legacy'])
+    print(f"id mapping: legacy {len(cars) / timings['legacy']:,.0f} cars/s, map_chunk "
+          f"{len(cars) / timings['map_chunk']:,.0f} cars/s, speedup x{timings['legacy'] / timings['map_chunk']:.1f}, "
+          f"{failures} failing cars, mismatches {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
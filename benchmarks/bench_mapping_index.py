@@ -0,0 +1,50 @@
+"""
+cleaning_model / cleaning_spec: per-record list scans (legacy) vs the prebuilt MappingIndex
+
+    python benchmarks/bench_mapping_index.py [--records 5000] [--models 2000] [--specs 4000]
+"""
+import argparse
+import json
+import logging
+import time
+
+import fixtures
+import legacy
+from clean import cleaning_model, cleaning_spec
+from mapping_index import get_mapping_index
+
+
+def run(function, inputs, mapping_tables_desc, logger):
+    start = time.perf_counter()
+    results = [function(value, make, mapping_tables_desc, logger) for value, make in inputs]
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--models', type=int, default=2000)
+    parser.add_argument('--specs', type=int, default=4000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    mapping_tables_desc, _ = fixtures.mapping_tables(args.models, args.specs)
+    cars = [json.loads(line) for line in fixtures.feed_lines(mapping_tables_desc, args.records)]
+    build_start = time.perf_counter()
+    get_mapping_index(mapping_tables_desc)
+    print(f"index build: {time.perf_counter() - build_start:.4f}s")
+
+    for name, old, new, field in (('cleaning_model', legacy.cleaning_model, cleaning_model, 'model'),
+                                  ('cleaning_spec', legacy.cleaning_spec, cleaning_spec, 'Spec')):
+        inputs = [(car[field], car['Make']) for car in cars]
+        old_results, old_time = run(old, inputs, mapping_tables_desc, logger)
+        new_results, new_time = run(new, inputs, mapping_tables_desc, logger)
+        mismatches = sum(old_result != new_result for old_result, new_result in zip(old_results, new_results))
+        print(f"{name}: legacy {len(inputs) / old_time:,.0f} rec/s, index {len(inputs) / new_time:,.0f} rec/s, "
+              f"speedup x{old_time / new_time:.1f}, mismatches {mismatches}")
+        if mismatches:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Backbone table loading: two pandas queries per table (legacy) vs one DB-API pass, with a parity check
+
+Runs against a SQLite copy of the synthetic backbone tables, so the timings cover query and shaping
+cost only, not the tunnel round trips. Import time of helpers is measured in a fresh interpreter.
+
+    python benchmarks/bench_mapping_loader.py [--rounds 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import fixtures
+import legacy
+from backbone import BackboneSession
+from conf import rename_mastercode_cache
+from helpers import load_mapping_tables, collation_key
+
+PARENTS = {'bb_model': 'make_id', 'bb_specifications': 'model_id'}
+
+
+def _ci(left, right):
+    # the backbone's _ci collation
+    left, right = collation_key(left), collation_key(right)
+    return (left > right) - (left < right)
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.create_collation('ci', _ci)
+    return conn
+
+
+def build_database(path, seed=5):
+    rng = random.Random(seed)
+    desc, tables = fixtures.mapping_tables()
+    conn = connect(path)
+    for table, values in desc.items():
+        parent = PARENTS.get(table)
+        conn.execute("CREATE TABLE {} (id INTEGER, description TEXT COLLATE ci{})".format(table, f', {parent} INTEGER' if parent else ''))
+        # repeat some descriptions with other casing, trailing spaces or accents to exercise the dedupe and the
+        # lookup collisions
+        values = values + [rng.choice(values).lower() for _ in range(len(values) // 10)] + values[:3] + \
+            [value + ' ' for value in values[3:6]] + [value.replace('E', 'Ë').replace('e', 'é') for value in values[6:9]]
+        rows = [(position + 1, value) + ((rng.randint(1, 50),) if parent else ()) for position, value in enumerate(values)]
+        conn.executemany("INSERT INTO {} VALUES ({})".format(table, ', '.join('?' * len(rows[0]))), rows)
+    inverse = {value: key for key, value in rename_mastercode_cache.items()}
+    columns = [inverse.get(key, key) for key in tables['mastercodes_cache'][0]]
+    conn.execute("CREATE TABLE mastercodes_cache ({})".format(', '.join(columns)))
+    conn.executemany("INSERT INTO mastercodes_cache VALUES ({})".format(', '.join('?' * len(columns))),
+                     [tuple(row.values()) for row in tables['mastercodes_cache']])
+    conn.commit()
+    conn.close()
+    return list(desc) + ['mastercodes_cache']
+
+
+def import_time(statement):
+    src = os.path.join(fixtures.ROOT, 'src')
+    timings = []
+    for _ in range(3):
+        output = subprocess.run(
+            [sys.executable, '-c', f'import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)'],
+            cwd=src, env={**os.environ, 'PYTHONPATH': src}, capture_output=True, text=True, check=True)
+        timings.append(float(output.stdout))
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'backbone.db')
+        tables = build_database(path)
+        conn = connect(path)
+        session = BackboneSession(*[None] * 6, connect=lambda: connect(path))
+
+        timings = {'legacy': float('inf'), 'single pass': float('inf')}
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            old = {table: legacy.load_mapping_table(conn, table) for table in tables}
+            timings['legacy'] = min(timings['legacy'], time.perf_counter() - start)
+            start = time.perf_counter()
+            new = load_mapping_tables(session, tables)
+            timings['single pass'] = min(timings['single pass'], time.perf_counter() - start)
+        mismatches = [table for table in tables if old[table] != new[table]]
+
+    print(f"load {len(tables)} tables: legacy {timings['legacy'] * 1000:.1f} ms, "
+          f"single pass {timings['single pass'] * 1000:.1f} ms, "
+          f"speedup x{timings['legacy'] / timings['single pass']:.1f}, mismatches {mismatches or 0}")
+    print(f"import helpers: {import_time('import helpers') * 1000:.0f} ms, "
+          f"with pandas (legacy) {import_time('import pandas, helpers') * 1000:.0f} ms")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Cleaning throughput of the serial path vs a CleaningPool at 1/2/4/6 worker processes
+
+    python benchmarks/bench_parallel_clean.py [--records 20000] [--chunk-size 1000] [--workers 1 2 4 6]
+"""
+import argparse
+import logging
+import os
+import time
+
+import fixtures
+from clean import rename_columns_and_clean_data
+from parallel_clean import CleaningPool
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 6])
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    cleaning_functions = fixtures.cleaning_functions()
+    mapping_tables_desc, mapping_tables = fixtures.mapping_tables()
+    lines = fixtures.feed_lines(mapping_tables_desc, args.records)
+    print(f"cpus: {os.cpu_count()}")
+
+    start = time.perf_counter()
+    expected = list(rename_columns_and_clean_data(
+        lines, cleaning_functions, mapping_tables_desc, mapping_tables, logger, chunk_size=args.chunk_size))
+    elapsed = time.perf_counter() - start
+    print(f"serial: {len(lines) / elapsed:,.0f} rec/s")
+
+    for workers in args.workers:
+        with CleaningPool(workers, cleaning_functions, mapping_tables_desc, mapping_tables, logger) as pool:
+            start = time.perf_counter()
+            result = list(rename_columns_and_clean_data(
+                lines, cleaning_functions, mapping_tables_desc, mapping_tables, logger, pool, args.chunk_size))
+            elapsed = time.perf_counter() - start
+        identical = result == expected
+        print(f"{workers} workers: {len(lines) / elapsed:,.0f} rec/s, identical output: {identical}")
+        if not identical:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
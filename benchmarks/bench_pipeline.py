@@ -0,0 +1,182 @@
+"""
+Throughput and memory of every stage of a file, on a synthetic feed and synthetic backbone tables
+
+Stages, each fed the output of the one before:
+    read            read_file_contents_from_s3 over an in-memory S3 object
+    clean           rename_columns_and_clean_data (parse, clean, map and admeid of every chunk),
+                    through the cleaner memo with --memo, warm after the first run
+    map             map_chunk on copies of the cleaned cars, chunk by chunk
+    admeid          add_admeid and add_id_keys on the mapped cars
+    write_to_s3     EventProcessor.write_to_s3 into the in-memory S3
+
+Every stage is timed first, then run again under tracemalloc for the peak of traced memory and
+the number of blocks still allocated at its end. Peak RSS is the high-water mark over the stage,
+reset before it through /proc/self/clear_refs where the kernel allows it, the process wide
+maximum otherwise.
+
+    python benchmarks/bench_pipeline.py [--records 20000] [--distinct 5000] [--dirtiness 0.5]
+        [--models 2000] [--specs 4000] [--mastercodes 5000] [--chunk-size 1000] [--repeat 3]
+        [--memo] [--no-tracemalloc] [--json results.json]
+"""
+import argparse
+import gc
+import json
+import logging
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import fixtures
+from clean import rename_columns_and_clean_data, iter_chunks
+from event_processor import EventProcessor
+from helpers import map_chunk, add_admeid, add_id_keys
+from cleaner_memo import cleaner_memo
+from parquet_stage import ID_COLUMNS
+
+
+def _reset_peak_rss() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes() -> int:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(run, repeat: int, trace: bool) -> dict:
+    """
+    Best wall time of ``repeat`` runs, then peak RSS and tracemalloc figures of one more
+
+    Args:
+        run : stage to measure, returns how many records it went through
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        records = run()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    result = {'records': records, 'seconds': round(best, 6),
+              'records_per_second': round(records / best, 1) if best else None}
+    gc.collect()
+    rss_reset = _reset_peak_rss()
+    if trace:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        grown = [stat for stat in after.compare_to(before, 'filename') if stat.size_diff > 0]
+        result['traced_peak_bytes'] = peak
+        result['allocated_blocks'] = sum(stat.count_diff for stat in grown if stat.count_diff > 0)
+        result['allocated_bytes'] = sum(stat.size_diff for stat in grown)
+    else:
+        run()
+    result['peak_rss_bytes'] = _peak_rss_bytes()
+    result['peak_rss_scope'] = 'stage' if rss_reset else 'process'
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=5000, help='distinct listings in the feed')
+    parser.add_argument('--dirtiness', type=float, default=0.5,
+                        help='share of Make/Model/Spec/bodystyle/warranty values with noise')
+    parser.add_argument('--models', type=int, default=2000)
+    parser.add_argument('--specs', type=int, default=4000)
+    parser.add_argument('--mastercodes', type=int, default=5000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--memo', action='store_true', help='clean through the cleaner memo')
+    parser.add_argument('--no-tracemalloc', action='store_true')
+    parser.add_argument('--json', help="write the results as JSON to this file, '-' for stdout")
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    cleaning_functions = fixtures.cleaning_functions()
+    if args.memo:
+        cleaning_functions = cleaner_memo.wrap(cleaning_functions, 1)
+    mapping_tables_desc, mapping_tables = fixtures.mapping_tables(args.models, args.specs,
+                                                                  mastercodes=args.mastercodes)
+    lines = fixtures.feed_lines(mapping_tables_desc, args.records, args.distinct, dirtiness=args.dirtiness)
+    s3 = fixtures.MemoryS3()
+    s3.put_object(Bucket='feeds', Key='feed.json', Body=b'\n'.join(lines))
+    processor = EventProcessor(
+        s3, '', '', 'raw', 'stage', '', 'us-east-1', '', 'bench', 'lambda_run_details', '', cleaning_functions,
+        None, list(mapping_tables), logger)
+    trace = not args.no_tracemalloc
+
+    state = {}
+
+    def read():
+        state['lines'] = list(processor.read_file_contents_from_s3('feeds', 'feed.json', s3))
+        return len(state['lines'])
+
+    def clean():
+        state['records'] = list(rename_columns_and_clean_data(
+            state['lines'], cleaning_functions, mapping_tables_desc, mapping_tables, logger,
+            chunk_size=args.chunk_size))
+        return len(state['lines'])
+
+    def map_cars():
+        # fresh copies without the ids, as clean_chunk hands them to map_chunk
+        mapped = []
+        for chunk in iter_chunks(state['records'], args.chunk_size):
+            cars = [{key: value for key, value in car.items() if key not in ID_COLUMNS} for car, _ in chunk]
+            mapped.extend(map_chunk(cars, mapping_tables))
+        state['mapped'] = mapped
+        return len(mapped)
+
+    def admeid():
+        done = 0
+        for (_, raw_car), car in zip(state['records'], state['mapped']):
+            if not isinstance(car, Exception):
+                add_id_keys(dict(raw_car), add_admeid(car, mapping_tables))
+                done += 1
+        return done
+
+    def write_to_s3():
+        processor.write_to_s3(s3, iter(state['records']), 'raw', 'stage', 'bench', 's3://feeds/feed.json')
+        return len(state['records'])
+
+    stages = {'read': read, 'clean': clean, 'map': map_cars, 'admeid': admeid, 'write_to_s3': write_to_s3}
+    results = {
+        'config': {**vars(args), 'python': platform.python_version(), 'machine': platform.machine()},
+        'stages': {name: measure(run, args.repeat, trace) for name, run in stages.items()},
+    }
+
+    for name, result in results['stages'].items():
+        allocations = (f", traced peak {result['traced_peak_bytes'] / 2 ** 20:,.1f} MiB, "
+                       f"{result['allocated_blocks']:,} blocks kept" if trace else '')
+        print(f"{name:<12} {result['records']:>8,} records in {result['seconds']:.3f} s "
+              f"({result['records_per_second'] or 0:,.0f}/s), peak RSS {result['peak_rss_bytes'] / 2 ** 20:,.0f} MiB "
+              f"({result['peak_rss_scope']}){allocations}", file=sys.stderr if args.json == '-' else sys.stdout)
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
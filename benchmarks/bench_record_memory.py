@@ -0,0 +1,70 @@
+"""
+Peak memory of streaming a feed through cleaning and write_to_s3, per stage format
+
+Each format runs in its own process. The feed and the in-memory S3 are built and pyarrow is
+imported first, the peak RSS is then reset and measured over the cleaning and upload only.
+
+    python benchmarks/bench_record_memory.py [--records 100000] [--format json parquet]
+"""
+import argparse
+import gc
+import logging
+import subprocess
+import sys
+
+import fixtures
+from bench_pipeline import _reset_peak_rss, _peak_rss_bytes
+from clean import rename_columns_and_clean_data
+from event_processor import EventProcessor
+from startup import lazy_import
+
+
+def _rss_bytes() -> int:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def run(stage_format: str, records: int):
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    cleaning_functions = fixtures.cleaning_functions()
+    mapping_tables_desc, mapping_tables = fixtures.mapping_tables()
+    s3 = fixtures.MemoryS3()
+    s3.put_object(Bucket='feeds', Key='feed.json',
+                  Body=b'\n'.join(fixtures.feed_lines(mapping_tables_desc, records, records // 4, dirtiness=0.5)))
+    processor = EventProcessor(
+        s3, '', '', 'raw', 'stage', '', 'us-east-1', '', 'bench', 'lambda_run_details', '', cleaning_functions,
+        None, list(mapping_tables), logger, stage_format=stage_format)
+    if stage_format == 'parquet':
+        # the import alone maps tens of MiB, not what the records cost
+        lazy_import('pyarrow.parquet')
+    gc.collect()
+    if not _reset_peak_rss():
+        raise SystemExit('needs /proc/self/clear_refs to reset the peak RSS')
+    baseline = _rss_bytes()
+    cars = rename_columns_and_clean_data(
+        processor.read_file_contents_from_s3('feeds', 'feed.json', s3), cleaning_functions, mapping_tables_desc,
+        mapping_tables, logger)
+    processor.write_to_s3(s3, cars, 'raw', 'stage', 'bench', 's3://feeds/feed.json')
+    print(f"{stage_format:<8} {records:,} records: peak RSS {(_peak_rss_bytes() - baseline) / 2 ** 20:,.0f} MiB "
+          f"over the {baseline / 2 ** 20:,.0f} MiB of the feed and tables")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--format', nargs='+', default=['json', 'parquet'], choices=['json', 'parquet'])
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run(args.run, args.records)
+        return
+    for stage_format in args.format:
+        subprocess.run([sys.executable, __file__, '--run', stage_format, '--records', str(args.records)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Run details of a batch of files: put_item per file on the processing thread (legacy) vs the background
+RunDetailsWriter, flushed once at the end of the invocation
+
+DynamoDB is a stand-in whose calls sleep --latency-ms, so the figures show the time taken off the
+processing of the files and the number of calls, not DynamoDB's own latency.
+
+    python benchmarks/bench_run_details.py [--files 50] [--latency-ms 15]
+"""
+import argparse
+import logging
+import threading
+import time
+
+import fixtures  # noqa: F401  (puts src on the path)
+from run_details import RunDetailsWriter
+
+
+class SlowDynamoDB:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.items = {}
+        self.meta = self
+        self.client = self
+        self._lock = threading.Lock()
+
+    def _call(self):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+
+    def Table(self, name):
+        return self
+
+    def put_item(self, Item, TableName=None):
+        self._call()
+        self.items[(Item['job_id'], Item['source_file'])] = Item
+
+    def batch_write_item(self, RequestItems):
+        self._call()
+        for requests in RequestItems.values():
+            for request in requests:
+                item = request['PutRequest']['Item']
+                self.items[(item['job_id'], item['source_file'])] = item
+        return {'UnprocessedItems': {}}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=15)
+    args = parser.parse_args()
+    logger = logging.getLogger('bench')
+    items = [{'job_id': 'bench', 'job_start_time': 0, 'source_file': f's3://feeds/{index}.json',
+              'metrics': {'stages': {'clean': '1.0'}}} for index in range(args.files)]
+
+    legacy = SlowDynamoDB(args.latency_ms / 1000)
+    start = time.perf_counter()
+    for item in items:
+        legacy.Table('lambda_run_details').put_item(Item=item)
+    legacy_time = time.perf_counter() - start
+
+    dynamodb = SlowDynamoDB(args.latency_ms / 1000)
+    writer = RunDetailsWriter(dynamodb, 'lambda_run_details', logger)
+    start = time.perf_counter()
+    for item in items:
+        writer.put(item)
+    queued_time = time.perf_counter() - start
+    writer.flush()
+    flush_time = time.perf_counter() - start - queued_time
+    if dynamodb.items != legacy.items:
+        raise SystemExit('the writer stored other items than put_item')
+
+    print(f"{args.files} files: put_item {legacy_time * 1000:,.1f} ms on the processing threads in {legacy.calls} calls, "
+          f"writer {queued_time * 1000:,.2f} ms to queue + {flush_time * 1000:,.1f} ms flush in {dynamodb.calls} calls")
+
+
+if __name__ == '__main__':
+    main()
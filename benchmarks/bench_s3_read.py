@@ -0,0 +1,107 @@
+"""
+Reading an input object: one GET through botocore's iter_lines() (legacy) vs read_object_lines with concurrent
+ranged GETs, with a parity check
+
+The object sits in memory behind botocore StreamingBody instances whose reads sleep for a first byte
+latency and a per connection bandwidth, so the figures show the shape of the gain, not S3's. With
+--mbps 0 nothing sleeps and only the line splitting cost is left.
+
+    python benchmarks/bench_s3_read.py [--mib 64] [--mbps 80] [--latency-ms 20] [--workers 1 4 8] [--gzip]
+"""
+import argparse
+import gzip
+import io
+import threading
+import time
+
+import fixtures
+from botocore.response import StreamingBody
+from s3_stream import read_object_lines
+
+
+class ThrottledRaw(io.RawIOBase):
+    """
+    Bytes delivered no faster than the bandwidth, counted from the first read so small reads don't each pay a sleep
+    """
+
+    def __init__(self, data: bytes, bytes_per_second: float):
+        self._data = io.BytesIO(data)
+        self._bytes_per_second = bytes_per_second
+        self._start = None
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if self._start is None:
+            self._start = time.perf_counter()
+        data = self._data.read(size)
+        if self._bytes_per_second:
+            delay = self._start + self._data.tell() / self._bytes_per_second - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
+
+class ThrottledS3(fixtures.MemoryS3):
+    def __init__(self, bytes_per_second: float, latency: float):
+        super().__init__()
+        self.bytes_per_second = bytes_per_second
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        response = super().get_object(Bucket, Key, Range, IfMatch)
+        body = response['Body'].read()
+        response['Body'] = StreamingBody(ThrottledRaw(body, self.bytes_per_second), len(body))
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mib', type=float, default=64)
+    parser.add_argument('--mbps', type=float, default=80, help='MiB/s of one connection, 0 for no limit')
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--range-mib', type=float, default=4)
+    parser.add_argument('--gzip', action='store_true', help='store the object gzip\'d as .json.gz')
+    args = parser.parse_args()
+
+    mapping_tables_desc, _ = fixtures.mapping_tables()
+    lines = fixtures.feed_lines(mapping_tables_desc, 5000, 1000, dirtiness=0.5)
+    line_count = int(args.mib * 2 ** 20 / (sum(map(len, lines)) / len(lines) + 1))
+    data = b'\n'.join(lines[index % len(lines)] for index in range(line_count))
+    key = 'feed.json.gz' if args.gzip else 'feed.json'
+    s3 = ThrottledS3(args.mbps * 2 ** 20, args.latency_ms / 1000)
+    s3.put_object(Bucket='feeds', Key=key, Body=gzip.compress(data, 6) if args.gzip else data)
+    size = len(s3.objects[('feeds', key)])
+    expected = data.splitlines()
+
+    timings = {}
+    if not args.gzip:
+        start = time.perf_counter()
+        legacy = list(s3.get_object(Bucket='feeds', Key=key)['Body'].iter_lines())
+        timings['legacy iter_lines'] = time.perf_counter() - start
+        if legacy != expected:
+            raise SystemExit('legacy iter_lines differs from splitlines')
+    for workers in args.workers:
+        s3.requests = 0
+        start = time.perf_counter()
+        result = list(read_object_lines(s3, 'feeds', key, workers=workers, range_size=int(args.range_mib * 2 ** 20)))
+        timings[f'ranged, {workers} workers ({s3.requests} GETs)'] = time.perf_counter() - start
+        if result != expected:
+            raise SystemExit(f'{workers} workers: lines differ from iter_lines')
+
+    baseline = next(iter(timings.values()))
+    print(f"{key}: {size / 2 ** 20:,.1f} MiB, {len(expected):,} lines, {args.mbps or 'unlimited'} MiB/s per connection")
+    for name, seconds in timings.items():
+        print(f"  {name:<32} {seconds * 1000:8,.0f} ms  {size / 2 ** 20 / seconds:7,.1f} MiB/s  "
+              f"x{baseline / seconds:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Line decode and record encode throughput of the json backends on a representative feed, records encoded
+byte for byte as json.dumps
+
+    python benchmarks/bench_serializers.py [--records 20000]
+"""
+import argparse
+import json
+import logging
+import time
+
+import fixtures
+from clean import rename_columns_and_clean_data
+from serializers import get_codec
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    mapping_tables_desc, mapping_tables = fixtures.mapping_tables()
+    lines = fixtures.feed_lines(mapping_tables_desc, args.records)
+    records = [record for pair in rename_columns_and_clean_data(
+        lines, fixtures.cleaning_functions(), mapping_tables_desc, mapping_tables, logger) for record in pair]
+    expected = [json.loads(line) for line in lines]
+
+    for backend in ('json', 'orjson', 'msgspec'):
+        try:
+            name, loads, dumps = get_codec(backend)
+        except ImportError:
+            print(f"{backend}: not installed")
+            continue
+        start = time.perf_counter()
+        decoded = [loads(line) for line in lines]
+        decode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        encoded = [dumps(record) for record in records]
+        encode_time = time.perf_counter() - start
+        same = decoded == expected and encoded == [json.dumps(record).encode('utf-8') for record in records]
+        print(f"{name}: decode {len(lines) / decode_time:,.0f} lines/s, encode {len(records) / encode_time:,.0f} "
+              f"records/s, {sum(map(len, encoded)) / len(encoded):.0f} bytes/record, same values: {same}")
+        if not same:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Backbone snapshot: size, write time and load time against a full load of the same tables, with a parity check
+
+The db load runs against the SQLite copy of bench_mapping_loader, so it leaves out the Secrets
+Manager calls, the SSH tunnel and the network round trips a cold start pays on top of it.
+
+    python benchmarks/bench_snapshot.py [--rounds 5]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import fixtures  # noqa: F401  (puts src on the path)
+from backbone import BackboneSession
+from bench_mapping_loader import build_database
+from helpers import get_table_fingerprints, load_mapping_tables
+from snapshot import dump_snapshot, load_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'backbone.db')
+        tables = build_database(path)
+        session = BackboneSession(*[None] * 6, connect=lambda: sqlite3.connect(path, check_same_thread=False))
+        timings = {'db': float('inf'), 'dump': float('inf'), 'snapshot': float('inf')}
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            fingerprints = get_table_fingerprints(session, tables)
+            loaded = load_mapping_tables(session, tables)
+            timings['db'] = min(timings['db'], time.perf_counter() - start)
+            mapping_tables_desc = {table: desc for table, (desc, _) in loaded.items() if desc is not None}
+            mapping_tables = {table: lookup for table, (_, lookup) in loaded.items()}
+            start = time.perf_counter()
+            data = dump_snapshot(tables, mapping_tables_desc, mapping_tables, fingerprints)
+            timings['dump'] = min(timings['dump'], time.perf_counter() - start)
+            start = time.perf_counter()
+            snapshot = load_snapshot(data)
+            timings['snapshot'] = min(timings['snapshot'], time.perf_counter() - start)
+
+    mismatches = [table for table in tables
+                  if snapshot['mapping_tables'][table] != mapping_tables[table]
+                  or snapshot['mapping_tables_desc'].get(table) != mapping_tables_desc.get(table)
+                  or snapshot['fingerprints'][table] != fingerprints[table]]
+    print(f"{len(tables)} tables: snapshot {len(data) / 1024:,.0f} KiB written in {timings['dump'] * 1000:.1f} ms, "
+          f"loaded in {timings['snapshot'] * 1000:.1f} ms vs {timings['db'] * 1000:.1f} ms from SQLite "
+          f"(x{timings['db'] / timings['snapshot']:.1f}), mismatches {mismatches or 0}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
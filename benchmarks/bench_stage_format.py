@@ -0,0 +1,76 @@
+"""
+Stage output size and scan cost: gzip'd JSON lines vs Parquet
+
+Writes the same cleaned cars through MultipartGzipUpload and through ParquetStageWriter over
+a MultipartUpload, into an in-memory S3 stand-in. Scan cost is what Athena bills: the whole
+object for JSON, the column chunks of the selected columns for Parquet.
+
+    python benchmarks/bench_stage_format.py [--records 50000] [--row-group-size 50000] [--compression zstd]
+"""
+import argparse
+import io
+import logging
+import time
+
+import pyarrow.parquet as pq
+
+import fixtures
+from clean import clean_chunk, iter_chunks
+from parquet_stage import ParquetStageWriter
+from s3_stream import MultipartUpload, MultipartGzipUpload
+from serializers import dumps
+
+QUERIES = {
+    'make, model, year': ['make', 'model', 'year'],
+    'admeid, tracking_id': ['admeid', 'tracking_id'],
+    'all ids': ['year_id', 'make_id', 'model_id', 'spec_id', 'doors_id', 'fuel_type_id', 'admeid'],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=50000)
+    parser.add_argument('--row-group-size', type=int, default=50000)
+    parser.add_argument('--compression', default='zstd')
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    cleaning_functions = fixtures.cleaning_functions()
+    mapping_tables_desc, mapping_tables = fixtures.mapping_tables()
+    lines = fixtures.feed_lines(mapping_tables_desc, args.records, distinct=args.records // 4)
+    cars = [car for chunk in iter_chunks(lines, 1000)
+            for car, _ in clean_chunk(chunk, cleaning_functions, mapping_tables_desc, mapping_tables, logger)]
+    s3 = fixtures.MemoryS3()
+
+    start = time.perf_counter()
+    with MultipartGzipUpload(s3, 'stage', 'cars.json.gz') as upload:
+        upload.write(b'\n'.join(dumps(car) for car in cars))
+        upload.close()
+    json_time = time.perf_counter() - start
+    start = time.perf_counter()
+    with MultipartUpload(s3, 'stage', 'cars.parquet') as upload:
+        writer = ParquetStageWriter(upload, args.row_group_size, args.compression)
+        for car in cars:
+            writer.write(car)
+        writer.close()
+        upload.close()
+    parquet_time = time.perf_counter() - start
+
+    json_size = len(s3.objects[('stage', 'cars.json.gz')])
+    parquet = s3.objects[('stage', 'cars.parquet')]
+    metadata = pq.ParquetFile(io.BytesIO(parquet)).metadata
+    assert metadata.num_rows == len(cars)
+    print(f"{len(cars)} cars: json.gz {json_size / 1024:,.0f} KiB in {json_time:.2f} s, parquet ({args.compression}, "
+          f"{metadata.num_row_groups} row groups) {len(parquet) / 1024:,.0f} KiB in {parquet_time:.2f} s")
+    for name, columns in QUERIES.items():
+        scanned = sum(metadata.row_group(group).column(position).total_compressed_size
+                      for group in range(metadata.num_row_groups)
+                      for position in range(metadata.num_columns)
+                      if metadata.row_group(group).column(position).path_in_schema in columns)
+        print(f"  scan {name}: json.gz {json_size / 1024:,.0f} KiB, parquet {scanned / 1024:,.1f} KiB "
+              f"(x{json_size / scanned:,.0f} less)")
+
+
+if __name__ == '__main__':
+    main()
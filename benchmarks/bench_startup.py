@@ -0,0 +1,58 @@
+"""
+Cold start budget of the Lambda handler: import time of main in a fresh interpreter
+
+Fails when the import takes longer than the budget or when one of the heavy dependencies,
+which are loaded on first use, gets imported at module load again.
+
+    python benchmarks/bench_startup.py [--budget-ms 250] [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import fixtures
+
+HEAVY_MODULES = ['boto3', 'botocore', 'pandas', 'paramiko', 'sshtunnel', 'pymysql', 'pytz']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'modules': sorted(name for name in %r if name in sys.modules),
+                  'import_times': main.startup.import_times}))
+"""
+
+
+def probe(instrument: bool) -> dict:
+    src = os.path.join(fixtures.ROOT, 'src')
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([src, fixtures.ROOT]), 'aws_access_key': '',
+           'aws_secret_key': '', 'AWS_DEFAULT_REGION': 'us-east-1'}
+    code = PROBE % HEAVY_MODULES
+    if instrument:
+        code = "import conf; conf.cold_start_instrumentation = True\n" + code
+    output = subprocess.run([sys.executable, '-c', code], cwd=src, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=250)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [probe(instrument=False) for _ in range(args.runs)]
+    best = min(result['seconds'] for result in results) * 1000
+    heavy = sorted({name for result in results for name in result['modules']})
+    slowest = sorted(probe(instrument=True)['import_times'].items(), key=lambda item: -item[1])[:8]
+
+    print(f"import main: {best:.0f} ms (budget {args.budget_ms:.0f} ms), heavy modules loaded: {heavy or 'none'}")
+    print("slowest imports: " + ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in slowest))
+    if best > args.budget_ms or heavy:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Synthetic backbone tables and scraped feed lines for the benchmarks
+"""
+import json
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.append(ROOT)
+
+MAKES = ['Toyota', 'Nissan', 'BMW', 'Mercedes-Benz', 'Audi', 'Lexus', 'Kia', 'Hyundai', 'Ford', 'Chevrolet',
+         'Land Rover', 'Porsche', 'Mitsubishi', 'Honda', 'Mazda', 'Volkswagen', 'GMC', 'Jeep', 'Dodge', 'Infiniti']
+BODY_TYPES = ['Sedan', 'SUV', 'Hatchback', 'Coupe', 'Convertible', 'Pick Up', 'Van', 'Wagon', 'Crossover']
+FUEL_TYPES = ['PETROL', 'DIESEL', 'HYBRID', 'ELECTRIC']
+SYLLABLES = ['RA', 'VO', 'CA', 'MRY', 'LAN', 'D', 'CRU', 'ISER', 'PA', 'TROL', 'X', 'TI', 'GO', 'NE', 'SPORT', 'A']
+TRIMS = ['GL', 'GLS', 'SE', 'LE', 'XLE', 'LIMITED', 'PLATINUM', 'S LINE', 'M SPORT', 'AMG LINE', 'BASE', 'TOURING']
+
+
+def _name(rng, parts):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(parts))
+
+
+def mapping_tables(models: int = 2000, specs: int = 4000, seed: int = 7, mastercodes: int = 5000):
+    """
+    Return (mapping_tables_desc, mapping_tables) shaped like the first two values of mapping_table_cache.get
+    """
+    rng = random.Random(seed)
+    model_names = sorted({_name(rng, rng.randint(1, 3)) + rng.choice(['', ' ' + str(rng.randint(1, 9)) + '00'])
+                          for _ in range(models)})
+    spec_names = sorted({rng.choice(TRIMS) + rng.choice(['', ' ' + _name(rng, 1), ' ' + str(rng.randint(1, 5)) + '.0'])
+                         for _ in range(specs)} | set(TRIMS))
+    desc = {
+        'bb_modelyear': [str(year) for year in range(1990, 2026)],
+        'bb_doors': ['2 DOORS', '3 DOORS', '4 DOORS', '5 DOORS'],
+        'bb_seats': [f'{seats} SEATS' for seats in range(2, 10)],
+        'bb_gears': [f'{gears} GEARS' for gears in range(4, 11)],
+        'bb_noofcyls': ['3', '4', '6', '8', '10', '12'],
+        'bb_hp': [f'{hp} HP' for hp in range(80, 700, 5)],
+        'bb_fuel': FUEL_TYPES,
+        'bb_body': BODY_TYPES,
+        'bb_enginesize': [f'{size / 10} L' for size in range(10, 70)],
+        'bb_transmissions': ['AUTOMATIC', 'MANUAL', 'CVT'],
+        'bb_make': MAKES,
+        'bb_model': model_names,
+        'bb_specifications': spec_names,
+    }
+    tables = {table: {value.upper(): position + 1 for position, value in enumerate(values)}
+              for table, values in desc.items() if table not in ('bb_model', 'bb_specifications')}
+    tables['bb_model'] = {str(rng.randint(1, len(MAKES))) + value.upper(): position + 1
+                          for position, value in enumerate(model_names)}
+    tables['bb_specifications'] = {str(rng.randint(1, len(model_names))) + value.upper(): position + 1
+                                   for position, value in enumerate(spec_names)}
+    tables['mastercodes_cache'] = [
+        {'admeid': 100000 + position, 'year_id': str(rng.randint(1, 36)), 'make_id': str(rng.randint(1, len(MAKES))),
+         'model_id': rng.randint(1, len(model_names)), 'doors_id': str(rng.randint(1, 4)), 'body_type_id': '',
+         'transmission_id': str(rng.randint(1, 3)), 'no_of_cylinders_id': '', 'fuel_type_id': str(rng.randint(1, 4)),
+         'gears_id': '', 'seats_id': '', 'spec_id': rng.randint(1, len(spec_names))}
+        for position in range(mastercodes)]
+    return desc, tables
+
+
+def _dirty(rng, value, dirtiness=None):
+    if dirtiness is None:
+        return rng.choice([value, value.lower(), f' {value} ', value.replace(' ', '-'), f'{value} 4WD'])
+    if rng.random() >= dirtiness:
+        return value
+    return rng.choice([value.lower(), f' {value} ', value.replace(' ', '-'), f'{value} 4WD', f'{value}  AWD',
+                       value.title(), f'{value}.'])
+
+
+def _noise(rng, value, dirtiness):
+    # untouched (and no random draw) without a dirtiness, so the default feeds stay the same
+    if dirtiness is None or not isinstance(value, str) or value == '':
+        return value
+    if rng.random() >= dirtiness:
+        return value
+    return rng.choice([value.lower(), value.upper(), f'  {value} ', value.replace(' ', '  ')])
+
+
+def feed_lines(mapping_tables_desc, records: int = 5000, distinct: int = 500, seed: int = 11,
+               dirtiness: float = None) -> list[bytes]:
+    """
+    Return newline-free JSON lines as read by ``iter_lines()``, repeating ``distinct`` listings
+
+    Args:
+        dirtiness : share of the Make/Model/Spec/bodystyle/warranty values with casing, spacing and
+                    suffix noise, None for the fixed mix the other benchmarks use
+    """
+    rng = random.Random(seed)
+    models = mapping_tables_desc['bb_model']
+    specs = mapping_tables_desc['bb_specifications']
+    listings = []
+    for number in range(distinct):
+        make = rng.choice(MAKES)
+        listings.append({
+            'job_id': 'job-1', 'spider': 'spider-1', 'Car_Name': 'car', 'Car_URL': f'https://cars.example/{number}',
+            'City': 'Dubai', 'Country': 'UAE', 'Doors': rng.choice(['4', '5', '2 doors', 4]),
+            'Make': _noise(rng, rng.choice([make, make.upper(), f' {make}']), dirtiness), 'Seller_Name': f'Seller {number % 40}',
+            'Seller_Type': rng.choice(['Dealer', 'Official Dealer', 'Owner']), 'Source': 'example',
+            'Spec': _dirty(rng, rng.choice(specs), dirtiness), 'Year': str(rng.randint(2005, 2024)),
+            'colour_exterior': ' white ', 'cylinders': rng.choice(['4 Cyl', '6', '8 Cyl']),
+            'engine_size': rng.choice(['2.0', '1998', '3.5 L', '2500cc']),
+            'fuel_type': rng.choice(['Petrol', 'Gasoline', 'Diesel', 'Petrol/LPG']),
+            'gearbox': rng.choice(['6', '8 speed', '']), 'horse_power': rng.choice(['180', '250 HP/184 kW', 300, '']),
+            'meta': {'url': f'https://cars.example/{number}'},
+            'model': _dirty(rng, rng.choice(models), dirtiness) + rng.choice(['', ' ' + rng.choice(TRIMS)]),
+            'bodystyle': _noise(rng, rng.choice(['SUV', 'Sedan 4WD', 'saloon', '', 'Pick Up AWD']), dirtiness),
+            'seats': rng.choice(['5', '7 seats', '']), 'transmission': rng.choice(['Automatic Transmission', 'A/T', 'Manual']),
+            'vin': rng.choice(['', f'VIN{number:08d}']),
+            'warranty_untill_when': _noise(
+                rng, rng.choice(['2 years', '24 months', 'valid till 2026-05', '12-2027', 'until 2026', '']), dirtiness),
+            'service_contract_untill_when': rng.choice(['', '3 years', 'till jan-2027']),
+        })
+    return [json.dumps(rng.choice(listings)).encode('utf-8') for _ in range(records)]
+
+
+def cleaning_functions():
+    """
+    The handler's cleaning_functions, importing main without deployment credentials
+    """
+    os.environ.setdefault('aws_access_key', '')
+    os.environ.setdefault('aws_secret_key', '')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    from main import cleaning_functions
+    return cleaning_functions
+
+
+class MemoryS3:
+    """
+    The object and multipart calls of an S3 client, objects kept in memory
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self._uploads = {}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        data = self.objects[(Bucket, Key)]
+        if Range is None:
+            return {'Body': MemoryBody(data), 'ContentLength': len(data)}
+        first, last = map(int, Range.removeprefix('bytes=').split('-'))
+        body = data[first:last + 1]
+        return {'Body': MemoryBody(body), 'ContentLength': len(body),
+                'ContentRange': f'bytes {first}-{first + len(body) - 1}/{len(data)}'}
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = str(len(self._uploads))
+        self._uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._uploads[UploadId][PartNumber] = Body
+        return {'ETag': f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self._uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._uploads.pop(UploadId, None)
+
+
+class MemoryBody:
+    """
+    The reads of a botocore StreamingBody over bytes
+    """
+
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+    def iter_chunks(self, chunk_size: int = 1024):
+        for start in range(0, len(self._data), chunk_size):
+            yield self._data[start:start + chunk_size]
+
+    def iter_lines(self, chunk_size: int = 1024, keepends: bool = False):
+        yield from self._data.splitlines(keepends)
@@ -0,0 +1,517 @@
+"""
+Previous implementations kept as the reference for parity checks and before/after timings
+"""
+import re
+import zlib
+from datetime import datetime
+
+import fixtures  # noqa: F401  (puts src on the path)
+from conf import COMPOSITE_KEY
+from helpers import extract_numbers, remove_makes, remove_descriptions, custom_sort
+from startup import lazy_import
+
+
+def get_key(search_string, models):
+    return models.index(search_string.upper()) if search_string.upper() in models else False
+
+
+def find_key_by_value(dict_list, value):
+    for dictionary in dict_list:
+        if value in dictionary.values():
+            return next(iter(dictionary.keys()))  # Returns the first key found
+    return None
+
+
+def get_new_descriptions(data):
+    new_descriptions = [desc.replace(' ', '').replace('-', '') for desc in data]
+    result = [{desc: new_desc} for desc, new_desc in zip(data, new_descriptions)]
+    return result
+
+
+def cleaning_model(model, make, data_to_map, logger):
+    """
+    Clean the model of the car by matching
+    value in the backbone tables for mapping
+
+    Args:
+        model : model of the car
+        make : make of the car
+        data_to_map : mapping tables in backbone db
+        logger: logger
+    """
+    try:
+        if model and make:
+            model = model.strip().upper()
+            mapping_data = data_to_map['bb_model']
+            
+            models = list(map(str.upper, mapping_data))
+            
+            if model in models:
+                return model
+                
+            pieces = model.split(' ')
+            if len(pieces) > 2:
+                key = get_key(pieces[0]+pieces[1]+" "+pieces[2], models)
+                if key:
+                    return models[key]
+                key = get_key(pieces[0]+" "+pieces[1]+pieces[2], models)
+                if key:
+                    return models[key]
+                key = get_key(pieces[0]+"-"+pieces[1]+" "+pieces[2], models)
+                if key:
+                    return models[key]
+                key = get_key(pieces[0]+" "+pieces[1]+"-"+pieces[2], models)
+                if key:
+                    return models[key]
+            
+            if len(pieces) > 1:
+                key = get_key(pieces[0]+pieces[1], models)
+                if key:
+                    return models[key]
+                key = get_key(pieces[0]+" "+pieces[1], models)
+                if key:
+                    return models[key]
+                key = get_key(pieces[0]+"-"+pieces[1], models)
+                if key:
+                    return models[key]
+
+            # modelsString part is missing here
+            new_model_descriptions = get_new_descriptions(models)
+            value = find_key_by_value(new_model_descriptions, pieces[0])
+            if value:
+                return value
+            value = find_key_by_value(new_model_descriptions, pieces[0].replace("-", ""))
+            if value:
+                return value
+            value = find_key_by_value(new_model_descriptions, model.replace(' ', '').replace('-', ''))
+            if value:
+                return value
+            
+            possible_models = []
+            for key, value in enumerate(models):
+                regex = r'\b({})\b'.format(value)
+                matches = re.findall(regex, model, re.IGNORECASE)
+                if matches:
+                    possible_models.append({'words': len(matches), 'value': matches[0]})
+            
+            if possible_models:
+                if len(possible_models) == 1:
+                    single_model = [item['value'] for item in possible_models]
+                    return single_model[0]
+                # model_array = sorted(possible_models, key=custom_sort, reverse=True)
+                model_array = list(set(item['value'] for item in possible_models))
+                for value in model_array:
+                    regex = r'\b({})\b'.format(value)
+                    matches = re.findall(regex, model, re.IGNORECASE)
+                    if matches:
+                        return matches[0].upper().strip()
+                        
+            makes = data_to_map['bb_make']
+            makes = list(set(makes))
+            model = remove_makes(model, makes)
+            if model in models:
+                return model
+
+            fuel_types = data_to_map['bb_fuel']
+            engine_sizes = data_to_map['bb_enginesize']
+            body_types = data_to_map['bb_body']
+            hps = data_to_map['bb_hp']
+            specs = data_to_map['bb_specifications']
+
+            engines = [size.replace(" ", "") for size in engine_sizes]
+            array_to_search_and_remove = fuel_types+engine_sizes+body_types+engines+hps
+            model = remove_descriptions(model, array_to_search_and_remove)
+            if model in models:
+                return model
+
+            for value in specs:
+                if not str(value).isnumeric():
+                    matches = re.findall(r'\b({})\b'.format(re.escape(value)), model, re.IGNORECASE)
+                    result = ''.join(matches)
+                    if result:
+                        if len(matches) > 1:
+                            result = matches[0]
+                        if len(result) != 1:
+                            if result == model:
+                                model = result
+                            else:
+                                model = model.replace(result, "").strip()
+                            break
+            
+            if model.replace("  ", " ") in models:
+                return model
+                
+            if make.lower() == 'toyota':
+                engine_number = [value.replace(" L", "") for value in engine_sizes]
+                hp_number = [value.replace(" HP", "") for value in hps]
+                search_and_remove = engine_number + hp_number
+                string = model
+                for term in search_and_remove:
+                    string = string.replace(term, "")
+                model = string.strip().upper().replace("  ", " ")
+                if model in models:
+                    return model
+            
+            return model
+    except Exception as e:
+        logger.exception(f"Error: {e} === Value: {model}")
+        return model
+    
+    return model
+
+
+def cleaning_spec(spec, make, data_to_map, logger):
+    """
+    Clean specification of car by matching
+    it with different mapping tables in the
+    backbone database
+
+    Args:
+        spec : specification of the car
+        make : make of the car
+        data_to_map : mapping tables in backbone db
+        logger: logger
+    """
+    try:
+        if spec and make:
+            spec = spec.strip().upper()
+            mapping_data = data_to_map['bb_specifications']
+            specs = list(map(str.upper, mapping_data))
+            
+            if spec in specs:
+                return spec
+                
+            pieces = spec.split(' ')
+            if len(pieces) > 2:
+                key = get_key(pieces[0]+pieces[1]+" "+pieces[2], specs)
+                if key:
+                    return specs[key]
+                key = get_key(pieces[0]+" "+pieces[1]+pieces[2], specs)
+                if key:
+                    return specs[key]
+                key = get_key(pieces[0]+"-"+pieces[1]+" "+pieces[2], specs)
+                if key:
+                    return specs[key]
+                key = get_key(pieces[0]+" "+pieces[1]+"-"+pieces[2], specs)
+                if key:
+                    return specs[key]
+            
+            if len(pieces) > 1:
+                key = get_key(pieces[0]+pieces[1], specs)
+                if key:
+                    return specs[key]
+                key = get_key(pieces[0]+" "+pieces[1], specs)
+                if key:
+                    return specs[key]
+                key = get_key(pieces[0]+"-"+pieces[1], specs)
+                if key:
+                    return specs[key]
+
+            # specsString part is missing here
+            new_spec_descriptions = get_new_descriptions(specs)
+            value = find_key_by_value(new_spec_descriptions, pieces[0])
+            if value:
+                return value
+            value = find_key_by_value(new_spec_descriptions, pieces[0].replace("-", ""))
+            if value:
+                return value
+            value = find_key_by_value(new_spec_descriptions, spec.replace(' ', '').replace('-', ''))
+            if value:
+                return value
+            
+            possible_specs = []
+            for key, value in enumerate(specs):
+                regex = r'\b({})\b'.format(value)
+                matches = re.findall(regex, spec, re.IGNORECASE)
+                if matches:
+                    possible_specs.append({'words': len(matches), 'value': matches[0]})
+            
+            if possible_specs:
+                if len(possible_specs) == 1:
+                    single_spec = [item['value'] for item in possible_specs]
+                    return single_spec[0]
+                spec_array = sorted(possible_specs, key=custom_sort, reverse=True)
+                spec_array = list(set(item['value'] for item in spec_array))
+                for value in spec_array:
+                    regex = r'\b({})\b'.format(value)
+                    matches = re.findall(regex, spec, re.IGNORECASE)
+                    if matches:
+                        return matches[0].upper().strip()
+
+            makes = data_to_map['bb_make']
+            makes = list(set(makes))
+            spec = remove_makes(spec, makes)
+            
+            if spec in specs:
+                return spec
+                
+            fuel_types = data_to_map['bb_fuel']
+            engine_sizes = data_to_map['bb_enginesize']
+            body_types = data_to_map['bb_body']
+            hps = data_to_map['bb_hp']
+
+            engines = [size.replace(" ", "").lower() for size in engine_sizes]
+            
+            array_to_search_and_remove = fuel_types+engine_sizes+body_types+engines+hps
+            spec = remove_descriptions(spec, array_to_search_and_remove)
+            if spec in specs:
+                return spec
+                
+            if make.lower() == 'toyota':
+                engine_number = [value.replace(" L", "") for value in engine_sizes]
+                hp_number = [value.replace(" HP", "") for value in hps]
+                search_and_remove = engine_number + hp_number
+                string = spec
+                for term in search_and_remove:
+                    string = string.replace(term, "")
+                spec = string.strip().upper().replace("  ", " ")
+                if spec in specs:
+                    return spec
+            
+            return spec
+    except Exception as e:
+        logger.exception(f"Error: {e} === Value: {spec}")
+        return spec
+    
+    return spec
+
+
+def count_months(date):
+    current_date = datetime.now().date()
+    year1 = current_date.year
+    year2 = date.year
+    month1 = current_date.month
+    month2 = date.month
+    diff = ((year2 - year1) * 12) + (month2 - month1)
+    return str(diff)
+
+
+def parse_date(date_string):
+    formats = ['%Y-%m-%d', '%d-%m-%Y', '%Y-%b-%d', '%d-%b-%Y', '%b-%Y', '%Y-%b', '%d/%m/%Y', '%Y/%m/%d']
+    try:
+        for fmt in formats:
+            try:
+                return datetime.strptime(date_string, fmt)
+            except ValueError:
+                continue
+        # If none of the formats work, raise an exception or return None
+        raise ValueError("Date string does not match any known format = ", date_string)
+    except Exception as e:
+        return False
+
+
+def clean_for_duration(line, logger):
+    """Find out car warranty duration in months
+
+    Args:
+        line : dates of car warranty
+        logger: logger
+    """
+    try:
+        if line and isinstance(line, str):
+            line = line.strip().lower()
+
+            if 'years' in line or 'year' in line:
+                years = extract_numbers(line)
+                return str(int(years)*12)+" MONTHS"
+            if 'months' in line or 'month' in line:
+                months = extract_numbers(line)
+                return months+" MONTHS"
+            if 'valid till' in line:
+                year = re.sub(r'[^0-9-]', '', line)
+                if year:
+                    date = parse_date(year)
+                    return count_months(date)+" MONTHS"
+            if 'till' in line:
+                pattern = r'(?:jan|feb|mar|apr|aay|jun|jul|aug|sep|oct|nov|dec)-\d{4}'
+                matches = re.findall(pattern, line)
+                date = parse_date(matches[0])
+                return count_months(date)+" MONTHS"
+            if 'until' in line:
+                until_year = int(re.sub(r'[^0-9]', '', line))
+                current_year = datetime.now().year
+                current_month = datetime.now().month
+                diff = ((until_year - current_year) * 12) + (12 - current_month)
+                return str(diff)+" MONTHS"
+            
+            value_datetime = parse_date(line)
+            
+            if value_datetime:
+                return count_months(value_datetime)+" MONTHS"
+
+            warranty = line.split()
+            if len(warranty) > 1 and parse_date(warranty[0]):
+                current_date = datetime.now().date()
+                warranty_date = parse_date(warranty[0])
+                diff = ((warranty_date.year - current_date.year) * 12) + (warranty_date.month - current_date.month)
+                return str(diff)+" MONTHS"
+            
+            return line
+        return line
+    except Exception as e:
+        logger.exception(f"Error: {e} === Value: {line}")
+        return line
+
+
+def clean_body_type(body_type, spec, model, dataToMap , excluded_words):
+
+    misc = 'SALOON'
+    bodystyle = body_type
+    bodyTypes = dataToMap['bb_body']
+    excludedWords = excluded_words
+    flag = True if body_type else False
+
+    output = []
+
+    if flag:
+        # Find the index of the string in the uppercase body types list
+        key = next((i for i, item in enumerate(bodyTypes) if item.upper() == bodystyle), None)
+
+        if key is not None:
+            output.append(bodyTypes[key])
+        else:
+            # Remove excluded words and trim
+            for excluded_word in excludedWords:
+                bodystyle = bodystyle.replace(excluded_word.upper(), "")
+            bodystyle = bodystyle.strip()
+
+            # Check again for the cleaned string
+            key = next((i for i, item in enumerate(bodyTypes) if item.upper() == bodystyle), None)
+
+            if key is not None:
+                output.append(bodyTypes[key])
+            elif bodystyle == misc:
+                output.append('SEDAN')
+            else:
+                for value in bodyTypes:
+                    matches = re.findall(r'\b(' + re.escape(value) + r')\b', bodystyle, re.IGNORECASE)
+                    if matches:
+                        output.append(matches[0].strip().upper())
+                        break
+                else:
+                    matches = re.findall(r'\b(' + re.escape(misc) + r')\b', bodystyle, re.IGNORECASE)
+                    if matches:
+                        output.append(matches[0].strip().upper())
+                    else:
+                        output.append(None)
+    else:
+        if spec is not None:
+            # Remove excluded words and trim for spec
+            for excluded_word in excludedWords:
+                spec = spec.replace(excluded_word.upper(), "")
+            spec = spec.strip()
+
+            # Search for matches in spec
+            spec_match = False
+            for value in bodyTypes:
+                matches = re.findall(r'\b(' + re.escape(value) + r')\b', spec, re.IGNORECASE)
+                if matches:
+                    output.append(matches[0].strip().upper())
+                    spec_match = True
+                    break
+
+            if not spec_match:
+                matches = re.findall(r'\b(' + re.escape(misc) + r')\b', spec, re.IGNORECASE)
+                if matches:
+                    output.append(matches[0].strip().upper())
+                else:
+                    output.append(None)
+        else:
+            if model is not None:
+                # Remove excluded words and trim for model
+                for excluded_word in excludedWords:
+                    model = model.replace(excluded_word.upper(), "")
+                model = model.strip()
+
+                # Search for matches in model
+                model_match = False
+                for value in bodyTypes:
+                    matches = re.findall(r'\b(' + re.escape(value) + r')\b', model, re.IGNORECASE)
+                    if matches:
+                        output.append(matches[0].strip().upper())
+                        model_match = True
+                        break
+
+                if not model_match:
+                    matches = re.findall(r'\b(' + re.escape(misc) + r')\b', model, re.IGNORECASE)
+                    if matches:
+                        output.append(matches[0].strip().upper())
+                    else:
+                        output.append(None)
+            else:
+                output.append(None)
+    return output[0]
+
+
+def add_admeid(car_data, mapping_tables):
+    mastercode_cache = mapping_tables['mastercodes_cache']
+    if not car_data['year_id'] or not car_data['make_id'] or not car_data['model_id']:
+        car_data['admeid'] = ''
+    else:
+        # Rename keys for master code cache
+        # - do renaming in mastercode_cache df and then convert to list of dicts
+        # Create a new dictionary containing only non-empty values for keys present in COMPOSITE_KEY
+        filtered_car_data = {key: car_data[key] for key in COMPOSITE_KEY if car_data.get(key)}
+        updated_composite_key = list(filtered_car_data.keys())
+        # Filter mastercode_cache except admeid
+        filtered_mastercode_cache = [{key: dictionary[key] for key in dictionary if key in updated_composite_key or key == 'admeid'} for dictionary in mastercode_cache]
+        match_found = False
+        for mastercode_cache_dict in filtered_mastercode_cache:
+            # Check if all values in original_dict match the values in additional_dict
+            if all(filtered_car_data[key] == mastercode_cache_dict[key] for key in filtered_car_data):
+                # Add the 'admeid' value to the original dictionary
+                car_data['admeid'] = mastercode_cache_dict['admeid']
+                match_found = True
+                break  # Stop iterating if a match is found
+        if not match_found:
+            # Handle the case when a match is not found
+            car_data['admeid'] = ''
+
+            
+    return car_data
+
+
+def load_mapping_table(conn, table):
+    import pandas as pd
+    from conf import rename_mastercode_cache
+
+    if table == 'bb_model':
+        query = "SELECT id, upper(description) as description, make_id FROM {};".format(table)
+        data = pd.read_sql_query(query, conn)
+        lookup = {str(makecode) + description: id for id, description, makecode in data.values}
+    elif table == 'bb_specifications':
+        query = "SELECT id, upper(description) as description, model_id FROM {};".format(table)
+        data = pd.read_sql_query(query, conn)
+        lookup = {str(modelid) + description: id for id, description, modelid in data.values}
+    elif table == 'mastercodes_cache':
+        query = "SELECT admeid, model_year, make, model, doors, body_type, transmission, no_of_cyls, fuel, gears, seats, spec FROM {};".format(table)
+        data = pd.read_sql_query(query, conn)
+        data  = data.rename(columns=rename_mastercode_cache)
+        lookup = data.to_dict(orient='records')
+    else:
+        query = "SELECT id, upper(description) as description FROM {};".format(table)
+        data = pd.read_sql_query(query, conn)
+        lookup = data.set_index('description')['id'].to_dict()
+
+    if table == 'mastercodes_cache':
+        return None, lookup
+    query = "SELECT DISTINCT description FROM {};".format(table)
+    data = pd.read_sql_query(query, conn)
+    return data['description'].tolist(), lookup
+
+
+def decompress_chunks(chunks, compression):
+    if compression == 'gzip':
+        new_decompressor = lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+    else:
+        new_decompressor = lazy_import('zstandard').ZstdDecompressor().decompressobj
+    decompressor = new_decompressor()
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = new_decompressor()
@@ -0,0 +1,289 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from conf import backbone_secret_ttl_seconds
+from metrics import stage
+from startup import lazy_import
+
+
+def get_secret(secret, region, aws_access_key: str, aws_secret_key: str) -> str:
+    boto3 = lazy_import('boto3')
+    session = boto3.session.Session(aws_access_key_id=aws_access_key, aws_secret_access_key=aws_secret_key)
+    client = session.client(service_name='secretsmanager', region_name=region)
+    response = client.get_secret_value(SecretId=secret)
+    return response['SecretString']
+
+
+class SecretCache:
+    """
+    Secrets Manager values kept for ``ttl_seconds``
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, secret, region, aws_access_key: str, aws_secret_key: str) -> str:
+        key = (secret, region, aws_access_key)
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl_seconds:
+                return cached[1]
+        value = get_secret(secret, region, aws_access_key, aws_secret_key)
+        with self._lock:
+            self._values[key] = (time.monotonic(), value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+secret_cache = SecretCache(backbone_secret_ttl_seconds)
+
+
+class BackboneSession:
+    """
+    SSH tunnel and MySQL connection to the backbone db, kept open across warm invocations
+
+    The connection is pinged before use and the tunnel and connection are rebuilt when
+    either is down. Concurrent loads add pooled connections through the same tunnel.
+    ``connect`` replaces the tunnel and MySQL with any DB-API connection factory, e.g.
+    ``lambda: sqlite3.connect(path, check_same_thread=False)`` for a local stand-in; its
+    connections are used from worker threads by execute_concurrently.
+    """
+
+    def __init__(self, secret, region, aws_access_key, aws_secret_key, host, rds_pem_key, connect=None):
+        self.secret = secret
+        self.region = region
+        self.aws_access_key = aws_access_key
+        self.aws_secret_key = aws_secret_key
+        self.host = host
+        self.rds_pem_key = rds_pem_key
+        self._connect = connect
+        self._tunnel = None
+        self._connection = None
+        self._pool = []
+        self._secrets = None
+        self._pkey = (None, None)
+        self._lock = threading.Lock()
+
+    @property
+    def multi_statements(self) -> bool:
+        return self._connect is None
+
+    def execute(self, queries: list[str]) -> list[tuple[list[str], list[tuple]]]:
+        """
+        Run the queries, in one round trip on MySQL, retrying once on a fresh connection
+
+        Returns:
+            (column names, rows) of every query
+        """
+        with self._lock:
+            try:
+                connection = self._get_connection()
+                with stage('backbone_query'):
+                    results = self._execute(connection, queries)
+            except self._retryable_errors():
+                self._reset()
+                connection = self._get_connection()
+                with stage('backbone_query'):
+                    results = self._execute(connection, queries)
+        return [(columns, rows) for columns, rows, _ in results]
+
+    def execute_concurrently(self, queries: list[str], parallelism: int, weights: list[float] = None) \
+            -> list[tuple[list[str], list[tuple], float]]:
+        """
+        Split the queries in up to ``parallelism`` batches of balanced weight and run the batches
+        at once, each in one round trip on its own connection, retrying once on fresh connections
+
+        Any failing batch aborts the whole call: the batches not started yet are cancelled and
+        the error is raised once the running ones finish.
+
+        Args:
+            queries : queries to run
+            parallelism : most connections used at once
+            weights : expected cost of each query, e.g. its table's row count, equal when not given
+        Returns:
+            (column names, rows, seconds until its rows were read) of every query, in the order of the queries
+        """
+        batches = balanced_batches(weights or [1] * len(queries), parallelism)
+        with self._lock:
+            try:
+                return self._execute_concurrently(queries, batches)
+            except self._retryable_errors():
+                self._reset()
+                return self._execute_concurrently(queries, batches)
+
+    def _execute_concurrently(self, queries, batches):
+        connections = [self._get_connection()] + self._pooled_connections(len(batches) - 1)
+
+        def run(connection, batch):
+            return self._execute(connection, [queries[index] for index in batch])
+
+        results = [None] * len(queries)
+        executor = ThreadPoolExecutor(len(batches), thread_name_prefix='backbone')
+        try:
+            with stage('backbone_query'):
+                for batch, batch_results in zip(batches, executor.map(run, connections, batches)):
+                    for index, result in zip(batch, batch_results):
+                        results[index] = result
+        finally:
+            executor.shutdown(cancel_futures=True)
+        return results
+
+    def _pooled_connections(self, count: int) -> list:
+        """
+        Extra connections besides the main one, reused across calls while they answer a ping
+        """
+        alive = []
+        for connection in self._pool:
+            if self._connect is None:
+                try:
+                    connection.ping(reconnect=False)
+                except Exception:
+                    self._close(connection)
+                    continue
+            alive.append(connection)
+        while len(alive) < count:
+            alive.append(self._open_connection())
+        self._pool = alive
+        return alive[:count]
+
+    def _retryable_errors(self) -> tuple:
+        if self._connect is not None:
+            return (OSError,)
+        errors = lazy_import('pymysql').err
+        return errors.OperationalError, errors.InterfaceError, OSError
+
+    def _execute(self, connection, queries):
+        """
+        (column names, rows, seconds) of every query, the seconds counted from the previous result
+        set read so that the first one carries the round trip
+        """
+        results = []
+        cursor = connection.cursor()
+        start = time.perf_counter()
+        try:
+            if self.multi_statements:
+                cursor.execute(' '.join(queries))
+                while True:
+                    rows = list(cursor.fetchall())
+                    now = time.perf_counter()
+                    results.append(([column[0] for column in cursor.description], rows, now - start))
+                    start = now
+                    if not cursor.nextset():
+                        break
+            else:
+                for query in queries:
+                    cursor.execute(query)
+                    rows = list(cursor.fetchall())
+                    now = time.perf_counter()
+                    results.append(([column[0] for column in cursor.description], rows, now - start))
+                    start = now
+        finally:
+            cursor.close()
+        return results
+
+    def _get_connection(self):
+        if self._connect is not None:
+            if self._connection is None:
+                self._connection = self._connect()
+            return self._connection
+        pymysql = lazy_import('pymysql')
+        if self._connection is not None and self._tunnel is not None and self._tunnel.is_active:
+            try:
+                self._connection.ping(reconnect=False)
+                return self._connection
+            except (pymysql.err.Error, OSError):
+                pass
+        self._reset()
+        with stage('backbone_secrets'):
+            secrets = json.loads(secret_cache.get(self.secret, self.region, self.aws_access_key, self.aws_secret_key))
+            pkey = self._private_key()
+        with stage('backbone_tunnel'):
+            self._tunnel = lazy_import('sshtunnel').SSHTunnelForwarder(
+                (secrets['ssh_hostname'], int(secrets['ssh_port'])), ssh_username=secrets['ssh_username'],
+                ssh_pkey=pkey, remote_bind_address=(secrets['host'], int(secrets['port'])))
+            self._tunnel.start()
+            self._secrets = secrets
+            self._connection = self._open_connection()
+        return self._connection
+
+    def _open_connection(self):
+        if self._connect is not None:
+            return self._connect()
+        CLIENT = lazy_import('pymysql.constants').CLIENT
+        return lazy_import('pymysql').connect(
+            host=self.host, user=self._secrets['username'], passwd=self._secrets['password'],
+            db=self._secrets['database'], port=self._tunnel.local_bind_port, client_flag=CLIENT.MULTI_STATEMENTS,
+            # a long lived connection must not keep reading one REPEATABLE READ snapshot
+            autocommit=True)
+
+    def _private_key(self):
+        rds_key = secret_cache.get(self.rds_pem_key, self.region, self.aws_access_key, self.aws_secret_key)
+        if self._pkey[0] != rds_key:
+            self._pkey = (rds_key, lazy_import('paramiko').RSAKey.from_private_key(StringIO(rds_key)))
+        return self._pkey[1]
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _reset(self):
+        for connection in self._pool:
+            self._close(connection)
+        self._pool = []
+        if self._connection is not None:
+            self._close(self._connection)
+            self._connection = None
+        if self._tunnel is not None:
+            try:
+                self._tunnel.stop()
+            except Exception:
+                pass
+            self._tunnel = None
+
+    def close(self):
+        with self._lock:
+            self._reset()
+
+
+def balanced_batches(weights: list[float], count: int) -> list[list[int]]:
+    """
+    Spread item indexes over at most ``count`` batches, heaviest first onto the lightest batch
+
+    Returns:
+        non empty batches of indexes, each in ascending order
+    """
+    batches = [[] for _ in range(min(count, len(weights)))]
+    totals = [0] * len(batches)
+    for index in sorted(range(len(weights)), key=lambda index: -weights[index]):
+        lightest = totals.index(min(totals))
+        batches[lightest].append(index)
+        totals[lightest] += weights[index]
+    return [sorted(batch) for batch in batches]
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_backbone_session(secret, region, aws_access_key, aws_secret_key, host, rds_pem_key) -> BackboneSession:
+    """
+    Return the container wide session for these settings, created on first use
+    """
+    key = (secret, region, aws_access_key, host, rds_pem_key)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = BackboneSession(
+                secret, region, aws_access_key, aws_secret_key, host, rds_pem_key)
+        return session
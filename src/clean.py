@@ -1,31 +1,90 @@
-import json
 import re
-from datetime import datetime
-from conf import seller_type_config, excluded_words, fields_data
-from helpers import count_months, extract_numbers, parse_date, is_float, get_key, get_new_descriptions,\
-    find_key_by_value, remove_makes, remove_descriptions, custom_sort,map_data,map_data,map_data_model_spec,add_admeid,add_id_keys
-
-
-def rename_columns_and_clean_data(contents, cleaning_functions, mapping_tables_desc,mapping_tables, logger) -> list[dict[str, str]]:
+from itertools import islice
+from typing import Iterator
+from conf import seller_type_config, excluded_words, fields_data, cleaning_chunk_size, columnar_cleaning
+from helpers import is_float, remove_makes, remove_descriptions, custom_sort,\
+    map_chunk,add_admeid,add_id_keys,make_tracking_id
+from mapping_index import get_mapping_index
+from duration import duration_parser
+from metrics import stage
+from serializers import loads
+
+
+def rename_columns_and_clean_data(contents, cleaning_functions, mapping_tables_desc,mapping_tables, logger,
+                                  pool=None, chunk_size: int = cleaning_chunk_size) -> Iterator[tuple[dict, dict]]:
     """
-    Apply cleaning functions depending upon attribute name
+    Apply cleaning functions depending upon attribute name, yielding (clean car, raw car) per line
 
     Args:
         contents: files contents read from s3
         cleaning_functions : dictionary of column name as key and function name as value
         mapping_tables_desc : list of dictionaries of backbone mapping tables
         logger: logger
+        pool : CleaningPool to clean the chunks in worker processes, cleaned in this process when None
+        chunk_size : lines per chunk
     """
     logger.info("======== Starting the data cleaning process ========")
-    clean_data = []
-    raw_data = []
-    for item in contents:
+    if pool is not None:
+        yield from pool.clean(contents, chunk_size)
+    else:
+        for chunk in iter_chunks(contents, chunk_size):
+            yield from clean_chunk(chunk, cleaning_functions, mapping_tables_desc, mapping_tables, logger)
+    logger.info("======== Data cleaning completed ========")
+
+
+def clean_chunk(lines, cleaning_functions, mapping_tables_desc, mapping_tables, logger,
+                columnar: bool = columnar_cleaning) -> list[tuple[dict, dict]]:
+    """
+    Clean and map a chunk of lines, lines that fail are logged and left out
+
+    Args:
+        columnar : clean the simple string columns of the whole chunk with Arrow kernels, see columnar_clean
+    """
+    raw_cars = []
+    with stage('parse'):
+        for item in lines:
+            try:
+                raw_cars.append(loads(item))
+            except Exception as e:
+                logger.exception(e)
+    with stage('clean'):
+        cleaned = _clean_records(raw_cars, cleaning_functions, mapping_tables_desc, logger, columnar)
+
+    # Car data mapping with backbone tables, the whole chunk at once
+    with stage('map'):
+        mapped_cars = map_chunk([car for car, _ in cleaned], mapping_tables)
+    mapped = []
+    with stage('admeid'):
+        for (_, raw_car), car in zip(cleaned, mapped_cars):
+            try:
+                if isinstance(car, Exception):
+                    raise car
+                car = add_admeid(car,mapping_tables)
+
+                # add ids to raw car data
+                raw_car = add_id_keys(raw_car,car)
+            except Exception as e:
+                logger.exception(e)
+                continue
+            mapped.append((car, raw_car))
+    return mapped
+
+
+def _clean_records(raw_cars, cleaning_functions, mapping_tables_desc, logger, columnar) -> list[tuple[dict, dict]]:
+    if columnar:
+        from columnar_clean import clean_columns
+        precleaned = clean_columns(raw_cars, cleaning_functions, logger)
+    else:
+        precleaned = [{}] * len(raw_cars)
+    cleaned = []
+    for raw_car, done in zip(raw_cars, precleaned):
         try:
-            raw_car = json.loads(item.decode('utf-8'))
             car = {}
             for raw_key, value in raw_car.items():
                 key = fields_data.get(raw_key, raw_key)
-                if key in cleaning_functions:
+                if raw_key in done:
+                    car[key] = done[raw_key]
+                elif key in cleaning_functions:
                     if key in ('doors', 'seats', 'gears'):
                         car[key] = cleaning_functions[key](value, key[:-1].upper(), logger)
                     elif key == 'model':
@@ -40,25 +99,19 @@ def rename_columns_and_clean_data(contents, cleaning_functions, mapping_tables_d
                     car[key] = value
 
             seller_name, url, vin = car.get('seller_name', ''), car['meta'].get('url', ''), car.get('vin', '')
-            car['tracking_id'] = re.sub(r'[^A-Za-z0-9]', '', seller_name + url if not vin else seller_name + vin)
-            raw_car['tracking_id'] = re.sub(r'[^A-Za-z0-9]', '', seller_name + url if not vin else seller_name + vin)
-            
-            # Car data mapping with backbone tables
-            car = map_data(car,mapping_tables)
-            car = map_data_model_spec(car,mapping_tables,'model','make_id')
-            car = map_data_model_spec(car,mapping_tables,'spec','model_id')
-            car = add_admeid(car,mapping_tables)
-            
-            # add ids to raw car data
-            raw_car = add_id_keys(raw_car,car)
-                
-            clean_data.append(car)
-            raw_data.append(raw_car)
+            car['tracking_id'] = make_tracking_id(seller_name, url, vin)
+            raw_car['tracking_id'] = make_tracking_id(seller_name, url, vin)
         except Exception as e:
             logger.exception(e)
             continue
-    logger.info("======== Data cleaning completed ========")
-    return clean_data,raw_data
+        cleaned.append((car, raw_car))
+    return cleaned
+
+
+def iter_chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 def trim_and_upper(input_string, logger):
@@ -297,140 +350,38 @@ def clean_for_duration(line, logger):
         line : dates of car warranty
         logger: logger
     """
-    try:
-        if line and isinstance(line, str):
-            line = line.strip().lower()
-
-            if 'years' in line or 'year' in line:
-                years = extract_numbers(line)
-                return str(int(years)*12)+" MONTHS"
-            if 'months' in line or 'month' in line:
-                months = extract_numbers(line)
-                return months+" MONTHS"
-            if 'valid till' in line:
-                year = re.sub(r'[^0-9-]', '', line)
-                if year:
-                    date = parse_date(year)
-                    return count_months(date)+" MONTHS"
-            if 'till' in line:
-                pattern = r'(?:jan|feb|mar|apr|aay|jun|jul|aug|sep|oct|nov|dec)-\d{4}'
-                matches = re.findall(pattern, line)
-                date = parse_date(matches[0])
-                return count_months(date)+" MONTHS"
-            if 'until' in line:
-                until_year = int(re.sub(r'[^0-9]', '', line))
-                current_year = datetime.now().year
-                current_month = datetime.now().month
-                diff = ((until_year - current_year) * 12) + (12 - current_month)
-                return str(diff)+" MONTHS"
-            
-            value_datetime = parse_date(line)
-            
-            if value_datetime:
-                return count_months(value_datetime)+" MONTHS"
-
-            warranty = line.split()
-            if len(warranty) > 1 and parse_date(warranty[0]):
-                current_date = datetime.now().date()
-                warranty_date = parse_date(warranty[0])
-                diff = ((warranty_date.year - current_date.year) * 12) + (warranty_date.month - current_date.month)
-                return str(diff)+" MONTHS"
-            
-            return line
-        return line
-    except Exception as e:
-        logger.exception(f"Error: {e} === Value: {line}")
-        return line
+    return duration_parser.parse(line, logger)
 
 
 def clean_body_type(body_type, spec, model, dataToMap , excluded_words):
+    """
+    Body type from the scraped body style, else the first body type found in the spec, else in the model
 
-    misc = 'SALOON'
-    bodystyle = body_type
-    bodyTypes = dataToMap['bb_body']
-    excludedWords = excluded_words
-    flag = True if body_type else False
-
-    output = []
-
-    if flag:
-        # Find the index of the string in the uppercase body types list
-        key = next((i for i, item in enumerate(bodyTypes) if item.upper() == bodystyle), None)
-
+    Args:
+        body_type : scraped body style
+        spec : cleaned spec of the car
+        model : cleaned model of the car
+        dataToMap : mapping tables in backbone db
+        excluded_words : drive types stripped before matching
+    """
+    matcher = get_mapping_index(dataToMap).body_type_matcher(excluded_words)
+    if body_type:
+        # exact hit on the body types, then again once the excluded words are removed
+        key = matcher.exact.get(body_type)
         if key is not None:
-            output.append(bodyTypes[key])
-        else:
-            # Remove excluded words and trim
-            for excluded_word in excludedWords:
-                bodystyle = bodystyle.replace(excluded_word.upper(), "")
-            bodystyle = bodystyle.strip()
-
-            # Check again for the cleaned string
-            key = next((i for i, item in enumerate(bodyTypes) if item.upper() == bodystyle), None)
-
-            if key is not None:
-                output.append(bodyTypes[key])
-            elif bodystyle == misc:
-                output.append('SEDAN')
-            else:
-                for value in bodyTypes:
-                    matches = re.findall(r'\b(' + re.escape(value) + r')\b', bodystyle, re.IGNORECASE)
-                    if matches:
-                        output.append(matches[0].strip().upper())
-                        break
-                else:
-                    matches = re.findall(r'\b(' + re.escape(misc) + r')\b', bodystyle, re.IGNORECASE)
-                    if matches:
-                        output.append(matches[0].strip().upper())
-                    else:
-                        output.append(None)
-    else:
-        if spec is not None:
-            # Remove excluded words and trim for spec
-            for excluded_word in excludedWords:
-                spec = spec.replace(excluded_word.upper(), "")
-            spec = spec.strip()
-
-            # Search for matches in spec
-            spec_match = False
-            for value in bodyTypes:
-                matches = re.findall(r'\b(' + re.escape(value) + r')\b', spec, re.IGNORECASE)
-                if matches:
-                    output.append(matches[0].strip().upper())
-                    spec_match = True
-                    break
-
-            if not spec_match:
-                matches = re.findall(r'\b(' + re.escape(misc) + r')\b', spec, re.IGNORECASE)
-                if matches:
-                    output.append(matches[0].strip().upper())
-                else:
-                    output.append(None)
-        else:
-            if model is not None:
-                # Remove excluded words and trim for model
-                for excluded_word in excludedWords:
-                    model = model.replace(excluded_word.upper(), "")
-                model = model.strip()
-
-                # Search for matches in model
-                model_match = False
-                for value in bodyTypes:
-                    matches = re.findall(r'\b(' + re.escape(value) + r')\b', model, re.IGNORECASE)
-                    if matches:
-                        output.append(matches[0].strip().upper())
-                        model_match = True
-                        break
-
-                if not model_match:
-                    matches = re.findall(r'\b(' + re.escape(misc) + r')\b', model, re.IGNORECASE)
-                    if matches:
-                        output.append(matches[0].strip().upper())
-                    else:
-                        output.append(None)
-            else:
-                output.append(None)
-    return output[0]
+            return key
+        bodystyle = matcher.strip_excluded(body_type)
+        key = matcher.exact.get(bodystyle)
+        if key is not None:
+            return key
+        if bodystyle == 'SALOON':
+            return 'SEDAN'
+        return matcher.search(bodystyle)
+    if spec is not None:
+        return matcher.search(matcher.strip_excluded(spec))
+    if model is not None:
+        return matcher.search(matcher.strip_excluded(model))
+    return None
 
 
 def cleaning_model(model, make, data_to_map, logger):
@@ -447,57 +398,52 @@ def cleaning_model(model, make, data_to_map, logger):
     try:
         if model and make:
             model = model.strip().upper()
-            mapping_data = data_to_map['bb_model']
-            
-            models = list(map(str.upper, mapping_data))
-            
-            if model in models:
+            index = get_mapping_index(data_to_map)
+            models = index.models
+
+            if model in models.upper_set:
                 return model
                 
             pieces = model.split(' ')
             if len(pieces) > 2:
-                key = get_key(pieces[0]+pieces[1]+" "+pieces[2], models)
+                key = models.find(pieces[0]+pieces[1]+" "+pieces[2])
                 if key:
-                    return models[key]
-                key = get_key(pieces[0]+" "+pieces[1]+pieces[2], models)
+                    return key
+                key = models.find(pieces[0]+" "+pieces[1]+pieces[2])
                 if key:
-                    return models[key]
-                key = get_key(pieces[0]+"-"+pieces[1]+" "+pieces[2], models)
+                    return key
+                key = models.find(pieces[0]+"-"+pieces[1]+" "+pieces[2])
                 if key:
-                    return models[key]
-                key = get_key(pieces[0]+" "+pieces[1]+"-"+pieces[2], models)
+                    return key
+                key = models.find(pieces[0]+" "+pieces[1]+"-"+pieces[2])
                 if key:
-                    return models[key]
+                    return key
             
             if len(pieces) > 1:
-                key = get_key(pieces[0]+pieces[1], models)
+                key = models.find(pieces[0]+pieces[1])
                 if key:
-                    return models[key]
-                key = get_key(pieces[0]+" "+pieces[1], models)
+                    return key
+                key = models.find(pieces[0]+" "+pieces[1])
                 if key:
-                    return models[key]
-                key = get_key(pieces[0]+"-"+pieces[1], models)
+                    return key
+                key = models.find(pieces[0]+"-"+pieces[1])
                 if key:
-                    return models[key]
+                    return key
 
             # modelsString part is missing here
-            new_model_descriptions = get_new_descriptions(models)
-            value = find_key_by_value(new_model_descriptions, pieces[0])
+            value = models.normalized.get(pieces[0])
             if value:
                 return value
-            value = find_key_by_value(new_model_descriptions, pieces[0].replace("-", ""))
+            value = models.normalized.get(pieces[0].replace("-", ""))
             if value:
                 return value
-            value = find_key_by_value(new_model_descriptions, model.replace(' ', '').replace('-', ''))
+            value = models.normalized.get(model.replace(' ', '').replace('-', ''))
             if value:
                 return value
             
             possible_models = []
-            for key, value in enumerate(models):
-                regex = r'\b({})\b'.format(value)
-                matches = re.findall(regex, model, re.IGNORECASE)
-                if matches:
-                    possible_models.append({'words': len(matches), 'value': matches[0]})
+            for matches in models.patterns.matches(model):
+                possible_models.append({'words': len(matches), 'value': matches[0]})
             
             if possible_models:
                 if len(possible_models) == 1:
@@ -511,50 +457,35 @@ def cleaning_model(model, make, data_to_map, logger):
                     if matches:
                         return matches[0].upper().strip()
                         
-            makes = data_to_map['bb_make']
-            makes = list(set(makes))
-            model = remove_makes(model, makes)
-            if model in models:
+            model = remove_makes(model, index.makes)
+            if model in models.upper_set:
                 return model
 
-            fuel_types = data_to_map['bb_fuel']
-            engine_sizes = data_to_map['bb_enginesize']
-            body_types = data_to_map['bb_body']
-            hps = data_to_map['bb_hp']
-            specs = data_to_map['bb_specifications']
-
-            engines = [size.replace(" ", "") for size in engine_sizes]
-            array_to_search_and_remove = fuel_types+engine_sizes+body_types+engines+hps
-            model = remove_descriptions(model, array_to_search_and_remove)
-            if model in models:
+            model = remove_descriptions(model, index.model_removals)
+            if model in models.upper_set:
                 return model
 
-            for value in specs:
-                if not str(value).isnumeric():
-                    matches = re.findall(r'\b({})\b'.format(re.escape(value)), model, re.IGNORECASE)
-                    result = ''.join(matches)
-                    if result:
-                        if len(matches) > 1:
-                            result = matches[0]
-                        if len(result) != 1:
-                            if result == model:
-                                model = result
-                            else:
-                                model = model.replace(result, "").strip()
-                            break
+            for matches in index.spec_patterns.matches(model):
+                result = ''.join(matches)
+                if result:
+                    if len(matches) > 1:
+                        result = matches[0]
+                    if len(result) != 1:
+                        if result == model:
+                            model = result
+                        else:
+                            model = model.replace(result, "").strip()
+                        break
             
-            if model.replace("  ", " ") in models:
+            if model.replace("  ", " ") in models.upper_set:
                 return model
                 
             if make.lower() == 'toyota':
-                engine_number = [value.replace(" L", "") for value in engine_sizes]
-                hp_number = [value.replace(" HP", "") for value in hps]
-                search_and_remove = engine_number + hp_number
                 string = model
-                for term in search_and_remove:
+                for term in index.toyota_removals:
                     string = string.replace(term, "")
                 model = string.strip().upper().replace("  ", " ")
-                if model in models:
+                if model in models.upper_set:
                     return model
             
             return model
@@ -580,56 +511,52 @@ def cleaning_spec(spec, make, data_to_map, logger):
     try:
         if spec and make:
             spec = spec.strip().upper()
-            mapping_data = data_to_map['bb_specifications']
-            specs = list(map(str.upper, mapping_data))
+            index = get_mapping_index(data_to_map)
+            specs = index.specs
             
-            if spec in specs:
+            if spec in specs.upper_set:
                 return spec
                 
             pieces = spec.split(' ')
             if len(pieces) > 2:
-                key = get_key(pieces[0]+pieces[1]+" "+pieces[2], specs)
+                key = specs.find(pieces[0]+pieces[1]+" "+pieces[2])
                 if key:
-                    return specs[key]
-                key = get_key(pieces[0]+" "+pieces[1]+pieces[2], specs)
+                    return key
+                key = specs.find(pieces[0]+" "+pieces[1]+pieces[2])
                 if key:
-                    return specs[key]
-                key = get_key(pieces[0]+"-"+pieces[1]+" "+pieces[2], specs)
+                    return key
+                key = specs.find(pieces[0]+"-"+pieces[1]+" "+pieces[2])
                 if key:
-                    return specs[key]
-                key = get_key(pieces[0]+" "+pieces[1]+"-"+pieces[2], specs)
+                    return key
+                key = specs.find(pieces[0]+" "+pieces[1]+"-"+pieces[2])
                 if key:
-                    return specs[key]
+                    return key
             
             if len(pieces) > 1:
-                key = get_key(pieces[0]+pieces[1], specs)
+                key = specs.find(pieces[0]+pieces[1])
                 if key:
-                    return specs[key]
-                key = get_key(pieces[0]+" "+pieces[1], specs)
+                    return key
+                key = specs.find(pieces[0]+" "+pieces[1])
                 if key:
-                    return specs[key]
-                key = get_key(pieces[0]+"-"+pieces[1], specs)
+                    return key
+                key = specs.find(pieces[0]+"-"+pieces[1])
                 if key:
-                    return specs[key]
+                    return key
 
             # specsString part is missing here
-            new_spec_descriptions = get_new_descriptions(specs)
-            value = find_key_by_value(new_spec_descriptions, pieces[0])
+            value = specs.normalized.get(pieces[0])
             if value:
                 return value
-            value = find_key_by_value(new_spec_descriptions, pieces[0].replace("-", ""))
+            value = specs.normalized.get(pieces[0].replace("-", ""))
             if value:
                 return value
-            value = find_key_by_value(new_spec_descriptions, spec.replace(' ', '').replace('-', ''))
+            value = specs.normalized.get(spec.replace(' ', '').replace('-', ''))
             if value:
                 return value
             
             possible_specs = []
-            for key, value in enumerate(specs):
-                regex = r'\b({})\b'.format(value)
-                matches = re.findall(regex, spec, re.IGNORECASE)
-                if matches:
-                    possible_specs.append({'words': len(matches), 'value': matches[0]})
+            for matches in specs.patterns.matches(spec):
+                possible_specs.append({'words': len(matches), 'value': matches[0]})
             
             if possible_specs:
                 if len(possible_specs) == 1:
@@ -643,34 +570,21 @@ def cleaning_spec(spec, make, data_to_map, logger):
                     if matches:
                         return matches[0].upper().strip()
 
-            makes = data_to_map['bb_make']
-            makes = list(set(makes))
-            spec = remove_makes(spec, makes)
+            spec = remove_makes(spec, index.makes)
             
-            if spec in specs:
+            if spec in specs.upper_set:
                 return spec
                 
-            fuel_types = data_to_map['bb_fuel']
-            engine_sizes = data_to_map['bb_enginesize']
-            body_types = data_to_map['bb_body']
-            hps = data_to_map['bb_hp']
-
-            engines = [size.replace(" ", "").lower() for size in engine_sizes]
-            
-            array_to_search_and_remove = fuel_types+engine_sizes+body_types+engines+hps
-            spec = remove_descriptions(spec, array_to_search_and_remove)
-            if spec in specs:
+            spec = remove_descriptions(spec, index.spec_removals)
+            if spec in specs.upper_set:
                 return spec
                 
             if make.lower() == 'toyota':
-                engine_number = [value.replace(" L", "") for value in engine_sizes]
-                hp_number = [value.replace(" HP", "") for value in hps]
-                search_and_remove = engine_number + hp_number
                 string = spec
-                for term in search_and_remove:
+                for term in index.toyota_removals:
                     string = string.replace(term, "")
                 spec = string.strip().upper().replace("  ", " ")
-                if spec in specs:
+                if spec in specs.upper_set:
                     return spec
             
             return spec
@@ -0,0 +1,91 @@
+import threading
+from functools import lru_cache
+
+from clean import clean_for_duration
+from conf import cleaner_memo_size
+from duration import duration_parser
+
+# Leading arguments of each cleaner that make up its cache key. The remaining ones (logger,
+# mapping tables, excluded words) are the same for a whole mapping tables version.
+KEY_ARGUMENTS = {'doors': 2, 'seats': 2, 'gears': 2, 'model': 2, 'spec': 2, 'body_type': 3}
+# Cleaners whose result depends on the run's date through count_months / the current year and month
+DATE_DEPENDENT = (clean_for_duration,)
+
+
+class _Unkeyed:
+    """
+    Carries the context arguments through lru_cache without making them part of the key
+    """
+    __slots__ = ('args',)
+
+    def __init__(self, args):
+        self.args = args
+
+    def __hash__(self):
+        return 0
+
+    def __eq__(self, other):
+        return True
+
+
+class CleanerMemo:
+    """
+    Bounded LRU memoization of the cleaning functions, dropped when the mapping tables change
+
+    Scraped feeds repeat the same raw values over and over, so every cleaner is cached on
+    its raw value and key arguments (make, spec, model, ...); date dependent cleaners also
+    on the current month. Unhashable values are cleaned without the cache.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._version = None
+        self._source = None
+        self._caches = {}
+        self._wrapped = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, cleaning_functions: dict, version) -> dict:
+        """
+        Return memoized cleaning functions, keeping the caches while ``version`` stays the same
+        """
+        with self._lock:
+            if version != self._version or cleaning_functions is not self._source:
+                self._caches = {}
+                self._wrapped = {column: self._memoize(column, function)
+                                 for column, function in cleaning_functions.items()}
+                self._version = version
+                self._source = cleaning_functions
+            return self._wrapped
+
+    def hit_ratios(self) -> dict[str, str]:
+        ratios = {}
+        for column, cache in self._caches.items():
+            info = cache.cache_info()
+            calls = info.hits + info.misses
+            if calls:
+                ratios[column] = f"{info.hits / calls:.3f}"
+        return ratios
+
+    def _memoize(self, column, function):
+        key_count = KEY_ARGUMENTS.get(column, 1)
+        date_dependent = function in DATE_DEPENDENT
+        cache = lru_cache(maxsize=self.maxsize, typed=True)(
+            lambda month, context, *key: function(*key, *context.args))
+        self._caches[column] = cache
+
+        def memoized(*args):
+            key = args[:key_count]
+            try:
+                hash(key)
+            except TypeError:
+                return function(*args)
+            today = duration_parser.today() if date_dependent else None
+            month = (today.year, today.month) if today else None
+            return cache(month, _Unkeyed(args[key_count:]), *key)
+
+        memoized.__wrapped__ = function
+        return memoized
+
+
+cleaner_memo = CleanerMemo(cleaner_memo_size)
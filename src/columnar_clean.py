@@ -0,0 +1,152 @@
+from conf import fields_data, seller_type_config
+from clean import trim_and_upper, cleaning_fuel_type, clean_transmission, clean_cylinders, clean_seller_type, \
+    clean_by_type, cleaning_hp, clean_engine_size
+from startup import lazy_import
+
+# seller type keys to their value, the first list containing a key wins as in clean_seller_type
+SELLER_TYPES = {}
+for _keys, _value in (('independent_keys', 'independent_value'), ('franchise_keys', 'franchize_value'),
+                      ('large_independent_keys', 'large_independent_value'), ('owner_keys', 'owner_value')):
+    for _key in seller_type_config[_keys]:
+        SELLER_TYPES.setdefault(_key, seller_type_config[_value].strip())
+
+
+def _trim(pc, array):
+    return pc.ascii_trim(array, characters=' ')
+
+
+def _trim_and_upper(pc, array, *extra):
+    return pc.ascii_upper(_trim(pc, array))
+
+
+def _fuel_type(pc, array, *extra):
+    trimmed = _trim(pc, array)
+    petrol = pc.is_in(pc.ascii_lower(trimmed), value_set=lazy_import('pyarrow').array(['petrol/lpg', 'gasoline']))
+    return pc.if_else(petrol, 'PETROL', pc.ascii_upper(trimmed))
+
+
+def _transmission(pc, array, *extra):
+    transmission = pc.replace_substring(_trim(pc, pc.ascii_upper(array)), 'TRANSMISSION', '', max_replacements=1)
+    return pc.if_else(pc.equal(transmission, 'A/T'), 'AUTOMATIC', _trim(pc, transmission))
+
+
+def _cylinders(pc, array, *extra):
+    return pc.ascii_upper(_trim(pc, pc.replace_substring(array, 'Cyl', '')))
+
+
+def _seller_type(pc, array, *extra):
+    pa = lazy_import('pyarrow')
+    value = pc.ascii_lower(_trim(pc, array))
+    position = pc.index_in(value, value_set=pa.array(list(SELLER_TYPES)))
+    return pc.if_else(pc.is_null(position), value, pc.take(pa.array(list(SELLER_TYPES.values())), position))
+
+
+def _by_type(pc, array, type_str):
+    # every value ends up as its digits, whether numeric after the strip or through the recursion
+    digits = pc.replace_substring_regex(array, '[^0-9]', '')
+    counted = pc.if_else(
+        pc.equal(digits, ''), '',
+        pc.if_else(pc.equal(digits, '1'), '1 ' + type_str,
+                   pc.binary_join_element_wise(digits, ' ' + type_str + 'S', '')))
+    return pc.if_else(pc.match_substring(array, '+'), pc.ascii_upper(array), counted)
+
+
+# Arrow kernels equal to the scalar cleaners on non-empty printable ASCII strings, where
+# upper/lower/strip/isnumeric have the same meaning for Arrow and Python
+KERNELS = {
+    trim_and_upper: _trim_and_upper,
+    cleaning_fuel_type: _fuel_type,
+    clean_transmission: _transmission,
+    clean_cylinders: _cylinders,
+    clean_seller_type: _seller_type,
+    clean_by_type: _by_type,
+}
+# Cleaners too irregular for kernels (float parsing and formatting), run once per distinct value instead
+BY_DISTINCT = (cleaning_hp, clean_engine_size)
+
+
+def _is_simple(value) -> bool:
+    """
+    Non-empty printable ASCII: also always encodable as UTF-8, unlike strings holding a lone surrogate
+    """
+    return type(value) is str and value != '' and value.isascii() and value.isprintable()
+
+
+def clean_column(values: list, key: str, function, logger) -> list:
+    """
+    Clean every value of a column, through its Arrow kernel where possible
+
+    Args:
+        values : raw values of the column
+        key : cleaned column name
+        function : the scalar cleaner, possibly memoized, used for the values the kernel can't take
+        logger: logger
+    """
+    pa, pc = lazy_import('pyarrow'), lazy_import('pyarrow.compute')
+    extra = (key[:-1].upper(),) if key in ('doors', 'seats', 'gears') else ()
+    scalar = getattr(function, '__wrapped__', function)
+    try:
+        array = pa.array(values, type=pa.string())
+        # non-empty printable ASCII, nulls (None) included in the scalar values
+        simple = pc.fill_null(pc.match_substring_regex(array, '^[ -~]+$'), False)
+        all_simple = pc.all(simple).as_py()
+    except (pa.ArrowTypeError, ValueError):
+        # mixed types (ArrowInvalid), or a string Arrow can't encode, e.g. a lone surrogate from the
+        # json.loads fallback (UnicodeEncodeError): sorted out value by value
+        all_simple = False
+        simple = None
+    if all_simple:
+        positions, cleaned = None, None
+    else:
+        mask = simple.to_pylist() if simple is not None else [_is_simple(value) for value in values]
+        positions = [position for position, is_simple in enumerate(mask) if is_simple]
+        cleaned = [None if is_simple else function(value, *extra, logger) for value, is_simple in zip(values, mask)]
+        if not positions:
+            return cleaned
+        array = pa.array([values[position] for position in positions], type=pa.string())
+    if scalar in BY_DISTINCT:
+        encoded = pc.dictionary_encode(array)
+        distinct = [function(value, *extra, logger) for value in encoded.dictionary.to_pylist()]
+        result = [distinct[index] for index in encoded.indices.to_pylist()]
+    else:
+        result = KERNELS[scalar](pc, array, *extra).to_pylist()
+    if positions is None:
+        return result
+    for position, value in zip(positions, result):
+        cleaned[position] = value
+    return cleaned
+
+
+def clean_columns(raw_cars: list, cleaning_functions: dict, logger) -> list[dict]:
+    """
+    Clean the columns of a chunk that have an Arrow kernel or run by distinct value, a whole column at a time
+
+    Args:
+        raw_cars : parsed lines of the chunk
+        cleaning_functions : dictionary of column name as key and function name as value
+        logger: logger
+    Returns:
+        per record, raw key to cleaned value of the columns cleaned here
+    """
+    cleaned = [{} for _ in raw_cars]
+    columns = {}
+    for position, raw_car in enumerate(raw_cars):
+        if not isinstance(raw_car, dict):
+            continue
+        for raw_key, value in raw_car.items():
+            column = columns.get(raw_key)
+            if column is None:
+                key = fields_data.get(raw_key, raw_key)
+                function = cleaning_functions.get(key)
+                scalar = getattr(function, '__wrapped__', function)
+                columnar = key not in ('model', 'spec', 'body_type') and (scalar in KERNELS or scalar in BY_DISTINCT)
+                column = columns[raw_key] = (key, function, [], []) if columnar else ()
+            if column:
+                column[2].append(position)
+                column[3].append(value)
+    for raw_key, column in columns.items():
+        if column:
+            key, function, positions, values = column
+            for position, value in zip(positions, clean_column(values, key, function, logger)):
+                cleaned[position][raw_key] = value
+    return cleaned
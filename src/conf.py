@@ -101,3 +101,78 @@ rename_mastercode_cache = {'model_year': 'year_id', 'make': 'make_id', 'model':
                'fuel': 'fuel_type_id', 'gears': 'gears_id', 'seats': 'seats_id', 'spec': 'spec_id'}
 
 COMPOSITE_KEY = ['year_id', 'make_id', 'model_id', 'doors_id', 'body_type_id', 'transmission_id', 'no_of_cylinders_id', 'fuel_type_id', 'gears_id', 'seats_id','spec_id']
+
+
+# Warm-container cache of the backbone mapping tables
+mapping_cache_ttl_seconds = 300  # serve cached tables without touching the db
+mapping_cache_max_age_seconds = 6 * 60 * 60  # force a full reload, fingerprints miss in-place edits
+
+# Streaming gzip upload to s3
+multipart_part_size = 8 * 1024 * 1024  # s3 minimum part size is 5 MB
+gzip_compress_level = 9
+
+# Files of one SQS batch processed concurrently
+file_workers = 4
+
+# Input objects read with concurrent ranged GETs, memory per file about s3_read_ahead * s3_read_range_size
+s3_read_workers = 4  # GETs in flight per object, 1 streams the object with a single GET
+s3_read_range_size = 4 * 1024 * 1024
+s3_read_ahead = 8  # ranges fetched ahead of the line being cleaned
+decompressed_chunk_size = 1024 * 1024  # gzip / zstd inputs are inflated this many bytes at a time
+
+# Record cleaning, worker processes > 1 fork a CleaningPool per invocation
+cleaning_workers = 1
+cleaning_chunk_size = 1000
+
+# LRU memoization of the cleaning functions, entries per cleaner
+cleaner_memo_size = 50000
+
+# JSON decoder of the input lines: 'auto' (msgspec, then orjson, then json), 'orjson', 'msgspec', 'json';
+# records are always written by json.dumps
+json_backend = 'auto'
+
+# Backbone db access kept alive across warm invocations
+backbone_secret_ttl_seconds = 60 * 60
+backbone_load_parallelism = 4  # tables queried at once over pooled connections, 1 sends them all in one round trip
+
+# Cold start: record the import time of each module and the time to the first file in the run details
+cold_start_instrumentation = False
+
+# Clean the simple string columns of a chunk with Arrow kernels (needs pyarrow) instead of value by value
+columnar_cleaning = False
+
+# Stage bucket output: 'json' (gzip'd JSON lines) or 'parquet' (raw bucket stays JSON lines)
+stage_format = 'json'
+parquet_row_group_size = 50000  # rows buffered before a row group is written out
+parquet_compression = 'zstd'  # or 'snappy'
+parquet_batch_rows = 1000  # rows kept as Python values before they are converted to Arrow arrays
+# low cardinality columns stored dictionary encoded, the *_id columns are always
+parquet_dictionary_columns = ['job_id', 'spider', 'city', 'country', 'make', 'model', 'spec', 'year', 'doors', 'seats',
+                              'gears', 'body_type', 'fuel_type', 'transmission', 'no_of_cylinders', 'engine_size',
+                              'hp', 'seller_type', 'seller_name', 'source', 'colour_exterior', 'colour_interior',
+                              'price_currency', 'vehicle_type', 'condition', 'mileage_unit', 'engine_unit',
+                              'regional_spec', 'drive_type', 'warranty_untill_when', 'service_contract_untill_when']
+
+# Incremental mode: skip listings whose tracking_id was already emitted with the same content
+dedup_backend = None  # None (off), 'sqlite' (local / per container) or 'dynamodb'
+dedup_sqlite_path = '/tmp/listing_fingerprints.db'
+dedup_dynamodb_table = 'listing_fingerprints'
+# raw fields left out of the content hash, they change on every scrape
+dedup_ignored_fields = ['job_id', 'spider', 'Scrapping_Date', 'Last_Code_Update_Date']
+dedup_max_attempts = 6  # DynamoDB batch calls for the unprocessed keys / items of a batch before they are given up
+
+# Per stage wall / CPU time, per cleaner time, throughput and byte sizes in the run details and as CloudWatch EMF lines
+instrumentation = False
+metrics_namespace = 'lambda-cleaning-job'
+
+# Warranty / service contract durations parsed once per distinct value and run
+duration_cache_size = 50000
+
+# Backbone snapshot: the mapping tables serialized by main.snapshot_handler, read on a cold start instead of the db
+backbone_snapshot_s3_uri = None  # e.g. 's3://bucket/backbone/snapshot.bin', None to always load from the db
+backbone_snapshot_path = '/tmp/backbone_snapshot.bin'  # local copy, read unless the S3 one is newer
+backbone_snapshot_max_age_seconds = 6 * 60 * 60  # older snapshots fall back to the db
+
+# Run details written to DynamoDB by a background thread in batches, flushed before the handler returns
+run_details_max_attempts = 6  # BatchWriteItem calls for the unprocessed items of a batch before they are dropped
+run_details_flush_timeout_seconds = 30
@@ -0,0 +1,204 @@
+import json
+import hashlib
+import sqlite3
+import threading
+
+from conf import fields_data, dedup_sqlite_path, dedup_dynamodb_table, dedup_ignored_fields, dedup_max_attempts, \
+    cleaning_chunk_size
+from helpers import make_tracking_id, backoff
+from serializers import loads
+
+
+class SqliteFingerprintStore:
+    """
+    tracking_id -> content hash in a SQLite file, for local runs and a single container
+    """
+
+    def __init__(self, path: str = dedup_sqlite_path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints (tracking_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL)")
+        self._lock = threading.Lock()
+
+    def get_many(self, tracking_ids: list[str]) -> dict[str, str]:
+        found = {}
+        with self._lock:
+            for position in range(0, len(tracking_ids), 500):
+                batch = tracking_ids[position:position + 500]
+                found.update(self._connection.execute(
+                    "SELECT tracking_id, content_hash FROM fingerprints WHERE tracking_id IN ({})".format(
+                        ', '.join('?' * len(batch))), batch))
+        return found
+
+    def put_many(self, fingerprints: dict[str, str]):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO fingerprints (tracking_id, content_hash) VALUES (?, ?)", fingerprints.items())
+
+
+class DynamoDBFingerprintStore:
+    """
+    tracking_id -> content hash in a DynamoDB table keyed on tracking_id, shared by all containers
+
+    Unprocessed keys and items are retried with exponential backoff, ``max_attempts`` calls at
+    most: keys left over are reported as not found and items left over are not written, so
+    those listings are cleaned again rather than skipped.
+    """
+
+    def __init__(self, dynamodb_client, table: str = dedup_dynamodb_table, logger=None,
+                 max_attempts: int = dedup_max_attempts):
+        # the client of the resource is thread safe, the resource is not; it takes and returns plain values
+        self._client = dynamodb_client.meta.client
+        self.table = table
+        self.logger = logger
+        self.max_attempts = max_attempts
+
+    def get_many(self, tracking_ids: list[str]) -> dict[str, str]:
+        found = {}
+        for position in range(0, len(tracking_ids), 100):
+            keys = [{'tracking_id': tracking_id} for tracking_id in tracking_ids[position:position + 100]]
+            request = {self.table: {'Keys': keys, 'ProjectionExpression': 'tracking_id, content_hash'}}
+            attempt = 0
+            while request:
+                response = self._client.batch_get_item(RequestItems=request)
+                for item in response['Responses'].get(self.table, []):
+                    found[item['tracking_id']] = item['content_hash']
+                request = response.get('UnprocessedKeys')
+                attempt += 1
+                if request and attempt >= self.max_attempts:
+                    self._give_up(len(request[self.table]['Keys']), 'looked up')
+                    break
+                if request:
+                    backoff(attempt)
+        return found
+
+    def put_many(self, fingerprints: dict[str, str]):
+        items = [{'PutRequest': {'Item': {'tracking_id': tracking_id, 'content_hash': content_hash}}}
+                 for tracking_id, content_hash in fingerprints.items()]
+        for position in range(0, len(items), 25):
+            request = {self.table: items[position:position + 25]}
+            attempt = 0
+            while request:
+                request = self._client.batch_write_item(RequestItems=request).get('UnprocessedItems')
+                attempt += 1
+                if request and attempt >= self.max_attempts:
+                    self._give_up(len(request[self.table]), 'written')
+                    break
+                if request:
+                    backoff(attempt)
+
+    def _give_up(self, left: int, action: str):
+        if self.logger is not None:
+            self.logger.warning(f"{left} fingerprints left unprocessed by dynamodb after {self.max_attempts} "
+                                f"attempts, not {action}")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_fingerprint_store(backend: str, dynamodb_client=None, logger=None):
+    """
+    Return the container wide fingerprint store of the backend, None when dedup is off
+    """
+    if not backend:
+        return None
+    with _stores_lock:
+        if backend not in _stores:
+            if backend == 'sqlite':
+                _stores[backend] = SqliteFingerprintStore()
+            elif backend == 'dynamodb':
+                _stores[backend] = DynamoDBFingerprintStore(dynamodb_client, logger=logger)
+            else:
+                raise ValueError(f"Unknown dedup backend {backend}")
+        return _stores[backend]
+
+
+def content_hash(raw_car: dict) -> str:
+    # stdlib json with sorted keys, so the hash doesn't depend on the configured codec or the key order
+    content = json.dumps({key: value for key, value in raw_car.items() if key not in dedup_ignored_fields},
+                         sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def raw_tracking_id(raw_car: dict):
+    """
+    tracking_id of a raw car, as clean_chunk computes it from the cleaned one
+    """
+    car = {fields_data.get(key, key): value for key, value in raw_car.items()}
+    return make_tracking_id(car.get('seller_name', ''), car['meta'].get('url', ''), car.get('vin', ''))
+
+
+class Deduplicator:
+    """
+    Drop the listings of a file that were already emitted with the same content
+
+    ``filter`` looks the tracking_ids of every chunk of lines up in the store and only
+    lets new and changed listings through to cleaning. Fingerprints are written back by
+    ``commit``, once the file is uploaded, and only for the listings that made it into
+    the output (``emitted``), so a failed file is fully reprocessed on retry.
+    """
+
+    def __init__(self, store, chunk_size: int = cleaning_chunk_size):
+        self.store = store
+        self.chunk_size = chunk_size
+        self.new = 0
+        self.changed = 0
+        self.skipped = 0
+        self._seen = {}
+        self._emitted = set()
+
+    def filter(self, lines):
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= self.chunk_size:
+                yield from self._filter_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._filter_chunk(chunk)
+
+    def emitted(self, records):
+        for clean_car, raw_car in records:
+            self._emitted.add(clean_car.get('tracking_id'))
+            yield clean_car, raw_car
+
+    def commit(self):
+        fingerprints = {tracking_id: fingerprint for tracking_id, fingerprint in self._seen.items()
+                        if tracking_id in self._emitted}
+        if fingerprints:
+            self.store.put_many(fingerprints)
+
+    def details(self) -> dict:
+        return {'dedup_new': self.new, 'dedup_changed': self.changed, 'dedup_skipped': self.skipped}
+
+    def _filter_chunk(self, lines):
+        fingerprints = []
+        for line in lines:
+            try:
+                raw_car = loads(line)
+                tracking_id = raw_tracking_id(raw_car)
+            except Exception:
+                # left to the cleaning, which logs and drops it
+                fingerprints.append(None)
+                continue
+            # no seller, url nor vin: nothing to key the listing on (nor a valid DynamoDB key), never skipped
+            fingerprints.append((tracking_id, content_hash(raw_car)) if tracking_id else None)
+        unseen = list({fingerprint[0] for fingerprint in fingerprints
+                       if fingerprint is not None and fingerprint[0] not in self._seen})
+        stored = self.store.get_many(unseen) if unseen else {}
+        for line, fingerprint in zip(lines, fingerprints):
+            if fingerprint is None:
+                yield line
+                continue
+            tracking_id, current = fingerprint
+            previous = self._seen.get(tracking_id, stored.get(tracking_id))
+            if previous == current:
+                self.skipped += 1
+                continue
+            if previous is None:
+                self.new += 1
+            else:
+                self.changed += 1
+            self._seen[tracking_id] = current
+            yield line
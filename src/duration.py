@@ -0,0 +1,83 @@
+import re
+from datetime import date
+
+from conf import duration_cache_size
+from helpers import count_months, extract_numbers, parse_date
+
+_NOT_DATE = re.compile(r'[^0-9-]')
+_NOT_DIGIT = re.compile(r'[^0-9]')
+_MONTH_YEAR = re.compile(r'(?:jan|feb|mar|apr|aay|jun|jul|aug|sep|oct|nov|dec)-\d{4}')
+
+
+class DurationParser:
+    """
+    Warranty / service contract durations in months, with today fixed for the whole run
+
+    The months left depend on the current month, so ``start_run`` sets the date once per
+    run and drops the parsed values; within a run every distinct value is parsed once.
+    A value that can't be parsed is logged the first time it is seen in the run.
+    """
+
+    def __init__(self, cache_size: int):
+        self.cache_size = cache_size
+        self._today = None
+        self._cache = {}
+
+    def start_run(self, today: date = None):
+        self._today = today or date.today()
+        self._cache = {}
+
+    def today(self) -> date:
+        if self._today is None:
+            self.start_run()
+        return self._today
+
+    def parse(self, line, logger):
+        if not line or not isinstance(line, str):
+            return line
+        result = self._cache.get(line)
+        if result is None:
+            result = self._parse(line, self.today(), logger)
+            if len(self._cache) >= self.cache_size:
+                self._cache = {}
+            self._cache[line] = result
+        return result
+
+    @staticmethod
+    def _parse(line, today, logger):
+        try:
+            line = line.strip().lower()
+
+            if 'year' in line:
+                years = extract_numbers(line)
+                return str(int(years)*12)+" MONTHS"
+            if 'month' in line:
+                months = extract_numbers(line)
+                return months+" MONTHS"
+            if 'valid till' in line:
+                year = _NOT_DATE.sub('', line)
+                if year:
+                    return count_months(parse_date(year), today)+" MONTHS"
+            if 'till' in line:
+                return count_months(parse_date(_MONTH_YEAR.findall(line)[0]), today)+" MONTHS"
+            if 'until' in line:
+                until_year = int(_NOT_DIGIT.sub('', line))
+                diff = ((until_year - today.year) * 12) + (12 - today.month)
+                return str(diff)+" MONTHS"
+
+            value_datetime = parse_date(line)
+            if value_datetime:
+                return count_months(value_datetime, today)+" MONTHS"
+
+            warranty = line.split()
+            if len(warranty) > 1:
+                warranty_date = parse_date(warranty[0])
+                if warranty_date:
+                    return count_months(warranty_date, today)+" MONTHS"
+            return line
+        except Exception as e:
+            logger.exception(f"Error: {e} === Value: {line}")
+            return line
+
+
+duration_parser = DurationParser(duration_cache_size)
@@ -1,19 +1,37 @@
-import gzip
 from abc import ABC
 import time
 import json
-from datetime import datetime
+import hashlib
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
-import pytz
-
-from helpers import extract_event_name, rename_columns, get_mapping_tables
+from helpers import extract_event_name, rename_columns
 from clean import rename_columns_and_clean_data
+from mapping_cache import mapping_table_cache
+from s3_stream import MultipartUpload, MultipartGzipUpload, read_object_lines
+from conf import file_workers, cleaning_workers, cold_start_instrumentation, stage_format, dedup_backend, \
+    instrumentation, backbone_snapshot_path, backbone_snapshot_s3_uri, s3_read_workers
+from parallel_clean import CleaningPool
+from parquet_stage import ParquetStageWriter
+from dedup import Deduplicator, get_fingerprint_store
+from cleaner_memo import cleaner_memo
+from duration import duration_parser
+from serializers import dumps
+from startup import mark_first_file, cold_start_details
+from metrics import RunMetrics, stage, add
+from snapshot import read_snapshot
+from run_details import get_run_details_writer, flush_run_details
 
 
 class EventProcessor(ABC):
     def __init__(self, s3_client, aws_access_key: str, aws_secret_key: str,
                  destination_raw_bucket: str,destination_stg_bucket: str, secret_name: str, region: str, rds_pem_key: str, job_id: str,
-                 dynamodb_table: str, host: str, cleaning_functions, dynamodb_client, mapping_table_names, logger):
+                 dynamodb_table: str, host: str, cleaning_functions, dynamodb_client, mapping_table_names, logger,
+                 file_workers: int = file_workers, cleaning_workers: int = cleaning_workers,
+                 stage_format: str = stage_format, dedup_backend: str = dedup_backend,
+                 instrumentation: bool = instrumentation, snapshot_path: str = backbone_snapshot_path,
+                 snapshot_s3_uri: str = backbone_snapshot_s3_uri, s3_read_workers: int = s3_read_workers):
         self.destination_raw_bucket = destination_raw_bucket
         self.destination_stg_bucket = destination_stg_bucket
         self.job_id = job_id
@@ -29,66 +47,206 @@ class EventProcessor(ABC):
         self.dynamodb_client = dynamodb_client
         self.mapping_table_names = mapping_table_names
         self.logger = logger
+        self.file_workers = file_workers
+        self.cleaning_workers = cleaning_workers
+        self.stage_format = stage_format
+        self.fingerprint_store = get_fingerprint_store(dedup_backend, dynamodb_client, logger)
+        self.instrumentation = instrumentation
+        self.snapshot_path = snapshot_path
+        self.snapshot_s3_uri = snapshot_s3_uri
+        self.s3_read_workers = s3_read_workers
+        # stages of the batch wide mapping tables load, added to the metrics of every file
+        self.load_metrics = RunMetrics(False)
 
     def process_event(self, event):
+        """
+        Process every S3 object of an SQS batch concurrently, sharing one mapping tables load
+
+        Returns:
+            SQS partial batch response listing the messages whose files failed
+        """
         self.logger.info("======== Lambda Execution started ========")
+        # one date for every duration of the batch, set before the cleaning pool forks
+        duration_parser.start_run()
+        files = []
+        failed_messages = []
         for record in event["Records"]:
-            body = json.loads(record["body"])
-            message = json.loads(body["Message"])
-            for event_record in message["Records"]:
-                bucket = event_record["s3"]["bucket"]["name"]
-                key = event_record["s3"]["object"]["key"]
-                self.process_file(bucket, key)
+            try:
+                body = json.loads(record["body"])
+                message = json.loads(body["Message"])
+                for event_record in message["Records"]:
+                    bucket = event_record["s3"]["bucket"]["name"]
+                    key = event_record["s3"]["object"]["key"]
+                    files.append((record.get("messageId"), bucket, key))
+            except Exception:
+                self.logger.exception(f"Error while reading the message {record.get('messageId')}")
+                failed_messages.append(record.get("messageId"))
+
+        if files:
+            self.load_metrics = RunMetrics(self.instrumentation)
+            try:
+                with self.load_metrics.active():
+                    mapping = self.load_mapping_tables()
+            except Exception:
+                self.logger.exception("Error while loading the mapping tables")
+                failed_messages.extend(message_id for message_id, _, _ in files)
+            else:
+                # the cleaning pool forks, so it is started before the file threads. The pooled backbone
+                # session may keep its tunnel threads (sshtunnel / paramiko) running; the workers only clean
+                # and log, and logging reinitializes its locks in a forked child, see CleaningPool
+                with self.create_cleaning_pool(mapping) as pool, \
+                        ThreadPoolExecutor(max_workers=min(self.file_workers, len(files))) as executor:
+                    results = executor.map(lambda file: self.process_file(file[1], file[2], mapping, pool), files)
+                    failed_messages.extend(message_id for (message_id, _, _), succeeded in zip(files, results)
+                                           if not succeeded)
+        # a frozen container would not write the queued run details
+        if not flush_run_details():
+            self.logger.error("Run details not all written to dynamodb before the timeout")
         self.logger.info("======== Lambda Execution finished ========")
+        return {"batchItemFailures": [{"itemIdentifier": message_id}
+                                      for message_id in dict.fromkeys(failed_messages)]}
+
+    def load_mapping_tables(self):
+        with stage('mapping_load'):
+            mapping_tables_desc, mapping_tables, cache_details = mapping_table_cache.get(
+                self.mapping_table_names, self.secret_name, self.region, self.aws_access_key, self.aws_secret_key,
+                self.host, self.rds_pem_key, self.read_backbone_snapshot, self.logger)
+        self.logger.info(f"Mapping tables cache {cache_details['mapping_cache']}, "
+                         f"loaded in {cache_details['mapping_load_time']}")
+        return mapping_tables_desc, mapping_tables, cache_details
+
+    def read_backbone_snapshot(self):
+        with stage('snapshot_read'):
+            return read_snapshot(self.snapshot_path, self.s3_client, self.snapshot_s3_uri)
 
-    def process_file(self, bucket, key):
+    def create_cleaning_pool(self, mapping):
+        """
+        Fork the cleaning worker processes when more than one is configured
+        """
+        if self.cleaning_workers <= 1:
+            return nullcontext()
+        mapping_tables_desc, mapping_tables, cache_details = mapping
+        cleaning_functions = cleaner_memo.wrap(self.cleaning_functions, cache_details['mapping_version'])
+        return CleaningPool(self.cleaning_workers, cleaning_functions, mapping_tables_desc, mapping_tables, self.logger)
+
+    def process_file(self, bucket, key, mapping=None, pool=None) -> bool:
+        """
+        Clean one S3 object and upload the results
+
+        Args:
+            mapping : (mapping tables descriptions, mapping tables, cache details) shared by the batch,
+                      loaded here when not given
+            pool : CleaningPool forked with the same mapping tables, records are cleaned in this process when None
+        Returns:
+            whether the file was processed successfully
+        """
+        first_file = mark_first_file()
+        metrics = RunMetrics(self.instrumentation)
+        if mapping is not None:
+            metrics.merge(self.load_metrics)
+        with metrics.active():
+            return self._process_file(bucket, key, mapping, pool, first_file, metrics)
+
+    def _process_file(self, bucket, key, mapping, pool, first_file, metrics) -> bool:
         try:
             self.logger.info(f"Processing started for file:e s3://{bucket}/{key}")
             # time for dynamodb logging
             job_start_time = int(time.mktime(datetime.now().timetuple()))
             start_time = datetime.now()
-            mapping_tables_desc,mapping_tables = get_mapping_tables(
-                self.mapping_table_names, self.secret_name, self.region, self.aws_access_key, self.aws_secret_key,
-                self.host, self.rds_pem_key)
+            mapping_tables_desc, mapping_tables, cache_details = mapping or self.load_mapping_tables()
+            cleaning_functions = metrics.wrap_cleaners(
+                cleaner_memo.wrap(self.cleaning_functions, cache_details['mapping_version']))
             # Reading file
-            contents = self.read_file_contents_from_s3(bucket, key, self.s3_client)
-            cleaned_data,raw_data = rename_columns_and_clean_data(
-                contents, self.cleaning_functions, mapping_tables_desc,mapping_tables, self.logger)
+            contents = metrics.timed_iter(
+                's3_read', self.read_file_contents_from_s3(bucket, key, self.s3_client), 'lines', 'bytes_read')
+            dedup = Deduplicator(self.fingerprint_store) if self.fingerprint_store is not None else None
+            if dedup:
+                # unchanged listings never reach the cleaning
+                contents = dedup.filter(contents)
+            records = rename_columns_and_clean_data(
+                contents, cleaning_functions, mapping_tables_desc,mapping_tables, self.logger, pool)
+            if dedup:
+                records = dedup.emitted(records)
+            # everything up to the cleaned records, pulled by write_to_s3
+            records = metrics.timed_iter('pipeline', records, 'records')
             event_name = extract_event_name(key)
-            response = self.write_to_s3(
-                self.s3_client, cleaned_data,raw_data, self.destination_raw_bucket, self.destination_stg_bucket, event_name)
+            with metrics.stage('write'):
+                response = self.write_to_s3(
+                    self.s3_client, records, self.destination_raw_bucket, self.destination_stg_bucket, event_name,
+                    f"s3://{bucket}/{key}")
+            if dedup:
+                dedup.commit()
             # time for dynamodb logging
             end_time = datetime.now()
             elapsed_time = end_time - start_time
             elapsed_seconds = elapsed_time.total_seconds()
+            extra_details = {**cache_details, 'cleaner_memo_hit_ratio': cleaner_memo.hit_ratios()}
+            if dedup:
+                extra_details.update(dedup.details())
+                self.logger.info(f"Listings new: {dedup.new}, changed: {dedup.changed}, skipped: {dedup.skipped}")
+            if first_file and cold_start_instrumentation:
+                extra_details['cold_start'] = cold_start_details()
+            if metrics.enabled:
+                extra_details['metrics'] = metrics.details()
             self.save_job_details_in_dynamodb(
                 self.job_id, job_start_time, f"s3://{bucket}/{key}", response['destination_file_name'], start_time,
-                end_time, elapsed_seconds, response['status_code'], self.dynamodb_client,  self.dynamodb_table)
+                end_time, elapsed_seconds, response['status_code'], self.dynamodb_client,  self.dynamodb_table,
+                extra_details)
+            metrics.emit(self.job_id, f"s3://{bucket}/{key}")
             self.logger.info(f"Processing completed for file:e s3://{bucket}/{key}")
+            return True
         except Exception:
             self.logger.exception(f"Error while processing the file s3://{bucket}/{key}")
+            return False
 
     def read_file_contents_from_s3(self, bucket_name: str, s3_key: str, s3_client):
         self.logger.info(f"Reading file started from = s3://{bucket_name}/{s3_key}")
-        response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
-        iterator = response['Body'].iter_lines()
+        iterator = read_object_lines(s3_client, bucket_name, s3_key, self.s3_read_workers)
         self.logger.info(f"Reading file completed from = s3://{bucket_name}/{s3_key}")
         return iterator
 
-    def write_to_s3(self, s3_client, clean_data,raw_data, raw_bucket, stg_bucket, event_name):
+    def write_to_s3(self, s3_client, records, raw_bucket, stg_bucket, event_name, source_file=None):
+        """
+        Stream cleaned records to the stage bucket and raw records as gzip'd JSON lines to the raw bucket
+
+        Args:
+            records : iterable of (clean record, raw record) pairs
+            source_file : input object, a short hash of it keeps files processed in the same second apart
+        """
         self.logger.info("======== Writing data to s3 ========")
-        clean_json_data = '\n'.join(json.dumps(entry) for entry in clean_data)
-        raw_json_data = '\n'.join(json.dumps(entry) for entry in raw_data)
-        clean_compressed_data = gzip.compress(clean_json_data.encode('utf-8'))
-        raw_compressed_data = gzip.compress(raw_json_data.encode('utf-8'))
-        current_date = datetime.now(pytz.utc)
+        current_date = datetime.now(timezone.utc)
         date = current_date.strftime("%Y-%m-%d")
         hour = current_date.strftime('%H')
         file_name = f"{event_name}_{current_date.strftime('%Y-%m-%dT%H-%M-%S')}"
-        clean_data_s3_key = f"{event_name}/date={date}/hour={hour}/{file_name}.json.gz"
+        if source_file:
+            file_name += f"_{hashlib.sha1(source_file.encode('utf-8')).hexdigest()[:8]}"
+        parquet = self.stage_format == 'parquet'
+        clean_data_s3_key = f"{event_name}/date={date}/hour={hour}/{file_name}.{'parquet' if parquet else 'json.gz'}"
         raw_data_s3_key = f"{event_name}/date={date}/hour={hour}/{file_name}.json.gz"
-        upload_res = s3_client.put_object(Bucket=stg_bucket, Key=clean_data_s3_key, Body=clean_compressed_data)
-        upload_res = s3_client.put_object(Bucket=raw_bucket, Key=raw_data_s3_key, Body=raw_compressed_data)
+        clean_sink = MultipartUpload if parquet else MultipartGzipUpload
+        with clean_sink(s3_client, stg_bucket, clean_data_s3_key) as clean_upload, \
+                MultipartGzipUpload(s3_client, raw_bucket, raw_data_s3_key) as raw_upload:
+            if parquet:
+                clean_writer = ParquetStageWriter(clean_upload, logger=self.logger)
+                write_clean = clean_writer.write
+            else:
+                write_clean = lambda entry: clean_upload.write(dumps(entry))
+            first = True
+            for clean_entry, raw_entry in records:
+                if not first:
+                    if not parquet:
+                        clean_upload.write(b'\n')
+                    raw_upload.write(b'\n')
+                write_clean(clean_entry)
+                raw_upload.write(dumps(raw_entry))
+                first = False
+            if parquet:
+                clean_writer.close()
+            upload_res = clean_upload.close()
+            upload_res = raw_upload.close()
+        for sink, upload in (('stage', clean_upload), ('raw', raw_upload)):
+            add(f'{sink}_bytes_in', upload.bytes_in)
+            add(f'{sink}_bytes_out', upload.bytes_out)
         self.logger.info(f"Data uploaded to S3: s3://{stg_bucket}/{clean_data_s3_key}")
         self.logger.info(f"Data uploaded to S3: s3://{raw_bucket}/{raw_data_s3_key}")
         return {
@@ -97,7 +255,11 @@ class EventProcessor(ABC):
         }
 
     def save_job_details_in_dynamodb(self, job_id, job_start_time, source_file, destination_file, start_time, end_time,
-                                     total_execution_time, status_code, dynamodb_client, dynamodb_table):
+                                     total_execution_time, status_code, dynamodb_client, dynamodb_table,
+                                     extra_details=None):
+        """
+        Queue the run details of a file, written to dynamodb in the background and flushed by process_event
+        """
         try:
             self.logger.info("======== Writing lambda run details to dynamodb ========")
             job_run_details_item = {
@@ -111,8 +273,8 @@ class EventProcessor(ABC):
                 'status_code': status_code,
                 'created_at': str(datetime.now())
             }
-            job_run_details_table = dynamodb_client.Table(dynamodb_table)
-            job_run_details_table.put_item(Item=job_run_details_item)
-            self.logger.info(f"Lambda run details inserted to dynamodb table : {dynamodb_table}")
+            job_run_details_item.update(extra_details or {})
+            get_run_details_writer(dynamodb_client, dynamodb_table, self.logger).put(job_run_details_item)
+            self.logger.info(f"Lambda run details queued for dynamodb table : {dynamodb_table}")
         except Exception as e:
             self.logger.exception("Error while writing to dynamodb", e)
@@ -1,70 +1,127 @@
 import re
 import json
-import boto3
-import pymysql
-import paramiko
-import pandas as pd
-from io import StringIO
+import time
+import unicodedata
 from datetime import datetime
-from sshtunnel import SSHTunnelForwarder
-from conf import fields_data,rename_mastercode_cache,COMPOSITE_KEY,cols_to_map,cols_to_mapping_tbl
-
-
-def get_secret(secret, region, aws_access_key: str, aws_secret_key: str) -> str:
-    session = boto3.session.Session(aws_access_key_id=aws_access_key, aws_secret_access_key=aws_secret_key)
-    client = session.client(service_name='secretsmanager', region_name=region)
-    response = client.get_secret_value(SecretId=secret)
-    return response['SecretString']
-
-
-def get_mapping_tables(tables: list[str], secret, region, aws_access_key, aws_secret_key, host, rds_pem_key) \
-        -> dict[str, list[str]]:
-    secrets: dict[str, str] = json.loads(get_secret(secret, region, aws_access_key, aws_secret_key))
-    return get_mapping_table_desc(
-        secrets['host'], secrets['username'], secrets['password'], secrets['database'], int(secrets['port']),
-        secrets['ssh_hostname'], secrets['ssh_username'], int(secrets['ssh_port']), tables, host, aws_access_key,
-        aws_secret_key, rds_pem_key, region)
-
-
-def get_mapping_table_desc(sql_hostname: str, sql_username: str, sql_password: str, sql_main_database: str,
-                           sql_port: str, ssh_host: str, ssh_user: str, ssh_port: str, tables: list[str], host: str,
-                           aws_access_key: str, aws_secret_key: str, rds_pem_key: str, region: str) \
-        -> dict[str, list[str]]:
-
-    rds_key = get_secret(rds_pem_key, region, aws_access_key, aws_secret_key)
-    myp_key = paramiko.RSAKey.from_private_key(StringIO(rds_key))
-    mapping = {}
-    mapping_tables_dict = {}
-    with SSHTunnelForwarder((ssh_host, ssh_port), ssh_username=ssh_user, ssh_pkey=myp_key,
-                            remote_bind_address=(sql_hostname, sql_port)) as tunnel:
-        conn = pymysql.connect(
-            host=host, user=sql_username, passwd=sql_password, db=sql_main_database, port=tunnel.local_bind_port)
-        for table in tables:
-            
-            if table == 'bb_model':
-                query = "SELECT id, upper(description) as description, make_id FROM {};".format(table)
-                data = pd.read_sql_query(query, conn)
-                mapping_tables_dict[table] = {str(makecode) + description: id for id, description, makecode in data.values}
-            elif table == 'bb_specifications':
-                query = "SELECT id, upper(description) as description, model_id FROM {};".format(table)
-                data = pd.read_sql_query(query, conn)
-                mapping_tables_dict[table] = {str(modelid) + description: id for id, description, modelid in data.values}
-            elif table == 'mastercodes_cache':
-                query = "SELECT admeid, model_year, make, model, doors, body_type, transmission, no_of_cyls, fuel, gears, seats, spec FROM {};".format(table)
-                data = pd.read_sql_query(query, conn)
-                data  = data.rename(columns=rename_mastercode_cache)
-                mapping_tables_dict[table] = data.to_dict(orient='records')
-            else:
-                query = "SELECT id, upper(description) as description FROM {};".format(table)
-                data = pd.read_sql_query(query, conn)
-                mapping_tables_dict[table] = data.set_index('description')['id'].to_dict()
+from backbone import get_backbone_session
+from conf import fields_data,rename_mastercode_cache,COMPOSITE_KEY,cols_to_map,cols_to_mapping_tbl, \
+    backbone_load_parallelism
+from mapping_index import get_admeid_index, get_id_mapping_index
+
+
+def refresh_mapping_tables(tables: list[str], secret, region, aws_access_key, aws_secret_key, host, rds_pem_key,
+                           fingerprints: dict[str, tuple], logger=None):
+    """
+    Reload only the mapping tables whose fingerprint differs from the given ones
+
+    Args:
+        tables : backbone tables to check
+        fingerprints : table name to fingerprint of the copy held by the caller
+        logger : gets the load time of each table when given
+    Returns:
+        current fingerprints of all tables and (descriptions, lookup) of the reloaded tables
+    """
+    session = get_backbone_session(secret, region, aws_access_key, aws_secret_key, host, rds_pem_key)
+    current = get_table_fingerprints(session, tables)
+    changed = [table for table in tables if fingerprints.get(table) != current[table]]
+    row_counts = {table: current[table][0] or 0 for table in changed}
+    return current, load_mapping_tables(session, changed, row_counts=row_counts, logger=logger)
+
+
+def load_mapping_tables(session, tables: list[str], parallelism: int = backbone_load_parallelism,
+                        row_counts: dict[str, int] = None, logger=None) -> dict[str, tuple]:
+    """
+    Load backbone tables with one query per table
+
+    The queries are sent in one round trip, or split over ``parallelism`` pooled connections
+    in batches of about the same number of rows, one round trip each.
+
+    Args:
+        tables : backbone tables to load
+        parallelism : most connections queried at once
+        row_counts : table name to its row count, to balance the batches
+        logger : gets the time taken by each table
+    Returns:
+        table name to distinct descriptions (None for mastercodes_cache) and the lookup used for id mapping
+    """
+    if not tables:
+        return {}
+    queries = [mapping_table_query(table) for table in tables]
+    if parallelism > 1 and len(tables) > 1:
+        weights = [max((row_counts or {}).get(table, 1), 1) for table in tables]
+        results = session.execute_concurrently(queries, parallelism, weights)
+        if logger is not None:
+            for table, (_, rows, seconds) in zip(tables, results):
+                logger.info(f"Loaded {table}: {len(rows)} rows in {seconds:.3f} seconds")
+        return {table: shape_mapping_table(table, columns, rows) for table, (columns, rows, _) in zip(tables, results)}
+    start = time.perf_counter()
+    results = session.execute(queries)
+    if logger is not None:
+        logger.info(f"Loaded {', '.join(tables)} in one round trip in {time.perf_counter() - start:.3f} seconds")
+    return {table: shape_mapping_table(table, columns, rows) for table, (columns, rows) in zip(tables, results)}
+
+
+def mapping_table_query(table: str) -> str:
+    if table == 'bb_model':
+        return "SELECT id, description, upper(description), make_id FROM {};".format(table)
+    if table == 'bb_specifications':
+        return "SELECT id, description, upper(description), model_id FROM {};".format(table)
+    if table == 'mastercodes_cache':
+        return "SELECT admeid, model_year, make, model, doors, body_type, transmission, no_of_cyls, fuel, gears, seats, spec FROM {};".format(table)
+    return "SELECT id, description, upper(description) FROM {};".format(table)
+
+
+def shape_mapping_table(table: str, columns: list[str], rows: list[tuple]):
+    """
+    Build the description list and the id lookup of a table from its rows
+
+    Args:
+        table : backbone table name
+        columns : column names of the rows
+        rows : rows of the query from mapping_table_query
+    Returns:
+        distinct descriptions in first-seen order, compared case insensitively and without trailing spaces
+        (None for mastercodes_cache), and the lookup,
+        keyed on the upper case description (prefixed by the parent id for models and specs)
+    """
+    if table == 'mastercodes_cache':
+        names = [rename_mastercode_cache.get(column, column) for column in columns]
+        return None, [dict(zip(names, row)) for row in rows]
+    if table in ('bb_model', 'bb_specifications'):
+        lookup = {str(parent_id) + upper: id for id, _, upper, parent_id in rows}
+    else:
+        lookup = {upper: id for id, _, upper in rows}
+    # as the SELECT DISTINCT of the _ci collation, the first one seen is kept
+    descriptions = {}
+    for row in rows:
+        descriptions.setdefault(collation_key(row[2]) if row[2] is not None else None, row[1])
+    return list(descriptions.values()), lookup
+
+
+def collation_key(text: str) -> str:
+    """
+    What the backbone's _ci collation compares of a string: case, accents and trailing spaces
+    don't count (Citroën = CITROEN ), other foldings of MySQL (e.g. ß = ss) aren't reproduced
+    """
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return text.upper().rstrip(' ')
+
+
+def get_table_fingerprints(session, tables: list[str]) -> dict[str, tuple]:
+    """
+    Cheap change marker of each backbone table: row count and highest key
+    """
+    queries = ["SELECT COUNT(*), MAX({}) FROM {};".format('admeid' if table == 'mastercodes_cache' else 'id', table)
+               for table in tables]
+    return {table: tuple(rows[0]) for table, (_, rows) in zip(tables, session.execute(queries))}
 
-            if table != 'mastercodes_cache':
-                query = "SELECT DISTINCT description FROM {};".format(table)
-                data = pd.read_sql_query(query, conn)
-                mapping[table] = data['description'].tolist()
-        conn.close()
-    return mapping, mapping_tables_dict
+
+def backoff(attempt: int):
+    """
+    Sleep before retrying the unprocessed part of a DynamoDB batch call: exponential, 1.6 seconds at most
+    """
+    time.sleep(0.05 * 2 ** min(attempt, 5))
 
 
 def rename_columns(contents):
@@ -72,14 +129,18 @@ def rename_columns(contents):
             for item in contents]
 
 
+def make_tracking_id(seller_name, url, vin):
+    return re.sub(r'[^A-Za-z0-9]', '', seller_name + url if not vin else seller_name + vin)
+
+
 def extract_event_name(event_string):
     parts = event_string.split('/')
     event_name = parts[1].lower()
     return event_name
 
 
-def count_months(date):
-    current_date = datetime.now().date()
+def count_months(date, today=None):
+    current_date = today or datetime.now().date()
     year1 = current_date.year
     year2 = date.year
     month1 = current_date.month
@@ -102,10 +163,30 @@ def is_float(s):
         return False
 
 
+# The formats parse_date tries, in order, split by the characters of the strings they can match:
+# the numeric ones only digits (and the ' ' %d allows) with their own separator, the %b ones
+# something else too and no '/'
+_NUMERIC_DASH = re.compile(r'[\d -]+')
+_NUMERIC_SLASH = re.compile(r'[\d /]+')
+_NUMERIC_DASH_FORMATS = ['%Y-%m-%d', '%d-%m-%Y']
+_NUMERIC_SLASH_FORMATS = ['%d/%m/%Y', '%Y/%m/%d']
+_MONTH_NAME_FORMATS = ['%Y-%b-%d', '%d-%b-%Y', '%b-%Y', '%Y-%b']
+
+
+def date_formats(date_string: str) -> list[str]:
+    """
+    The formats that can match the string, strptime decides between them
+    """
+    if _NUMERIC_DASH.fullmatch(date_string):
+        return _NUMERIC_DASH_FORMATS if '-' in date_string else []
+    if _NUMERIC_SLASH.fullmatch(date_string):
+        return _NUMERIC_SLASH_FORMATS if '/' in date_string else []
+    return _MONTH_NAME_FORMATS if '-' in date_string and '/' not in date_string else []
+
+
 def parse_date(date_string):
-    formats = ['%Y-%m-%d', '%d-%m-%Y', '%Y-%b-%d', '%d-%b-%Y', '%b-%Y', '%Y-%b', '%d/%m/%Y', '%Y/%m/%d']
     try:
-        for fmt in formats:
+        for fmt in date_formats(date_string):
             try:
                 return datetime.strptime(date_string, fmt)
             except ValueError:
@@ -116,10 +197,6 @@ def parse_date(date_string):
         return False
 
 
-def get_key(search_string, models):
-    return models.index(search_string.upper()) if search_string.upper() in models else False
-
-
 def custom_sort(item):
     return item['words']
 
@@ -136,45 +213,15 @@ def remove_descriptions(model, descriptions):
     return model.strip().upper().replace("   ", " ")
 
 
-def find_key_by_value(dict_list, value):
-    for dictionary in dict_list:
-        if value in dictionary.values():
-            return next(iter(dictionary.keys()))  # Returns the first key found
-    return None
-
-
-def get_new_descriptions(data):
-    new_descriptions = [desc.replace(' ', '').replace('-', '') for desc in data]
-    result = [{desc: new_desc} for desc, new_desc in zip(data, new_descriptions)]
-    return result
-
-
 def add_admeid(car_data, mapping_tables):
     mastercode_cache = mapping_tables['mastercodes_cache']
     if not car_data['year_id'] or not car_data['make_id'] or not car_data['model_id']:
         car_data['admeid'] = ''
     else:
-        # Rename keys for master code cache
-        # - do renaming in mastercode_cache df and then convert to list of dicts
-        # Create a new dictionary containing only non-empty values for keys present in COMPOSITE_KEY
+        # Match on the non-empty values for keys present in COMPOSITE_KEY, first cache row wins
         filtered_car_data = {key: car_data[key] for key in COMPOSITE_KEY if car_data.get(key)}
-        updated_composite_key = list(filtered_car_data.keys())
-        # Filter mastercode_cache except admeid
-        filtered_mastercode_cache = [{key: dictionary[key] for key in dictionary if key in updated_composite_key or key == 'admeid'} for dictionary in mastercode_cache]
-        match_found = False
-        for mastercode_cache_dict in filtered_mastercode_cache:
-            # Check if all values in original_dict match the values in additional_dict
-            if all(filtered_car_data[key] == mastercode_cache_dict[key] for key in filtered_car_data):
-                print("here")
-                # Add the 'admeid' value to the original dictionary
-                car_data['admeid'] = mastercode_cache_dict['admeid']
-                match_found = True
-                break  # Stop iterating if a match is found
-        if not match_found:
-            # Handle the case when a match is not found
-            car_data['admeid'] = ''
-
-            
+        car_data['admeid'] = get_admeid_index(mastercode_cache).find(
+            tuple(filtered_car_data.keys()), tuple(filtered_car_data.values()), '')
     return car_data
 
 def map_data(car_data,mapping_tables):
@@ -199,6 +246,45 @@ def map_data_model_spec(car_data,mapping_tables,col_name, fk):
     return car_data
 
 
+def map_chunk(records: list[dict], mapping_tables) -> list:
+    """
+    Map the columns of a chunk of cars to their backbone ids, as map_data then
+    map_data_model_spec for the model and then the spec do for one car
+
+    Args:
+        records : cleaned cars, updated in place
+        mapping_tables : backbone lookups
+    Returns:
+        per car, the car or the exception raised while mapping it
+    """
+    index = get_id_mapping_index(mapping_tables)
+    columns, unmapped, model, spec = index.columns, index.unmapped, index.model, index.spec
+    mapped = []
+    for car in records:
+        try:
+            for column in unmapped:
+                if column in car:
+                    car = map_data(car, mapping_tables)
+                    break
+            else:
+                for column, id_column, lookup in columns:
+                    if column in car:
+                        value = car[column]
+                        car[id_column] = lookup.get(value if type(value) is str else str(value), '')
+            if model is None:
+                car = map_data_model_spec(car, mapping_tables, 'model', 'make_id')
+            elif 'model' in car:
+                car['model_id'] = model.get(str(car['make_id']), car['model'])
+            if spec is None:
+                car = map_data_model_spec(car, mapping_tables, 'spec', 'model_id')
+            elif 'spec' in car:
+                car['spec_id'] = spec.get(str(car['model_id']), car['spec'])
+        except Exception as e:
+            car = e
+        mapped.append(car)
+    return mapped
+
+
 def add_id_keys(raw_car, clean_car):
     id_keys = {key: value for key, value in clean_car.items() if key.endswith("_id")}
     raw_car.update(id_keys)
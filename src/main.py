@@ -1,9 +1,15 @@
 import os
 import logging
-import boto3
+import startup
+from conf import cold_start_instrumentation, backbone_snapshot_path, backbone_snapshot_s3_uri, file_workers, \
+    s3_read_workers
+if cold_start_instrumentation:
+    startup.record_imports()
+from startup import lazy_import
 from clean import trim_and_upper, cleaning_fuel_type, clean_transmission, clean_engine_size, clean_cylinders,\
     cleaning_hp, clean_by_type, clean_seller_type, clean_for_duration, clean_body_type, cleaning_spec, cleaning_model
 from src.event_processor import EventProcessor
+from snapshot import build_snapshot, write_snapshot
 
 cleaning_functions = {
     'make': trim_and_upper,
@@ -42,15 +48,38 @@ mapping_tables_names = ['bb_modelyear', 'bb_doors', 'bb_seats', 'bb_gears', 'bb_
 ACCESS_KEY = os.environ['aws_access_key']
 SECRET_KEY = os.environ['aws_secret_key']
 
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+# created on the first invocation, importing boto3 is a large part of a cold start
+s3 = None
+dynamodb = None
 logging.basicConfig(format='%(levelname)s %(asctime)s - %(message)s', level=logging.INFO, force=True)
 logger = logging.getLogger()
 
 
+def get_aws_clients():
+    global s3, dynamodb
+    if s3 is None:
+        boto3 = lazy_import('boto3')
+        # every file holds its ranged GETs and the two multipart uploads at once
+        config = lazy_import('botocore.config').Config(max_pool_connections=max(10, file_workers * (s3_read_workers + 2)))
+        s3 = boto3.client('s3', config=config)
+        dynamodb = boto3.resource('dynamodb')
+    return s3, dynamodb
+
+
 def lambda_handler(event, context):
+    s3, dynamodb = get_aws_clients()
     processor: EventProcessor = EventProcessor(
         s3, ACCESS_KEY, SECRET_KEY, destination_raw_bucket, destination_stg_bucket, secret, region, rds_pem_key, lambda_job_id,
         dynamodb_table, HOST, cleaning_functions, dynamodb, mapping_tables_names, logger)
-    processor.process_event(event)
+    return processor.process_event(event)
+
 
+def snapshot_handler(event, context):
+    """
+    Scheduled: write the backbone snapshot the cleaning invocations start from
+    """
+    s3, _ = get_aws_clients()
+    data = build_snapshot(mapping_tables_names, secret, region, ACCESS_KEY, SECRET_KEY, HOST, rds_pem_key)
+    write_snapshot(data, None if backbone_snapshot_s3_uri else backbone_snapshot_path, s3, backbone_snapshot_s3_uri)
+    logger.info(f"Backbone snapshot of {len(data)} bytes written to {backbone_snapshot_s3_uri or backbone_snapshot_path}")
+    return {'snapshot_bytes': len(data)}
@@ -0,0 +1,119 @@
+import time
+import threading
+
+from conf import mapping_cache_ttl_seconds, mapping_cache_max_age_seconds, backbone_snapshot_max_age_seconds
+from helpers import refresh_mapping_tables
+from snapshot import load_snapshot
+
+
+class MappingTableCache:
+    """
+    Backbone mapping tables kept across invocations of a warm container
+
+    Within the ttl the cached tables are served as is. After it, a row count / max id
+    fingerprint of every table is compared and only the changed tables are reloaded.
+    Every reload produces new dict objects and bumps ``version`` so anything derived
+    from the tables can be rebuilt. An empty cache is first filled from the backbone
+    snapshot when one is given and is recent enough; its age counts towards max_age.
+    """
+
+    def __init__(self, ttl_seconds: float, max_age_seconds: float,
+                 snapshot_max_age_seconds: float = backbone_snapshot_max_age_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.max_age_seconds = max_age_seconds
+        self.snapshot_max_age_seconds = snapshot_max_age_seconds
+        self.version = 0
+        self.mapping_tables_desc = {}
+        self.mapping_tables = {}
+        self._fingerprints = {}
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, tables: list[str], secret, region, aws_access_key, aws_secret_key, host, rds_pem_key,
+            read_snapshot=None, logger=None):
+        """
+        Return the mapping tables, loading or refreshing them when needed
+
+        Args:
+            read_snapshot : callable returning the backbone snapshot bytes or None, tried before the db
+                            when nothing is cached
+            logger : gets the load time of each table read from the db
+        Returns:
+            mapping tables descriptions, mapping tables lookups and cache details for the run record
+        """
+        with self._lock:
+            start = time.monotonic()
+            details = {}
+            if set(tables) != set(self._fingerprints) and read_snapshot is not None:
+                details['mapping_snapshot'] = self._load_snapshot(tables, read_snapshot)
+                if details['mapping_snapshot'] == 'loaded':
+                    self._checked_at = time.monotonic()
+                    return self.mapping_tables_desc, self.mapping_tables, {
+                        'mapping_cache': 'snapshot', 'mapping_tables_reloaded': len(tables),
+                        'mapping_load_time': f"{self._checked_at - start} seconds", 'mapping_version': self.version,
+                        **details}
+            if set(tables) != set(self._fingerprints):
+                status, known = 'miss', {}
+            elif start - self._checked_at < self.ttl_seconds:
+                return self.mapping_tables_desc, self.mapping_tables, {
+                    'mapping_cache': 'hit', 'mapping_tables_reloaded': 0, 'mapping_load_time': "0 seconds",
+                    'mapping_version': self.version}
+            elif start - self._loaded_at > self.max_age_seconds:
+                status, known = 'expired', {}
+            else:
+                status, known = 'refresh', self._fingerprints
+
+            fingerprints, loaded = refresh_mapping_tables(
+                tables, secret, region, aws_access_key, aws_secret_key, host, rds_pem_key, known, logger)
+            if loaded:
+                self._apply(tables, loaded)
+            if not known:
+                self._loaded_at = start
+            self._fingerprints = fingerprints
+            self._checked_at = time.monotonic()
+            return self.mapping_tables_desc, self.mapping_tables, {
+                'mapping_cache': status, 'mapping_tables_reloaded': len(loaded),
+                'mapping_load_time': f"{self._checked_at - start} seconds", 'mapping_version': self.version,
+                **details}
+
+    def _load_snapshot(self, tables, read_snapshot) -> str:
+        """
+        Fill the cache from the snapshot, returning 'loaded' or why it wasn't
+        """
+        try:
+            data = read_snapshot()
+            if data is None:
+                return 'missing'
+            snapshot = load_snapshot(data)
+        except Exception:
+            return 'unreadable'
+        if not set(tables) <= set(snapshot['tables']):
+            return 'missing tables'
+        age = time.time() - snapshot['created_at']
+        if age > self.snapshot_max_age_seconds:
+            return 'stale'
+        loaded = {table: (snapshot['mapping_tables_desc'].get(table), snapshot['mapping_tables'][table])
+                  for table in tables}
+        self._apply(tables, loaded)
+        self._fingerprints = {table: snapshot['fingerprints'][table] for table in tables}
+        self._loaded_at = time.monotonic() - max(age, 0)
+        return 'loaded'
+
+    def _apply(self, tables, loaded):
+        mapping_tables_desc = {}
+        mapping_tables = {}
+        for table in tables:
+            if table in loaded:
+                descriptions, lookup = loaded[table]
+            else:
+                descriptions, lookup = self.mapping_tables_desc.get(table), self.mapping_tables[table]
+            if descriptions is not None:
+                mapping_tables_desc[table] = descriptions
+            mapping_tables[table] = lookup
+        self.mapping_tables_desc = mapping_tables_desc
+        self.mapping_tables = mapping_tables
+        self.version += 1
+
+
+mapping_table_cache = MappingTableCache(mapping_cache_ttl_seconds, mapping_cache_max_age_seconds)
@@ -0,0 +1,289 @@
+import re
+from functools import cached_property, wraps
+
+from conf import cols_to_map, cols_to_mapping_tbl
+
+_WORD = re.compile(r'\w+')
+_REGEX_SPECIAL = frozenset('.^$*+?{}[]\\|()')
+
+
+class WordBoundaryPatterns:
+    """
+    Ordered ``\\b(value)\\b`` patterns searched case-insensitively, compiled once on first use
+
+    Literal ASCII values that start and end with a word character can only match where
+    their first word is a whole word of the searched text, so they are indexed by that
+    word and only the candidates of the text's words are run. Everything else is always
+    run. ``matches`` yields the same non-empty ``re.findall`` results, in the same order
+    and raising at the same point, as running every pattern in turn.
+    """
+
+    def __init__(self, values: list, escape: bool):
+        self._values = values
+        self._escape = escape
+        self._compiled = [None] * len(values)
+        self._always = []
+        self._by_first_word = {}
+        for position, value in enumerate(values):
+            words = _WORD.findall(value) if isinstance(value, str) else []
+            literal = escape or not any(char in _REGEX_SPECIAL for char in value)
+            if literal and words and value.isascii() and value.startswith(words[0]) and value.endswith(words[-1]):
+                self._by_first_word.setdefault(words[0].upper(), []).append(position)
+            else:
+                self._always.append(position)
+
+    def candidates(self, text: str):
+        if not text.isascii():
+            return range(len(self._values))
+        positions = list(self._always)
+        for word in set(_WORD.findall(text.upper())):
+            positions.extend(self._by_first_word.get(word, ()))
+        positions.sort()
+        return positions
+
+    def matches(self, text: str):
+        for position in self.candidates(text):
+            pattern = self._compiled[position]
+            if pattern is None:
+                value = self._values[position]
+                pattern = re.compile(r'\b({})\b'.format(re.escape(value) if self._escape else value), re.IGNORECASE)
+                self._compiled[position] = pattern
+            result = pattern.findall(text)
+            if result:
+                yield result
+
+
+class DescriptionIndex:
+    """
+    Upper-cased backbone descriptions with the lookups cleaning_model/cleaning_spec probe
+    """
+
+    def __init__(self, descriptions: list[str]):
+        self.upper = list(map(str.upper, descriptions))
+        self.upper_set = set(self.upper)
+        self._first = self.upper[0] if self.upper else None
+        # normalized form (no spaces, no hyphens) to the first description having it
+        self.normalized = {}
+        for description in self.upper:
+            self.normalized.setdefault(description.replace(' ', '').replace('-', ''), description)
+
+    @cached_property
+    def patterns(self) -> WordBoundaryPatterns:
+        return WordBoundaryPatterns(self.upper, escape=False)
+
+    def find(self, search_string: str):
+        """
+        Same as ``models[get_key(search_string, models)]``, including get_key treating index 0 as not found
+        """
+        value = search_string.upper()
+        if value in self.upper_set and value != self._first:
+            return value
+        return None
+
+
+class MappingIndex:
+    """
+    Lookup structures derived from the mapping tables descriptions, built once per table load
+    """
+
+    def __init__(self, data_to_map: dict[str, list[str]]):
+        self.data_to_map = data_to_map
+        self._body_type_matchers = {}
+
+    @cached_property
+    def models(self) -> DescriptionIndex:
+        return DescriptionIndex(self.data_to_map['bb_model'])
+
+    @cached_property
+    def specs(self) -> DescriptionIndex:
+        return DescriptionIndex(self.data_to_map['bb_specifications'])
+
+    @cached_property
+    def makes(self) -> list[str]:
+        return list(set(self.data_to_map['bb_make']))
+
+    @cached_property
+    def spec_patterns(self) -> WordBoundaryPatterns:
+        return WordBoundaryPatterns(
+            [value for value in self.data_to_map['bb_specifications'] if not str(value).isnumeric()], escape=True)
+
+    @cached_property
+    def model_removals(self) -> list[str]:
+        engine_sizes = self.data_to_map['bb_enginesize']
+        engines = [size.replace(" ", "") for size in engine_sizes]
+        return self.data_to_map['bb_fuel'] + engine_sizes + self.data_to_map['bb_body'] + engines + \
+            self.data_to_map['bb_hp']
+
+    @cached_property
+    def spec_removals(self) -> list[str]:
+        engine_sizes = self.data_to_map['bb_enginesize']
+        engines = [size.replace(" ", "").lower() for size in engine_sizes]
+        return self.data_to_map['bb_fuel'] + engine_sizes + self.data_to_map['bb_body'] + engines + \
+            self.data_to_map['bb_hp']
+
+    def body_type_matcher(self, excluded_words: list[str]) -> 'BodyTypeMatcher':
+        matcher = self._body_type_matchers.get(tuple(excluded_words))
+        if matcher is None:
+            matcher = BodyTypeMatcher(self.data_to_map['bb_body'], excluded_words)
+            self._body_type_matchers[tuple(excluded_words)] = matcher
+        return matcher
+
+    @cached_property
+    def toyota_removals(self) -> list[str]:
+        engine_number = [value.replace(" L", "") for value in self.data_to_map['bb_enginesize']]
+        hp_number = [value.replace(" HP", "") for value in self.data_to_map['bb_hp']]
+        return engine_number + hp_number
+
+
+class BodyTypeMatcher:
+    """
+    bb_body lookups of clean_body_type
+
+    ``exact`` maps the upper-cased body types to the first one having it. ``search`` gives
+    the first body type, in table order, found as a whole word; a single alternation of all
+    of them rules out most texts before the ordered patterns are run, as it matches exactly
+    when one of them does. The excluded words are only replaced, one after the other, in
+    texts their pattern finds.
+    """
+
+    def __init__(self, body_types: list[str], excluded_words: list[str]):
+        self.exact = {}
+        for value in body_types:
+            self.exact.setdefault(value.upper(), value)
+        self._excluded = [word.upper() for word in excluded_words]
+        self._excluded_pattern = re.compile('|'.join(map(re.escape, self._excluded))) if self._excluded else None
+        self._any = re.compile(r'\b(?:{})\b'.format('|'.join(map(re.escape, body_types))), re.IGNORECASE) \
+            if body_types else None
+        self._patterns = WordBoundaryPatterns(body_types, escape=True)
+        self._misc = re.compile(r'\b(SALOON)\b', re.IGNORECASE)
+
+    def strip_excluded(self, text: str) -> str:
+        if self._excluded_pattern is not None and self._excluded_pattern.search(text):
+            for word in self._excluded:
+                text = text.replace(word, '')
+        return text.strip()
+
+    def search(self, text: str):
+        if self._any is not None and self._any.search(text):
+            for matches in self._patterns.matches(text):
+                return matches[0].strip().upper()
+        matches = self._misc.findall(text)
+        return matches[0].strip().upper() if matches else None
+
+
+def _memoize_by_identity(builder):
+    """
+    Wrap a builder of an index over loaded tables so it only runs again for another tables object
+
+    Tables are replaced, never updated in place, on a reload, so the identity of the object
+    tells a new load apart. The last (tables, index) pair is swapped as one tuple: threads
+    racing on a new load may both build it, never get an index of other tables.
+    """
+    last = (None, None)
+
+    @wraps(builder)
+    def get(tables):
+        nonlocal last
+        built_for, index = last
+        if built_for is not tables:
+            index = builder(tables)
+            last = (tables, index)
+        return index
+
+    return get
+
+
+@_memoize_by_identity
+def get_mapping_index(data_to_map: dict[str, list[str]]) -> MappingIndex:
+    """
+    Return the model / spec / body type index of the mapping tables descriptions
+    """
+    return MappingIndex(data_to_map)
+
+
+class AdmeidIndex:
+    """
+    mastercodes_cache hashed on the populated subset of the composite key
+
+    A car matches the first cache row that is equal on every composite key the car has a
+    value for, so one dict per subset of keys (built on first use) answers it in O(1).
+    """
+
+    def __init__(self, mastercodes_cache: list[dict]):
+        self._mastercodes_cache = mastercodes_cache
+        self._tables = {}
+
+    def find(self, keys: tuple, values: tuple, default=None):
+        table = self._tables.get(keys)
+        if table is None:
+            table = {}
+            for row in self._mastercodes_cache:
+                table.setdefault(tuple(row[key] for key in keys), row['admeid'])
+            self._tables[keys] = table
+        return table.get(values, default)
+
+
+@_memoize_by_identity
+def get_admeid_index(mastercodes_cache: list[dict]) -> AdmeidIndex:
+    """
+    Return the admeid index of the mastercodes_cache rows
+    """
+    return AdmeidIndex(mastercodes_cache)
+
+
+class CompositeLookup:
+    """
+    A ``parent id + description`` keyed lookup (bb_model, bb_specifications) re-keyed on (parent id, description)
+
+    A parent id made of digits can only be a prefix of the leading digits of a concatenated
+    key, so every such split of every key is stored: a tuple lookup then finds exactly what
+    the string concatenation finds, without building the string.
+    """
+
+    def __init__(self, lookup: dict):
+        self.lookup = lookup
+        self._by_parent = {}
+        for key, value in lookup.items():
+            digits = 0
+            while digits < len(key) and key[digits].isdigit():
+                digits += 1
+            for split in range(digits + 1):
+                self._by_parent[(key[:split], key[split:])] = value
+
+    def get(self, parent: str, description, default=''):
+        if type(description) is str and (parent == '' or parent.isdigit()):
+            return self._by_parent.get((parent, description), default)
+        key = ''.join([parent, description])
+        return self.lookup[key] if key in self.lookup else default
+
+
+class IdMappingIndex:
+    """
+    Backbone lookups prepared for mapping a whole chunk of cars to their ids
+
+    ``columns`` holds (column, id column, lookup with the ids already as strings) for the
+    columns of map_data, ``model`` and ``spec`` the composite lookups. Columns without a
+    usable table are listed in ``unmapped`` (and model / spec left None), cars having them
+    go through the per car functions so they fail the same way.
+    """
+
+    def __init__(self, mapping_tables: dict):
+        self.columns = []
+        self.unmapped = []
+        for column in cols_to_map[:-2]:
+            table = mapping_tables.get(cols_to_mapping_tbl.get(column))
+            if isinstance(table, dict):
+                self.columns.append((column, column + '_id', {key: str(value) for key, value in table.items()}))
+            else:
+                self.unmapped.append(column)
+        model, spec = mapping_tables.get('bb_model'), mapping_tables.get('bb_specifications')
+        self.model = CompositeLookup(model) if isinstance(model, dict) else None
+        self.spec = CompositeLookup(spec) if isinstance(spec, dict) else None
+
+
+@_memoize_by_identity
+def get_id_mapping_index(mapping_tables: dict) -> IdMappingIndex:
+    """
+    Return the lookups map_chunk maps the ids of a chunk with
+    """
+    return IdMappingIndex(mapping_tables)
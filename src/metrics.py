@@ -0,0 +1,204 @@
+import sys
+import json
+import time
+import threading
+from contextlib import nullcontext
+
+from conf import metrics_namespace
+
+_NULL = nullcontext()
+_active = threading.local()
+
+
+class _Stage:
+    __slots__ = ('totals', 'wall', 'cpu')
+
+    def __init__(self, totals: list):
+        self.totals = totals
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.totals[0] += time.perf_counter() - self.wall
+        self.totals[1] += time.thread_time() - self.cpu
+        self.totals[2] += 1
+
+
+class RunMetrics:
+    """
+    Wall / CPU time per stage, time and calls per cleaner, counts and byte sizes of one run
+
+    Stages are timed where the work happens through the module level ``stage`` while this
+    object is active on the thread (``with metrics.active():``). Times of nested stages
+    are included in the enclosing ones. Nothing is recorded in CleaningPool worker
+    processes. When disabled every method is a no-op returning its input unchanged.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.cleaners = {}
+        self.counts = {}
+
+    def active(self):
+        """
+        Make this the metrics the ``stage``/``add`` functions of this thread record into
+        """
+        return _Activation(self) if self.enabled else _NULL
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL
+        totals = self.stages.get(name)
+        if totals is None:
+            totals = self.stages[name] = [0.0, 0.0, 0]
+        return _Stage(totals)
+
+    def add(self, name: str, value: int):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def timed_iter(self, name: str, iterable, count: str = None, size: str = None):
+        """
+        Time every step of an iterator as stage ``name``, counting its items and their length
+        """
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iterable, count, size)
+
+    def _timed_iter(self, name, iterable, count, size):
+        iterator = iter(iterable)
+        items = length = 0
+        try:
+            while True:
+                with self.stage(name):
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                items += 1
+                if size:
+                    length += len(item)
+                yield item
+        finally:
+            if count:
+                self.add(count, items)
+            if size:
+                self.add(size, length)
+
+    def wrap_cleaners(self, cleaning_functions: dict) -> dict:
+        """
+        Return the cleaning functions timed per column
+        """
+        if not self.enabled:
+            return cleaning_functions
+        return {column: self._timed(column, function) for column, function in cleaning_functions.items()}
+
+    def _timed(self, column, function):
+        totals = self.cleaners[column] = [0.0, 0]
+
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                totals[0] += time.perf_counter() - start
+                totals[1] += 1
+
+        timed.__wrapped__ = getattr(function, '__wrapped__', function)
+        return timed
+
+    def merge(self, other: 'RunMetrics'):
+        """
+        Add the stages of another run (e.g. the batch wide mapping tables load)
+        """
+        for name, (wall, cpu, calls) in other.stages.items():
+            totals = self.stages.setdefault(name, [0.0, 0.0, 0])
+            totals[0] += wall
+            totals[1] += cpu
+            totals[2] += calls
+
+    def details(self) -> dict:
+        """
+        Run record fields, floats as strings as DynamoDB doesn't take them
+        """
+        if not self.enabled:
+            return {}
+        elapsed = time.perf_counter() - self.started
+        records = self.counts.get('records', 0)
+        details = {
+            'stages': {name: {'wall': f"{wall:.4f} seconds", 'cpu': f"{cpu:.4f} seconds", 'calls': calls}
+                       for name, (wall, cpu, calls) in self.stages.items()},
+            'cleaners': {column: {'time': f"{spent:.4f} seconds", 'calls': calls}
+                         for column, (spent, calls) in self.cleaners.items() if calls},
+            'counts': dict(self.counts),
+            'records_per_second': f"{records / elapsed:.1f}" if elapsed else '0',
+        }
+        for sink in ('stage', 'raw'):
+            if self.counts.get(f'{sink}_bytes_out'):
+                details[f'{sink}_compression_ratio'] = \
+                    f"{self.counts[f'{sink}_bytes_in'] / self.counts[f'{sink}_bytes_out']:.2f}"
+        return details
+
+    def emit(self, job_id: str, file: str, stream=None):
+        """
+        Write the metrics as a CloudWatch embedded metric format line to stdout
+        """
+        if not self.enabled:
+            return
+        elapsed = time.perf_counter() - self.started
+        values = {f'{name}_seconds': round(wall, 6) for name, (wall, _, _) in self.stages.items()}
+        values.update({f'{name}_cpu_seconds': round(cpu, 6) for name, (_, cpu, _) in self.stages.items()})
+        values.update({f'cleaner_{column}_seconds': round(spent, 6)
+                       for column, (spent, calls) in self.cleaners.items() if calls})
+        values.update(self.counts)
+        values['records_per_second'] = round(self.counts.get('records', 0) / elapsed, 1) if elapsed else 0
+        units = {name: 'Seconds' if name.endswith('_seconds') else
+                 'Bytes' if 'bytes' in name else
+                 'Count/Second' if name == 'records_per_second' else 'Count' for name in values}
+        line = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': metrics_namespace,
+                    'Dimensions': [['JobId']],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in units.items()],
+                }],
+            },
+            'JobId': job_id,
+            'SourceFile': file,
+            **values,
+        }
+        (stream or sys.stdout).write(json.dumps(line) + '\n')
+
+
+class _Activation:
+    __slots__ = ('metrics', 'previous')
+
+    def __init__(self, metrics: RunMetrics):
+        self.metrics = metrics
+
+    def __enter__(self):
+        self.previous = getattr(_active, 'metrics', None)
+        _active.metrics = self.metrics
+        return self.metrics
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active.metrics = self.previous
+
+
+def stage(name: str):
+    """
+    Time a stage into the metrics active on this thread, if any
+    """
+    metrics = getattr(_active, 'metrics', None)
+    return metrics.stage(name) if metrics is not None else _NULL
+
+
+def add(name: str, value: int):
+    metrics = getattr(_active, 'metrics', None)
+    if metrics is not None:
+        metrics.add(name, value)
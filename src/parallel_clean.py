@@ -0,0 +1,109 @@
+import queue
+import multiprocessing
+from collections import deque
+
+from clean import clean_chunk, iter_chunks
+
+
+def _worker(connection, cleaning_functions, mapping_tables_desc, mapping_tables, logger):
+    while True:
+        chunk = connection.recv()
+        if chunk is None:
+            break
+        connection.send(clean_chunk(chunk, cleaning_functions, mapping_tables_desc, mapping_tables, logger))
+    connection.close()
+
+
+class CleaningPool:
+    """
+    Forked worker processes cleaning chunks of lines, results merged back in input order
+
+    Workers are forked when the pool is created so the mapping tables and their indexes are
+    shared copy-on-write instead of pickled; create it before starting the threads that clean
+    through it. A lock held by another thread at the fork stays held in the workers, so they
+    must only run clean_chunk and log: threads already running, like the tunnel of a pooled
+    backbone session, must not share locks with the cleaning. Only Process and Pipe are used
+    as Lambda has no /dev/shm for multiprocessing queues/pools.
+    Several threads may clean through the same pool: every chunk has a worker to itself,
+    one chunk in flight per worker.
+    """
+
+    def __init__(self, workers: int, cleaning_functions, mapping_tables_desc, mapping_tables, logger):
+        context = multiprocessing.get_context('fork')
+        self._idle = queue.Queue()
+        self._processes = []
+        self._connections = []
+        for _ in range(workers):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=_worker, daemon=True,
+                args=(child_connection, cleaning_functions, mapping_tables_desc, mapping_tables, logger))
+            process.start()
+            child_connection.close()
+            self._processes.append(process)
+            self._connections.append(parent_connection)
+            self._idle.put(parent_connection)
+        self._alive = workers
+
+    def clean(self, contents, chunk_size: int):
+        in_flight = deque()
+        try:
+            for chunk in iter_chunks(contents, chunk_size):
+                # only block for a worker when holding none, so threads sharing the pool can't deadlock
+                while True:
+                    try:
+                        connection = self._idle.get_nowait()
+                        break
+                    except queue.Empty:
+                        if not in_flight:
+                            connection = self._acquire()
+                            break
+                        yield from self._receive(in_flight.popleft())
+                connection.send(chunk)
+                in_flight.append(connection)
+            while in_flight:
+                yield from self._receive(in_flight.popleft())
+        finally:
+            # a consumer that stops early still owes the workers it holds a read
+            for connection in in_flight:
+                try:
+                    self._receive(connection)
+                except RuntimeError:
+                    pass
+
+    def _acquire(self):
+        while True:
+            if not self._alive:
+                raise RuntimeError("No cleaning worker process left")
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def _receive(self, connection):
+        try:
+            cleaned = connection.recv()
+        except EOFError:
+            self._alive -= 1
+            raise RuntimeError("Cleaning worker process exited unexpectedly")
+        self._idle.put(connection)
+        return cleaned
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for connection in self._connections:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
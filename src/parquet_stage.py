@@ -0,0 +1,105 @@
+from conf import fields_data, cols_to_map, cols_to_mapping_tbl, parquet_row_group_size, parquet_compression, \
+    parquet_dictionary_columns, parquet_batch_rows
+from serializers import dumps
+from startup import lazy_import
+
+ID_COLUMNS = [column + '_id' for column in cols_to_map if column in cols_to_mapping_tbl] + ['admeid']
+# every cleaned column, then the backbone ids and the tracking id; keys outside of it go to `extra` as JSON
+STAGE_COLUMNS = list(dict.fromkeys(list(fields_data.values()) + ID_COLUMNS + ['tracking_id', 'extra']))
+
+
+def _to_string(value):
+    if value is None or type(value) is str:
+        return value
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode('utf-8')
+    return str(value)
+
+
+def _encodable(value):
+    # lone surrogates (from the json.loads fallback) escaped as the JSON stage writes them, e.g. \ud800
+    if value is None:
+        return value
+    try:
+        value.encode('utf-8')
+        return value
+    except UnicodeEncodeError:
+        return value.encode('utf-8', 'backslashreplace').decode('utf-8')
+
+
+class ParquetStageWriter:
+    """
+    Write cleaned cars as Parquet to a binary file, one row group at a time
+
+    Every column of STAGE_COLUMNS is a nullable string, so the schema is the same for every
+    file whatever the feed; numbers are written as text and nested values as JSON. Only the
+    rows of the row group being filled are held in memory, as Arrow arrays: rows are kept as
+    Python values for ``batch_rows`` rows only, then converted a column at a time. Strings
+    UTF-8 can't encode are escaped and logged rather than failing the file.
+    """
+
+    def __init__(self, sink, row_group_size: int = parquet_row_group_size,
+                 compression: str = parquet_compression, batch_rows: int = parquet_batch_rows,
+                 logger=None):
+        pa = lazy_import('pyarrow')
+        self.logger = logger
+        self.row_group_size = row_group_size
+        self.batch_rows = batch_rows
+        self.rows = 0
+        self._schema = pa.schema([pa.field(column, pa.string()) for column in STAGE_COLUMNS])
+        self._known = frozenset(STAGE_COLUMNS[:-1])
+        self._columns = {column: [] for column in STAGE_COLUMNS}
+        self._batches = {column: [] for column in STAGE_COLUMNS}
+        self._batched = 0
+        self._pending = 0
+        self._writer = lazy_import('pyarrow.parquet').ParquetWriter(
+            sink, self._schema, compression=compression,
+            use_dictionary=[column for column in STAGE_COLUMNS
+                            if column in parquet_dictionary_columns or column in ID_COLUMNS])
+
+    def write(self, car: dict):
+        columns = self._columns
+        extra = {key: value for key, value in car.items() if key not in self._known}
+        for column in STAGE_COLUMNS[:-1]:
+            columns[column].append(_to_string(car.get(column)))
+        columns['extra'].append(dumps(extra).decode('utf-8') if extra else None)
+        self._batched += 1
+        self._pending += 1
+        self.rows += 1
+        if self._pending >= self.row_group_size:
+            self._write_row_group()
+        elif self._batched >= self.batch_rows:
+            self._convert_batch()
+
+    def close(self):
+        if self._pending:
+            self._write_row_group()
+        self._writer.close()
+
+    def _convert_batch(self):
+        pa = lazy_import('pyarrow')
+        for column in STAGE_COLUMNS:
+            values = self._columns[column]
+            try:
+                array = pa.array(values, type=pa.string())
+            except UnicodeEncodeError:
+                escaped = [_encodable(value) for value in values]
+                if self.logger is not None:
+                    count = sum(new is not old for old, new in zip(values, escaped))
+                    self.logger.warning(f"{count} values of {column} are not valid UTF-8, written escaped")
+                array = pa.array(escaped, type=pa.string())
+            self._batches[column].append(array)
+            values.clear()
+        self._batched = 0
+
+    def _write_row_group(self):
+        pa = lazy_import('pyarrow')
+        if self._batched:
+            self._convert_batch()
+        table = pa.Table.from_arrays(
+            [pa.chunked_array(self._batches[column], type=pa.string()) for column in STAGE_COLUMNS],
+            schema=self._schema)
+        self._writer.write_table(table, row_group_size=self._pending)
+        for arrays in self._batches.values():
+            arrays.clear()
+        self._pending = 0
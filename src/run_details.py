@@ -0,0 +1,138 @@
+import queue
+import threading
+
+from conf import run_details_max_attempts, run_details_flush_timeout_seconds
+from helpers import backoff
+
+# items of one BatchWriteItem call
+BATCH_SIZE = 25
+
+
+class RunDetailsWriter:
+    """
+    Run detail items written to a DynamoDB table by a background thread, up to 25 per BatchWriteItem
+
+    put() only queues the item, so the write never delays the file that follows. The thread
+    runs while there are items queued; flush() waits for the items queued so far, before the
+    handler returns and the container is frozen. Unprocessed items are retried with exponential
+    backoff; a batch DynamoDB rejects as a whole (e.g. two items with the same key) is written
+    item by item instead, the last one winning as with put_item.
+    """
+
+    def __init__(self, dynamodb_client, table: str, logger, max_attempts: int = run_details_max_attempts):
+        self.dynamodb_client = dynamodb_client
+        # the resource's client, for the same reason as DynamoDBFingerprintStore
+        self._client = dynamodb_client.meta.client
+        self.table = table
+        self.logger = logger
+        self.max_attempts = max_attempts
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, item: dict):
+        self._enqueue(item)
+
+    def flush(self, timeout: float = run_details_flush_timeout_seconds) -> bool:
+        """
+        Wait until every item queued before the call is written or given up
+
+        Returns:
+            False when the timeout ran out first
+        """
+        done = threading.Event()
+        self._enqueue(done)
+        return done.wait(timeout)
+
+    def _enqueue(self, entry):
+        with self._lock:
+            self._queue.put(entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='run-details', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # exits when idle, no thread is left behind when the cleaning pool forks
+                if self._queue.empty():
+                    self._thread = None
+                    return
+            items = []
+            flushes = []
+            while len(items) < BATCH_SIZE:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                (flushes if isinstance(entry, threading.Event) else items).append(entry)
+            if items:
+                try:
+                    self._write(items)
+                except Exception:
+                    self.failed += len(items)
+                    self.logger.exception(f"Error while writing {len(items)} run details to dynamodb")
+            for done in flushes:
+                done.set()
+
+    def _write(self, items: list[dict]):
+        request = {self.table: [{'PutRequest': {'Item': item}} for item in items]}
+        attempt = 0
+        while True:
+            try:
+                unprocessed = self._client.batch_write_item(RequestItems=request).get('UnprocessedItems')
+            except Exception as error:
+                if getattr(error, 'response', {}).get('Error', {}).get('Code') == 'ValidationException':
+                    self._put_each([entry['PutRequest']['Item'] for entry in request[self.table]])
+                    return
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                unprocessed = request
+            else:
+                attempt += 1
+            left = len(unprocessed.get(self.table, [])) if unprocessed else 0
+            self.written += len(request[self.table]) - left
+            if not left:
+                return
+            if attempt >= self.max_attempts:
+                self.failed += left
+                self.logger.error(f"{left} run details left unprocessed by dynamodb after {attempt} attempts")
+                return
+            request = unprocessed
+            backoff(attempt)
+
+    def _put_each(self, items: list[dict]):
+        for item in items:
+            try:
+                self._client.put_item(TableName=self.table, Item=item)
+                self.written += 1
+            except Exception:
+                self.failed += 1
+                self.logger.exception(f"Error while writing run details of {item.get('source_file')} to dynamodb")
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_run_details_writer(dynamodb_client, table: str, logger) -> RunDetailsWriter:
+    """
+    Return the container wide writer of the table, created on first use or for another client
+    """
+    with _writers_lock:
+        writer = _writers.get(table)
+        if writer is None or writer.dynamodb_client is not dynamodb_client:
+            writer = _writers[table] = RunDetailsWriter(dynamodb_client, table, logger)
+        return writer
+
+
+def flush_run_details(timeout: float = run_details_flush_timeout_seconds) -> bool:
+    """
+    Flush every writer, False when one of them did not finish in time
+    """
+    with _writers_lock:
+        writers = list(_writers.values())
+    return all([writer.flush(timeout) for writer in writers])
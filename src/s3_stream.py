@@ -0,0 +1,311 @@
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+
+from conf import multipart_part_size, gzip_compress_level, s3_read_workers, s3_read_range_size, s3_read_ahead, \
+    decompressed_chunk_size
+from metrics import stage
+from startup import lazy_import
+
+# key suffixes, Content-Encoding values and leading bytes of the compressed inputs
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.gzip': 'gzip', '.zst': 'zstd', '.zstd': 'zstd'}
+CONTENT_ENCODINGS = {'gzip': 'gzip', 'x-gzip': 'gzip', 'zstd': 'zstd'}
+COMPRESSION_MAGIC = {b'\x1f\x8b': 'gzip', b'\x28\xb5\x2f\xfd': 'zstd'}
+# compressed bytes given to the zstd decompressor per call
+ZSTD_INPUT_SLICE = 256
+
+
+class MultipartUpload:
+    """
+    Upload bytes as they are written as an S3 multipart upload
+
+    Only the bytes of the part being filled are held in memory, so the footprint stays
+    at about one part whatever the size of the object. Also usable as a binary file
+    opened for writing (e.g. by pyarrow writers).
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int = multipart_part_size):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.closed = False
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+
+    def write(self, data: bytes) -> int:
+        self.bytes_in += len(data)
+        self._buffer += self._encode(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def tell(self) -> int:
+        return self.bytes_in
+
+    def flush(self):
+        pass
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self) -> dict:
+        """
+        Upload the last part and complete the upload
+        """
+        if self.closed:
+            return self._response
+        self._buffer += self._flush_encoder()
+        # no empty last part when the object ends on a part boundary, an upload still needs one part
+        if self._buffer or not self._parts:
+            self._upload_part()
+        with stage('s3_upload'):
+            self._response = self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={'Parts': self._parts})
+        self.closed = True
+        return self._response
+
+    def abort(self):
+        self.closed = True
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+    def _encode(self, data: bytes) -> bytes:
+        return data
+
+    def _flush_encoder(self) -> bytes:
+        return b''
+
+    def _upload_part(self):
+        part_number = len(self._parts) + 1
+        with stage('s3_upload'):
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=part_number,
+                Body=bytes(self._buffer))
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self.bytes_out += len(self._buffer)
+        self._buffer.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and not self.closed:
+            self.abort()
+
+
+class MultipartGzipUpload(MultipartUpload):
+    """
+    Gzip bytes as they are written and upload them as an S3 multipart upload
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int = multipart_part_size):
+        self._compressor = zlib.compressobj(gzip_compress_level, zlib.DEFLATED, 31)
+        super().__init__(s3_client, bucket, key, part_size)
+
+    def _encode(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def _flush_encoder(self) -> bytes:
+        return self._compressor.flush()
+
+
+def read_object_lines(s3_client, bucket: str, key: str, workers: int = s3_read_workers,
+                      range_size: int = s3_read_range_size, read_ahead: int = s3_read_ahead):
+    """
+    Lines of an S3 object, split as botocore's iter_lines() splits them, read with concurrent ranged GETs
+
+    The first range also gives the object size, the next ones are fetched by ``workers`` threads
+    at most ``read_ahead`` ranges ahead of the line being consumed, so memory stays at about
+    ``read_ahead * range_size``. With one worker the object is streamed by a single GET.
+    gzip and zstd objects (key suffix, Content-Encoding or leading bytes) are decompressed on
+    the fly, ``decompressed_chunk_size`` bytes at a time.
+
+    Returns:
+        iterator of the lines as bytes, without their line terminators
+    """
+    if workers > 1:
+        response = _get_first_range(s3_client, bucket, key, range_size)
+    else:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    content_range = response.get('ContentRange')
+    if content_range:
+        size = int(content_range.rpartition('/')[2])
+        chunks = _iter_ranges(s3_client, bucket, key, response['Body'].read(), response.get('ETag'), size,
+                              range_size, workers, read_ahead)
+    else:
+        chunks = response['Body'].iter_chunks(1024 * 1024)
+    head, chunks = _peek(chunks, max(map(len, COMPRESSION_MAGIC)))
+    compression = input_compression(key, response.get('ContentEncoding'), head)
+    if compression:
+        chunks = decompress_chunks(chunks, compression)
+    return iter_lines(chunks)
+
+
+def _peek(chunks, size: int):
+    """
+    The first ``size`` bytes of a stream of chunks (fewer if it is shorter) and the whole stream
+    """
+    chunks = iter(chunks)
+    taken = []
+    head = b''
+    while len(head) < size:
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        taken.append(chunk)
+        head += chunk
+    return head[:size], chain(taken, chunks)
+
+
+def _get_first_range(s3_client, bucket, key, range_size):
+    try:
+        return s3_client.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{range_size - 1}')
+    except Exception as error:
+        # S3 answers a range request on an empty object with InvalidRange
+        if getattr(error, 'response', {}).get('Error', {}).get('Code') != 'InvalidRange':
+            raise
+        return s3_client.get_object(Bucket=bucket, Key=key)
+
+
+def _iter_ranges(s3_client, bucket, key, first, etag, size, range_size, workers, read_ahead):
+    """
+    The first range then the following ones in order, fetched ahead by a thread pool
+    """
+    yield first
+    offsets = iter(range(len(first), size, range_size))
+
+    def get_range(offset):
+        # If-Match: a rewrite of the object between two ranges fails the read instead of mixing versions
+        extra = {'IfMatch': etag} if etag else {}
+        response = s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f'bytes={offset}-{min(offset + range_size, size) - 1}', **extra)
+        return response['Body'].read()
+
+    executor = ThreadPoolExecutor(workers, thread_name_prefix='s3-read')
+    pending = deque(executor.submit(get_range, offset) for offset in islice(offsets, max(read_ahead, 1)))
+    try:
+        while pending:
+            data = pending.popleft().result()
+            for offset in islice(offsets, 1):
+                pending.append(executor.submit(get_range, offset))
+            yield data
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def input_compression(key: str, content_encoding: str = None, head: bytes = b''):
+    """
+    'gzip', 'zstd' or None for an uncompressed object, from the key suffix, else the
+    Content-Encoding, else the leading bytes ``head`` of the object
+
+    Returns:
+        'gzip', 'zstd' or None
+    """
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if key.lower().endswith(suffix):
+            return compression
+    compression = CONTENT_ENCODINGS.get((content_encoding or '').lower())
+    if compression:
+        return compression
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def decompress_chunks(chunks, compression: str, chunk_size: int = decompressed_chunk_size):
+    """
+    Decompress a stream of byte chunks into chunks of about ``chunk_size`` bytes
+
+    A few KiB of input can hold GiBs of repeated lines, so the output is bounded, not the input.
+    Concatenated gzip members and zstd frames are read through; a stream cut short raises EOFError.
+    """
+    if compression == 'gzip':
+        return _gunzip_chunks(chunks, chunk_size)
+    if compression == 'zstd':
+        return _unzstd_chunks(chunks, chunk_size)
+    raise ValueError(f"Unknown compression {compression}")
+
+
+def _gunzip_chunks(chunks, chunk_size):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    started = False
+    for chunk in chunks:
+        while chunk:
+            started = True
+            data = decompressor.decompress(chunk, chunk_size)
+            if data:
+                yield data
+            if decompressor.eof:
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                started = False
+            else:
+                chunk = decompressor.unconsumed_tail
+                # a full output may leave more of the consumed input to flush
+                while not chunk and len(data) == chunk_size and not decompressor.eof:
+                    data = decompressor.decompress(b'', chunk_size)
+                    if data:
+                        yield data
+    if started and not decompressor.eof:
+        raise EOFError("Compressed input ended before the end of the gzip stream")
+
+
+def _unzstd_chunks(chunks, chunk_size):
+    # zstandard's decompressobj has no output limit, but a zstd block inflates to 128 KiB at most,
+    # so feeding it small slices of input keeps the output of every call small
+    zstd = lazy_import('zstandard').ZstdDecompressor()
+    decompressor = zstd.decompressobj()
+    started = False
+    output = bytearray()
+    for chunk in chunks:
+        view = memoryview(chunk)
+        while view:
+            data, view = view[:ZSTD_INPUT_SLICE], view[ZSTD_INPUT_SLICE:]
+            while data:
+                started = True
+                output += decompressor.decompress(data)
+                if decompressor.eof:
+                    data = decompressor.unused_data
+                    decompressor = zstd.decompressobj()
+                    started = False
+                else:
+                    data = b''
+            while len(output) >= chunk_size:
+                yield bytes(output[:chunk_size])
+                del output[:chunk_size]
+    if output:
+        yield bytes(output)
+    if started and not decompressor.eof:
+        raise EOFError("Compressed input ended before the end of the zstd frame")
+
+
+def iter_lines(chunks):
+    """
+    Split a stream of byte chunks into lines exactly as botocore's StreamingBody.iter_lines()
+
+    That is as ``bytes.splitlines()`` of the whole stream: a line ends at \\n, \\r or \\r\\n,
+    the last line with or without one.
+    """
+    pending = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        data = pending + chunk if pending else chunk
+        lines = data.splitlines()
+        if data.endswith(b'\r'):
+            # half of a \r\n maybe, decided by the next chunk
+            pending = lines.pop() + b'\r'
+        elif data.endswith(b'\n'):
+            pending = b''
+        else:
+            pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending.splitlines()[0]
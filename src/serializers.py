@@ -0,0 +1,81 @@
+"""
+JSON codec of the line pipeline: bytes in from iter_lines(), bytes out to the gzip streams
+
+msgspec or orjson decode the lines when installed and fall back to the standard library,
+per line, for anything they reject (NaN/Infinity literals, lone surrogates), so every
+line the standard library accepts is still accepted, as the same values. orjson reads
+integers over 64 bits as floats: lines where it may have are decoded again by json,
+which leaves it barely faster than json. Records are always encoded by json.dumps, as
+the fast encoders write NaN/Infinity as null, compact separators and raw UTF-8, which
+would change the bytes of the raw and stage files.
+"""
+import json
+
+from conf import json_backend
+
+
+def _has_huge_float(obj) -> bool:
+    # where orjson may have read an integer that doesn't fit in 64 bits
+    if type(obj) is float:
+        return not -9.2e18 < obj < 1.8e19
+    if type(obj) is dict:
+        obj = obj.values()
+    elif type(obj) is not list:
+        return False
+    return any(_has_huge_float(value) for value in obj if type(value) in (float, dict, list))
+
+
+def _json_loads(data: bytes):
+    return json.loads(data)
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj).encode('utf-8')
+
+
+def _orjson_codec():
+    import orjson
+
+    def loads(data: bytes):
+        try:
+            obj = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return _json_loads(data)
+        # orjson reads integers outside of 64 bits as floats, json keeps them exact
+        return _json_loads(data) if _has_huge_float(obj) else obj
+
+    return 'orjson', loads, _json_dumps
+
+
+def _msgspec_codec():
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+
+    def loads(data: bytes):
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError:
+            return _json_loads(data)
+
+    return 'msgspec', loads, _json_dumps
+
+
+def get_codec(backend: str = json_backend):
+    """
+    Return (backend name, loads, dumps) for the requested backend
+    """
+    codecs = {'orjson': [_orjson_codec], 'msgspec': [_msgspec_codec], 'json': [],
+              'auto': [_msgspec_codec, _orjson_codec]}
+    if backend not in codecs:
+        raise ValueError(f"Unknown json backend: {backend}")
+    for codec in codecs[backend]:
+        try:
+            return codec()
+        except ImportError:
+            if backend != 'auto':
+                raise
+    return 'json', _json_loads, _json_dumps
+
+
+backend, loads, dumps = get_codec()
@@ -0,0 +1,108 @@
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+
+from helpers import refresh_mapping_tables
+from serializers import dumps, loads
+
+SNAPSHOT_MAGIC = b'BBSNAP'
+SNAPSHOT_FORMAT = 1
+
+
+def dump_snapshot(tables: list[str], mapping_tables_desc: dict, mapping_tables: dict, fingerprints: dict,
+                  created_at: float = None) -> bytes:
+    """
+    Serialize loaded mapping tables: magic, format version byte, then zlib'd JSON
+
+    The lookups are stored as loaded (descriptions, upper-cased description to id, mastercodes
+    rows); the indexes derived from them are rebuilt on first use as after a db load.
+    """
+    payload = {
+        'format': SNAPSHOT_FORMAT,
+        'created_at': time.time() if created_at is None else created_at,
+        'tables': list(tables),
+        'fingerprints': {table: list(fingerprints[table]) for table in tables},
+        'mapping_tables_desc': {table: mapping_tables_desc[table] for table in tables if table in mapping_tables_desc},
+        'mapping_tables': {table: mapping_tables[table] for table in tables},
+    }
+    return SNAPSHOT_MAGIC + bytes([SNAPSHOT_FORMAT]) + zlib.compress(dumps(payload), 6)
+
+
+def load_snapshot(data: bytes) -> dict:
+    """
+    Parse a snapshot written by dump_snapshot
+
+    Raises:
+        ValueError : not a snapshot, or one of another format version
+    """
+    header = len(SNAPSHOT_MAGIC)
+    if len(data) <= header or data[:header] != SNAPSHOT_MAGIC:
+        raise ValueError("Not a backbone snapshot")
+    if data[header] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Backbone snapshot format {data[header]}, expected {SNAPSHOT_FORMAT}")
+    payload = loads(zlib.decompress(data[header + 1:]))
+    # compared with the tuples of get_table_fingerprints on refresh
+    payload['fingerprints'] = {table: tuple(fingerprint) for table, fingerprint in payload['fingerprints'].items()}
+    return payload
+
+
+def build_snapshot(tables: list[str], secret, region, aws_access_key, aws_secret_key, host, rds_pem_key) -> bytes:
+    """
+    Load every table from the backbone db and serialize it, fingerprints taken before the load
+    """
+    fingerprints, loaded = refresh_mapping_tables(
+        tables, secret, region, aws_access_key, aws_secret_key, host, rds_pem_key, {})
+    mapping_tables_desc = {table: descriptions for table, (descriptions, _) in loaded.items()
+                           if descriptions is not None}
+    mapping_tables = {table: lookup for table, (_, lookup) in loaded.items()}
+    return dump_snapshot(tables, mapping_tables_desc, mapping_tables, fingerprints)
+
+
+def split_s3_uri(uri: str) -> tuple[str, str]:
+    bucket, _, key = uri.removeprefix('s3://').partition('/')
+    return bucket, key
+
+
+def read_snapshot(path: str = None, s3_client=None, s3_uri: str = None):
+    """
+    Snapshot bytes with at most one S3 GET, None when there is none
+
+    The S3 object, when configured, is the reference: the local file is only read when the
+    object was not modified since the file was written (a conditional GET), so a stale local
+    copy never hides a newer snapshot. Without S3, the local file if there is one.
+    """
+    written_at = None
+    if path:
+        try:
+            written_at = os.path.getmtime(path)
+        except FileNotFoundError:
+            pass
+    if s3_uri and s3_client is not None:
+        bucket, key = split_s3_uri(s3_uri)
+        request = {'Bucket': bucket, 'Key': key}
+        if written_at is not None:
+            request['IfModifiedSince'] = datetime.fromtimestamp(written_at, timezone.utc)
+        try:
+            return s3_client.get_object(**request)['Body'].read()
+        except s3_client.exceptions.NoSuchKey:
+            return None
+        except s3_client.exceptions.ClientError as error:
+            if error.response.get('Error', {}).get('Code') not in ('304', 'NotModified'):
+                raise
+    if written_at is not None:
+        try:
+            with open(path, 'rb') as snapshot_file:
+                return snapshot_file.read()
+        except FileNotFoundError:
+            pass
+    return None
+
+
+def write_snapshot(data: bytes, path: str = None, s3_client=None, s3_uri: str = None):
+    if path:
+        with open(path, 'wb') as snapshot_file:
+            snapshot_file.write(data)
+    if s3_uri and s3_client is not None:
+        bucket, key = split_s3_uri(s3_uri)
+        s3_client.put_object(Bucket=bucket, Key=key, Body=data)
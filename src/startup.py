@@ -0,0 +1,72 @@
+import sys
+import time
+import builtins
+import importlib
+import threading
+
+process_start = time.perf_counter()
+# top level package name to seconds spent importing it, nested imports included
+import_times = {}
+_lock = threading.Lock()
+_original_import = builtins.__import__
+_first_file_at = None
+
+
+def lazy_import(name: str):
+    """
+    Import a heavy dependency on first use instead of at module load
+
+    A module still being imported by another thread is already in sys.modules, so the
+    shortcut only returns fully initialized ones; import_module waits for the others.
+    """
+    module = sys.modules.get(name)
+    if module is not None and not getattr(getattr(module, '__spec__', None), '_initializing', False):
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        import_times.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    package = name.partition('.')[0]
+    if level or package in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        import_times.setdefault(package, time.perf_counter() - start)
+
+
+def record_imports():
+    """
+    Time every import from now on, to be called before the handler's own imports
+    """
+    builtins.__import__ = _timed_import
+
+
+def mark_first_file() -> bool:
+    """
+    Note the start of the container's first file
+
+    Returns:
+        whether this was the first file
+    """
+    global _first_file_at
+    with _lock:
+        if _first_file_at is not None:
+            return False
+        _first_file_at = time.perf_counter()
+        return True
+
+
+def cold_start_details() -> dict:
+    """
+    Run details of the cold start: time to the first file and import time of every module
+    """
+    details = {'import_times': {name: f"{seconds:.4f} seconds" for name, seconds in import_times.items()}}
+    if _first_file_at is not None:
+        details['time_to_first_file'] = f"{_first_file_at - process_start:.4f} seconds"
+    return details
@@ -0,0 +1,29 @@
+import copy
+
+import fixtures
+import legacy
+from bench_admeid import make_cars
+from conf import COMPOSITE_KEY
+from helpers import add_admeid
+
+
+def _admeids(function, cars, mapping_tables):
+    return [function(car, mapping_tables)['admeid'] for car in copy.deepcopy(cars)]
+
+
+def test_index_matches_the_legacy_scan():
+    _, mapping_tables = fixtures.mapping_tables()
+    cars = make_cars(mapping_tables, 400, seed=11)
+    assert _admeids(add_admeid, cars, mapping_tables) == _admeids(legacy.add_admeid, cars, mapping_tables)
+
+
+def test_first_matching_row_wins():
+    row = dict.fromkeys(COMPOSITE_KEY, '1')
+    mastercodes = [{**row, 'spec_id': '7', 'admeid': 'A'}, {**row, 'admeid': 'B'}, {**row, 'admeid': 'C'},
+                   {**row, 'make_id': '2', 'admeid': 'D'}]
+    mapping_tables = {'mastercodes_cache': mastercodes}
+    cars = [row, {**row, 'spec_id': ''}, {**row, 'doors_id': '', 'spec_id': '7'}, {**row, 'make_id': '2'},
+            {**row, 'make_id': ''}, {**row, 'seats_id': '9'}]
+    admeids = _admeids(add_admeid, cars, mapping_tables)
+    assert admeids == _admeids(legacy.add_admeid, cars, mapping_tables)
+    assert admeids == ['B', 'A', 'A', 'D', '', '']
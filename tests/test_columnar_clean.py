@@ -0,0 +1,40 @@
+import json
+import logging
+
+import fixtures
+from bench_columnar_clean import COLUMNS, salted_lines
+from clean import clean_chunk, iter_chunks, trim_and_upper
+from cleaner_memo import CleanerMemo
+from columnar_clean import clean_column
+
+logger = logging.getLogger('test')
+# lone surrogates, only json.loads lets them through, Arrow can't encode them
+SURROGATES = ['\ud800', ' \udc00 petrol ', 'a\ud83dA/T']
+
+
+def _feed():
+    mapping_tables_desc, mapping_tables = fixtures.mapping_tables()
+    lines = salted_lines(fixtures.feed_lines(mapping_tables_desc, 3000), rate=0.1)
+    for position, value in enumerate(SURROGATES * 20):
+        record = json.loads(lines[position * 7])
+        record[COLUMNS[position % len(COLUMNS)]] = value
+        lines[position * 7] = json.dumps(record).encode('utf-8')
+    return lines, mapping_tables_desc, mapping_tables
+
+
+def test_columnar_cleaning_matches_the_scalar_cleaners():
+    lines, mapping_tables_desc, mapping_tables = _feed()
+    plain = fixtures.cleaning_functions()
+    for cleaning_functions in (plain, CleanerMemo(50000).wrap(plain, 1)):
+        def run(columnar):
+            return [record for chunk in iter_chunks(lines, 500) for record in clean_chunk(
+                chunk, cleaning_functions, mapping_tables_desc, mapping_tables, logger, columnar=columnar)]
+        expected = run(False)
+        assert len(expected) == len(lines)
+        assert run(True) == expected
+
+
+def test_clean_column_sends_unencodable_strings_to_the_scalar_cleaner():
+    values = ['a', '\ud800x', ' b ', None]
+    assert clean_column(values, 'make', trim_and_upper, logger) == [
+        trim_and_upper(value, logger) for value in values]
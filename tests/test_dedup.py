@@ -0,0 +1,53 @@
+import json
+import logging
+
+import dedup
+from dedup import Deduplicator, DynamoDBFingerprintStore, SqliteFingerprintStore
+
+
+class ThrottledDynamoDB:
+    """
+    Leaves every key and item unprocessed, rejects empty key attributes as DynamoDB does
+    """
+
+    def __init__(self):
+        self.meta = self
+        self.client = self
+        self.calls = 0
+
+    def batch_get_item(self, RequestItems):
+        self.calls += 1
+        for request in RequestItems.values():
+            assert all(key['tracking_id'] for key in request['Keys'])
+        return {'Responses': {}, 'UnprocessedKeys': RequestItems}
+
+    def batch_write_item(self, RequestItems):
+        self.calls += 1
+        return {'UnprocessedItems': RequestItems}
+
+
+def test_unprocessed_retries_are_capped(monkeypatch, caplog):
+    monkeypatch.setattr(dedup, 'backoff', lambda attempt: None)
+    client = ThrottledDynamoDB()
+    store = DynamoDBFingerprintStore(client, 'fingerprints', logging.getLogger('test'), max_attempts=3)
+    with caplog.at_level(logging.WARNING):
+        assert store.get_many(['a', 'b']) == {}
+        store.put_many({'a': '1'})
+    assert client.calls == 6
+    assert 'not looked up' in caplog.text and 'not written' in caplog.text
+
+
+def _line(**fields):
+    return json.dumps({'meta': {}, **fields}).encode('utf-8')
+
+
+def test_listings_without_tracking_id_are_never_deduplicated(tmp_path):
+    store = SqliteFingerprintStore(str(tmp_path / 'fingerprints.db'))
+    lines = [_line(Seller_Name='ACME', vin='123'), _line(Price=1), _line(Price=1)]
+    first = Deduplicator(store)
+    assert list(first.filter(lines)) == lines
+    list(first.emitted([({'tracking_id': 'ACME123'}, None), ({'tracking_id': ''}, None)]))
+    first.commit()
+    second = Deduplicator(store)
+    assert list(second.filter(lines)) == lines[1:]
+    assert store.get_many(['', 'ACME123']).keys() == {'ACME123'}
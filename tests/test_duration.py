@@ -0,0 +1,37 @@
+import logging
+from datetime import date
+
+import pytest
+
+import legacy
+from bench_duration import GOLDEN, corpus
+from clean import clean_for_duration
+from duration import duration_parser
+
+logger = logging.getLogger('test_duration')
+logger.disabled = True
+
+
+def test_golden_corpus_matches_legacy():
+    values = corpus(5000)
+    duration_parser.start_run()
+    expected = [legacy.clean_for_duration(value, logger) for value in values]
+    assert [clean_for_duration(value, logger) for value in values] == expected
+    # again from the per value cache
+    assert [clean_for_duration(value, logger) for value in values] == expected
+    assert len(values) > len(GOLDEN)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2 years', '24 MONTHS'), ('2 Years ', '24 MONTHS'), ('-1 year', '-12 MONTHS'), ('+3 years', '36 MONTHS'),
+    ('3 years 6 months', '36 MONTHS'), ('1 month', '1 MONTHS'), ('2.5 years', '2.5 years'),
+    ('Valid till 2027-12-31', '23 MONTHS'), ('till jan-2027', '12 MONTHS'), ('till Sep-2026', '8 MONTHS'),
+    ('15/03/2027', '14 MONTHS'), ('valid till 2027', 'valid till 2027'), ('100000 km', '100000 km'),
+    ('', ''), (None, None),
+])
+def test_durations_on_a_fixed_date(value, expected):
+    duration_parser.start_run(date(2026, 1, 15))
+    try:
+        assert clean_for_duration(value, logger) == expected
+    finally:
+        duration_parser.start_run()
@@ -0,0 +1,10 @@
+from helpers import shape_mapping_table
+
+
+def test_descriptions_are_distinct_as_in_the_ci_collation():
+    rows = [(1, 'Toyota', 'TOYOTA'), (2, 'TOYOTA', 'TOYOTA'), (3, 'toyota ', 'TOYOTA '), (4, 'Kia', 'KIA'),
+            (5, 'Kia  Motors', 'KIA  MOTORS'), (6, 'Citroen', 'CITROEN'), (7, 'Citroën', 'CITROËN'),
+            (8, 'Škoda', 'ŠKODA'), (9, 'SKODA ', 'SKODA ')]
+    descriptions, lookup = shape_mapping_table('bb_make', ['id', 'description', 'upper(description)'], rows)
+    assert descriptions == ['Toyota', 'Kia', 'Kia  Motors', 'Citroen', 'Škoda']
+    assert lookup['CITROËN'] == 7 and lookup['TOYOTA'] == 2 and lookup['TOYOTA '] == 3
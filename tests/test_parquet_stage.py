@@ -0,0 +1,22 @@
+import io
+import logging
+
+import pyarrow.parquet as pq
+
+from parquet_stage import ParquetStageWriter
+
+
+def test_lone_surrogate_is_escaped_not_fatal(caplog):
+    sink = io.BytesIO()
+    writer = ParquetStageWriter(sink, row_group_size=4, batch_rows=2, logger=logging.getLogger('test'))
+    cars = [{'make': 'AUDI'}, {'make': 'BMW\ud800'}, {'make': None, 'model': 'A4'}, {'make': 'KIA', 'colour': '\udc00'}]
+    with caplog.at_level(logging.WARNING):
+        for car in cars:
+            writer.write(car)
+        writer.close()
+    table = pq.read_table(io.BytesIO(sink.getvalue()))
+    assert table.num_rows == 4
+    assert table.column('make').to_pylist() == ['AUDI', 'BMW\\ud800', None, 'KIA']
+    assert table.column('model').to_pylist() == [None, None, 'A4', None]
+    assert table.column('extra').to_pylist()[3] == '{"colour": "\\udc00"}'
+    assert 'make are not valid UTF-8' in caplog.text
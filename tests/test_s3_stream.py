@@ -0,0 +1,183 @@
+import gzip
+import os
+import random
+
+import boto3
+import pytest
+import zstandard
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+import fixtures
+from conf import s3_read_range_size
+from s3_stream import MultipartUpload, MultipartGzipUpload, read_object_lines, iter_lines, input_compression, \
+    decompress_chunks
+
+PART_SIZE = 1 << 20
+WRITE_SIZE = 64 << 10
+
+
+class RecordingS3(fixtures.MemoryS3):
+    def __init__(self):
+        super().__init__()
+        self.part_sizes = []
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.part_sizes.append(len(Body))
+        return super().upload_part(Bucket, Key, UploadId, PartNumber, Body)
+
+
+@pytest.mark.parametrize('sink, decode', [(MultipartUpload, bytes), (MultipartGzipUpload, gzip.decompress)])
+def test_large_object_parts_stay_at_part_size(sink, decode):
+    # half random bytes so the gzip output keeps growing with the input
+    data = b''.join(os.urandom(WRITE_SIZE // 2) + bytes(WRITE_SIZE // 2) for _ in range(24 * PART_SIZE // WRITE_SIZE))
+    s3 = RecordingS3()
+    with sink(s3, 'stage', 'large.bin', part_size=PART_SIZE) as upload:
+        for position in range(0, len(data), WRITE_SIZE):
+            upload.write(data[position:position + WRITE_SIZE])
+        upload.close()
+    assert decode(s3.objects[('stage', 'large.bin')]) == data
+    assert len(s3.part_sizes) > 10
+    *full, last = s3.part_sizes
+    assert all(PART_SIZE <= size < PART_SIZE + WRITE_SIZE for size in full)
+    assert 0 < last < PART_SIZE + WRITE_SIZE
+    assert upload.bytes_in == len(data) and upload.bytes_out == sum(s3.part_sizes)
+
+
+class RecordingClient:
+    """
+    An S3 client recording the arguments of its get_object calls
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def get_object(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.client.get_object(**kwargs)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket='feeds')
+        yield client
+
+
+# a \r\n across the boundary of 16 byte ranges, a line over several ranges, \r and \n alone, no last terminator
+FEED = b'{"make": "KIA"}\r\n' + b'x' * 40 + b'\n\n' + b'a\rb\r\r\nc' * 5 + b'\r\n{"last": 1}'
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+@pytest.mark.parametrize('range_size', [1, 7, 16, 1 << 20])
+def test_ranged_read_splits_lines_as_splitlines(s3, workers, range_size):
+    assert FEED[15:17] == b'\r\n'
+    s3.put_object(Bucket='feeds', Key='feed.json', Body=FEED)
+    client = RecordingClient(s3)
+    lines = list(read_object_lines(client, 'feeds', 'feed.json', workers=workers, range_size=range_size, read_ahead=2))
+    assert lines == FEED.splitlines()
+    expected_calls = 1 if workers == 1 else -(-len(FEED) // range_size)
+    assert len(client.calls) == expected_calls
+    if workers > 1 and expected_calls > 1:
+        assert [call['Range'] for call in client.calls[:2]] == \
+            [f'bytes=0-{range_size - 1}', f'bytes={range_size}-{2 * range_size - 1}']
+
+
+def test_every_range_after_the_first_must_match_its_etag(s3):
+    etag = s3.put_object(Bucket='feeds', Key='feed.json', Body=FEED)['ETag']
+    client = RecordingClient(s3)
+    assert list(read_object_lines(client, 'feeds', 'feed.json', workers=4, range_size=8)) == FEED.splitlines()
+    assert 'IfMatch' not in client.calls[0]
+    assert len(client.calls) > 2 and all(call['IfMatch'] == etag for call in client.calls[1:])
+
+
+def test_object_rewritten_between_ranges_fails_the_read(s3):
+    s3.put_object(Bucket='feeds', Key='feed.json', Body=FEED)
+    lines = read_object_lines(s3, 'feeds', 'feed.json', workers=2, range_size=8, read_ahead=1)
+    next(lines)
+    s3.put_object(Bucket='feeds', Key='feed.json', Body=FEED.upper())
+    with pytest.raises(ClientError, match='PreconditionFailed'):
+        list(lines)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_empty_object(s3, workers):
+    s3.put_object(Bucket='feeds', Key='empty.json', Body=b'')
+    client = RecordingClient(s3)
+    assert list(read_object_lines(client, 'feeds', 'empty.json', workers=workers)) == []
+    # a range of an empty object is an InvalidRange, read again without one
+    assert [call.get('Range') for call in client.calls] == (['bytes=0-' + str(s3_read_range_size - 1), None]
+                                                            if workers > 1 else [None])
+
+
+def test_iter_lines_is_splitlines_of_the_whole_stream():
+    rng = random.Random(5)
+    for _ in range(3000):
+        data = bytes(rng.choice(b'ab\r\n') for _ in range(rng.randint(0, 30)))
+        cuts = sorted(rng.sample(range(len(data) + 1), rng.randint(0, min(len(data) + 1, 6))))
+        chunks = [data[start:end] for start, end in zip([0] + cuts, cuts + [len(data)])]
+        assert list(iter_lines(chunks)) == data.splitlines(), chunks
+
+
+GZIP_MAGIC, ZSTD_MAGIC = b'\x1f\x8b\x08', b'\x28\xb5\x2f\xfd'
+
+
+@pytest.mark.parametrize('key, content_encoding, head, expected', [
+    ('feed.json.GZ', 'zstd', ZSTD_MAGIC, 'gzip'),
+    ('feed.jsonl.zst', 'gzip', GZIP_MAGIC, 'zstd'),
+    ('feed.json', 'x-gzip', ZSTD_MAGIC, 'gzip'),
+    ('feed.json', 'ZSTD', GZIP_MAGIC, 'zstd'),
+    ('feed.json', None, GZIP_MAGIC, 'gzip'),
+    ('feed', 'identity', ZSTD_MAGIC, 'zstd'),
+    ('feed.json', None, b'{"make"', None),
+    ('feed.json', None, b'', None),
+])
+def test_compression_from_suffix_then_content_encoding_then_magic(key, content_encoding, head, expected):
+    assert input_compression(key, content_encoding, head) == expected
+
+
+@pytest.mark.parametrize('workers, range_size', [(1, 1 << 20), (4, 2), (4, 64)])
+def test_gzip_object_without_suffix(s3, workers, range_size):
+    s3.put_object(Bucket='feeds', Key='feeds/EventA/feed', Body=gzip.compress(FEED))
+    lines = read_object_lines(s3, 'feeds', 'feeds/EventA/feed', workers=workers, range_size=range_size)
+    assert list(lines) == FEED.splitlines()
+
+
+def _zstd(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _cut(data: bytes, size: int):
+    return [data[position:position + size] for position in range(0, len(data), size)] if size else [data]
+
+
+@pytest.mark.parametrize('compression, compress', [('gzip', gzip.compress), ('zstd', _zstd)])
+@pytest.mark.parametrize('input_size', [0, 1, 5, 300, 4096])
+def test_concatenated_members_and_frames(compression, compress, input_size):
+    parts = [FEED, b'', os.urandom(5000), FEED * 100]
+    data = b''.join(compress(part) for part in parts)
+    output = decompress_chunks(_cut(data, input_size), compression, chunk_size=1000)
+    assert b''.join(output) == b''.join(parts)
+
+
+@pytest.mark.parametrize('compression, compress', [('gzip', gzip.compress), ('zstd', _zstd)])
+def test_output_is_bounded_by_chunk_size(compression, compress):
+    size = 256 << 20
+    data = compress(bytes(size))
+    assert len(data) < size // 500
+    total = 0
+    for chunk in decompress_chunks(_cut(data, 1 << 20), compression, chunk_size=64 << 10):
+        assert len(chunk) <= 64 << 10
+        total += len(chunk)
+    assert total == size
+
+
+@pytest.mark.parametrize('compression, compress', [('gzip', gzip.compress), ('zstd', _zstd)])
+def test_truncated_input_raises_eof_error(compression, compress):
+    data = compress(FEED * 50) + compress(FEED)
+    for end in (5, len(data) // 2, len(data) - 1):
+        with pytest.raises(EOFError):
+            b''.join(decompress_chunks(_cut(data[:end], 64), compression))
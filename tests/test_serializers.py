@@ -0,0 +1,24 @@
+import json
+
+import pytest
+
+from serializers import get_codec
+
+RECORDS = [
+    {'price': float('nan'), 'mileage': float('inf'), 'hp': float('-inf')},
+    {'make': 'Citroën', 'model': 'خطوط', 'spec': 'line\u2028separator\u2029paragraph'},
+    {'make': 'KIA', 'doors': 4, 'extra': {'tags': ['a', None, True]}, 'vin': 2 ** 70, 'ids': [-2 ** 63 - 1, 2 ** 64]},
+]
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson', 'msgspec'])
+def test_records_are_written_byte_for_byte_as_json_dumps(backend):
+    try:
+        _, loads, dumps = get_codec(backend)
+    except ImportError:
+        pytest.skip(f'{backend} not installed')
+    for record in RECORDS:
+        expected = json.dumps(record).encode('utf-8')
+        assert dumps(record) == expected
+        assert dumps(loads(expected)) == expected
+    assert dumps(loads(b'{"price": NaN}')) == b'{"price": NaN}'
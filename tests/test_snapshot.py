@@ -0,0 +1,29 @@
+import os
+import time
+
+import boto3
+from moto import mock_aws
+
+from snapshot import read_snapshot
+
+URI = 's3://snapshots/backbone/snapshot.bin'
+
+
+@mock_aws
+def test_local_copy_is_only_read_when_s3_has_nothing_newer(tmp_path, monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket='snapshots')
+    path = tmp_path / 'snapshot.bin'
+    path.write_bytes(b'local')
+    # written an hour before the S3 snapshot: stale
+    os.utime(path, (time.time() - 3600, time.time() - 3600))
+    s3.put_object(Bucket='snapshots', Key='backbone/snapshot.bin', Body=b's3')
+    assert read_snapshot(str(path), s3, URI) == b's3'
+    # written after it: the S3 object is not modified since, the local copy is read
+    os.utime(path, (time.time() + 3600, time.time() + 3600))
+    assert read_snapshot(str(path), s3, URI) == b'local'
+    assert read_snapshot(str(tmp_path / 'missing.bin'), s3, URI) == b's3'
+    assert read_snapshot(str(path)) == b'local'
+    s3.delete_object(Bucket='snapshots', Key='backbone/snapshot.bin')
+    assert read_snapshot(str(tmp_path / 'missing.bin'), s3, URI) is None
@@ -0,0 +1,31 @@
+import sys
+import threading
+import time
+
+from startup import lazy_import
+
+SLOW_MODULE = '''
+import time
+time.sleep(0.3)
+VALUE = 42
+'''
+
+
+def test_lazy_import_waits_for_an_import_in_progress(tmp_path, monkeypatch):
+    (tmp_path / 'slow_lazy_module.py').write_text(SLOW_MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'slow_lazy_module', raising=False)
+    values = []
+
+    def run():
+        values.append(getattr(lazy_import('slow_lazy_module'), 'VALUE', None))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    threads[0].start()
+    # the others come while the first one is inside the module's body
+    time.sleep(0.1)
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert values == [42] * 4